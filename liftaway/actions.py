@@ -2,117 +2,278 @@
 # -*- coding: utf-8 -*-
 """Liftaway floor (and betwen floor) objects."""
 
+import asyncio
 import logging
 import time
-from typing import Dict, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from threading import Lock
+from typing import Callable, Dict, List, Sequence, Set, Tuple, Union
 
 import liftaway.low_level
-from liftaway.audio import Music, Sound
-from liftaway.constants import floor_audio, in_between_audio
+from liftaway.audio import all_done, Music, Sound, StreamingSound
+from liftaway.constants import (
+    depart_seconds,
+    floor_audio,
+    in_between_audio,
+    stream_floor_audio,
+    travel_seconds_per_floor,
+)
+from liftaway.dispatch import DOWN, Leg
 
 logger = logging.getLogger(__name__)
 
 
 class Base:
-    """Base class for floors and between floors."""
+    """
+    Base class for floors and between floors.
+
+    run() is a series of steps, each of which starts some audio and waits
+    for it, for a timeout or for the run's cancel token; whichever comes
+    first. interrupt() silences whatever is playing under the same lock a
+    step holds while starting its audio, so a step can't start anything
+    once a run has been cancelled.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the action (not cancelled)."""
+        self._lock = Lock()
+        self._cancelled = Future()
+
+    def _is_cancelled(self) -> bool:
+        """Has this run been cancelled."""
+        return self._cancelled.done()
+
+    def _wait(self, future: Future) -> bool:
+        """Wait for future; False if cancelled first."""
+        wait((future, self._cancelled), return_when=FIRST_COMPLETED)
+        return not self._is_cancelled()
+
+    def _sleep(self, seconds: float) -> bool:
+        """Sleep; False if cancelled first."""
+        wait((self._cancelled,), timeout=seconds)
+        return not self._is_cancelled()
+
+    def _step(self, start: Callable[[], Future], wait: bool = True) -> bool:
+        """
+        Start a step (unless cancelled).
+
+        :param wait: wait for the step's Future too.
+        :returns: False if cancelled.
+        """
+        with self._lock:
+            if self._is_cancelled():
+                return False
+            future = start()
+        return self._wait(future) if wait else True
 
     def activate(self) -> None:
         """Object is activated (pushed onto the queue)."""
         raise NotImplementedError("queued")
 
-    def run(self, interrupted: bool = False) -> None:
-        """Object is doing it's action (popped off the queue)."""
+    def run(self, interrupted: bool = False, cancelled: Future = None) -> None:
+        """
+        Object is doing it's action (popped off the queue).
+
+        :param interrupted: just dequeue (the queue is being cancelled).
+        :param cancelled: token which is resolved when this run is cancelled.
+        """
         raise NotImplementedError("run")
 
+    async def arun(self) -> None:
+        """As run(), but as a coroutine; cancelling it is an interrupt."""
+        raise NotImplementedError("arun")
+
     def interrupt(self) -> None:
         """If we're running, we've been interrupted."""
         raise NotImplementedError("interrupt")
 
 
 class Movement(Base):
-    """The space between floors."""
+    """
+    The space between floors.
+
+    The controller sets leg (see liftaway.dispatch) before each run; the
+    car sets off depart_seconds after the doors close and travel lasts
+    travel_seconds_per_floor for each floor of it.
+    """
 
     def __init__(self) -> None:
         """initializer."""
+        super().__init__()
         self._travel = Sound(**in_between_audio.get("travel", {}))
         self._halt = Sound(**in_between_audio.get("halt", {}))
+        # Resolves once our clips are decoded
+        self.ready = all_done([self._travel.loaded, self._halt.loaded])
+        self.leg = Leg(floor=0, floors=1, direction=DOWN)
+
+    def reload(self, filenames: Set[str]) -> List[Future]:
+        """Decode our clips again if their files changed."""
+        sounds = (self._travel, self._halt)
+        return [s.reload() for s in sounds if s._filename in filenames]
 
     def halt(self) -> None:
         """We've halted mid-travel."""
-        logger.info(f"Movement: Elevator Halted!")
+        logger.info("Movement: Elevator Halted!")
         self._halt.play(interrupt=True)
         self._halt.fadeout(fadeout_ms=500)
 
-    def travel(self) -> None:
+    def travel(self) -> Future:
         """We're traveling between floors."""
-        logger.info(f"Movement: Elevator Traveling")
-        liftaway.low_level.direction_led(on=True)
-        self._travel.play(blocking=True)
+        leg = self.leg
+        logger.info(
+            "Movement: Elevator Traveling %s floor(s) to %s", leg.floors, leg.floor
+        )
+        liftaway.low_level.direction_led(on=True, up=leg.direction != DOWN)
+        # Loop the clip as long as the trip takes
+        ms = int(leg.floors * travel_seconds_per_floor * 1000)
+        return self._travel.play(loops=-1, maxtime=ms)
 
     def activate(self) -> None:
         """Between Floor dealie gets pushed onto the queue."""
         pass
 
-    def run(self, interrupted: bool = False) -> None:
+    def run(self, interrupted: bool = False, cancelled: Future = None) -> None:
         """Movement gets popped off the queue."""
-        logger.info(f"Movement: Popped off queue; Interrupted({interrupted})")
-        if not interrupted:
-            time.sleep(1.1)
-            self.travel()
-            # Randomize the travel time from 2 to 7 seconds
-            # time.sleep(random.choice(tuple(range(2, 8))))  # noqa
+        logger.info("Movement: Popped off queue; Interrupted(%s)", interrupted)
+        # Nowhere to go if we're already at the floor
+        if not interrupted and self.leg.floors:
+            self._cancelled = cancelled or Future()
+            if self._sleep(depart_seconds):
+                self._step(self.travel)
+
+    async def arun(self) -> None:
+        """Movement as a coroutine; cancelling it halts the car."""
+        logger.info("Movement: Popped off queue (async)")
+        if not self.leg.floors:
+            return
+        try:
+            await asyncio.sleep(depart_seconds)
+            # Don't block the loop waiting for the travel clip to decode
+            await asyncio.wrap_future(self.ready)
+            await asyncio.wrap_future(self.travel())
+        except asyncio.CancelledError:
+            self.interrupt()
+            raise
 
     def interrupt(self) -> None:
         """Movement gets interrupted... stop audio and play screech."""
-        logger.info(f"Movement: Interrupted")
-        self.halt()
+        logger.info("Movement: Interrupted")
+        with self._lock:
+            if self._travel.is_busy:
+                self.halt()
 
 
 class Floor(Base):
     """Floor Ambiance and Behavior."""
 
-    def __init__(self, floor_number: int, muzak: Union[None, Music]) -> None:
-        """initilizer."""
+    def __init__(
+        self,
+        floor_number: int,
+        muzak: Union[None, Music],
+        sounds: Sequence[Dict[str, Union[str, float]]] = None,
+    ) -> None:
+        """
+        initilizer.
+
+        :param sounds: Sound arguments for the floor audio (default:
+            constants.floor_audio).
+        """
+        super().__init__()
         self.floor_number = floor_number
-        audios = []
-        for f in floor_audio.get(floor_number, {}):
-            audios.append(Sound(**f))
-        self._audios = tuple(audios)
+        if sounds is None:
+            sounds = floor_audio.get(floor_number, {})
+        self._audios = self.build_sounds(sounds)
         self._audios_i = 0
+        self._staged = None  # replacement _audios; see replace_sounds()
         self._ding = Sound(**in_between_audio.get("ding"))
         self._open = Sound(**in_between_audio.get("open"))
         self._close = Sound(**in_between_audio.get("close"))
+        # Resolves once our clips are decoded (floor audio is lazy/streamed)
+        self.ready = all_done(
+            [s.loaded for s in (self._ding, self._open, self._close) + self._audios]
+        )
         self._muzak = muzak
+        self._pressed_at = None
 
-    def ding(self) -> None:
+    @staticmethod
+    def build_sounds(
+        sounds: Sequence[Dict[str, Union[str, float]]]
+    ) -> Tuple[Sound, ...]:
+        """Floor audio (streamed, or lazily decoded) for Sound arguments."""
+        if stream_floor_audio:
+            return tuple(StreamingSound(**f) for f in sounds)
+        return tuple(Sound(lazy=True, **f) for f in sounds)
+
+    def replace_sounds(self, audios: Tuple[Sound, ...]) -> None:
+        """Play audios from now on; swapped in when we next run."""
+        self._staged = audios
+
+    def _swap_sounds(self) -> None:
+        """Swap in replacement floor audio (between runs)."""
+        audios, self._staged = self._staged, None
+        if audios:
+            logger.info("Floor(%s): New floor audio", self.floor_number)
+            self._audios = audios
+            self._audios_i %= len(audios)
+
+    def reload(self, filenames: Set[str]) -> List[Future]:
+        """Decode our door and ding clips again if their files changed."""
+        sounds = (self._ding, self._open, self._close)
+        return [s.reload() for s in sounds if s._filename in filenames]
+
+    def ding(self) -> Future:
         """Ding!."""
-        logger.info(f"Floor({self.floor_number}): Ding!")
-        self._ding.play(blocking=False)
+        if self._pressed_at is not None:
+            latency = time.monotonic() - self._pressed_at
+            logger.info(
+                "Floor(%s): Ding! (%.3fs after press)", self.floor_number, latency
+            )
+            self._pressed_at = None
+        else:
+            logger.info("Floor(%s): Ding!", self.floor_number)
+        future = self._ding.play(blocking=False)
         if self._muzak:
             self._muzak.fadeout()
+        return future
 
     def no_direction(self) -> None:
         """Kill direction lights."""
-        logger.info(f"Floor({self.floor_number}): Direction off")
+        logger.info("Floor(%s): Direction off", self.floor_number)
         liftaway.low_level.direction_led(on=False)
 
-    def door_open(self) -> None:
-        """Door opened!."""
-        logger.info(f"Floor({self.floor_number}): Opening Door")
-        self._open.play(blocking=True)
+    def door_open(self, blocking: bool = True) -> Future:
+        """
+        Door opened! (queued behind the ding).
 
-    def floor_sounds(self) -> None:
-        """We've arrived."""
-        logger.info(f"Floor({self.floor_number}): Playing floor audio")
+        :param blocking: wait for the queue slot; see Sound.queue().
+        """
+        logger.info("Floor(%s): Opening Door", self.floor_number)
+        return self._open.queue(blocking=blocking)
+
+    def _next_audio(self) -> Sound:
+        """Floor audio floor_sounds() plays next."""
+        return self._audios[(self._audios_i + 1) % len(self._audios)]
+
+    def floor_sounds(self, blocking: bool = True) -> Future:
+        """
+        We've arrived; queued behind the door (once it's playing).
+
+        :param blocking: wait for the queue slot; see Sound.queue().
+        """
+        logger.info("Floor(%s): Playing floor audio", self.floor_number)
+        audio = self._next_audio()
         self._audios_i = (self._audios_i + 1) % len(self._audios)
-        self._audios[self._audios_i].play(blocking=True)
+        return audio.queue(blocking=blocking)
         # hold the doors open to hear the sounds
         # sleep n - 1 and then fadeout.
 
-    def door_close(self) -> None:
+    def door_close(self) -> Future:
         """Door closed!."""
-        logger.info(f"Floor({self.floor_number}): Closing Door")
-        self._close.play(blocking=True)
+        logger.info("Floor(%s): Closing Door", self.floor_number)
+        return self._close.queue(blocking=False)
+
+    def door_closed(self) -> None:
+        """Door has closed; reset the muzak."""
         if self._muzak:
             # TODO(tkalus) verify
             # self._muzak.fadein()
@@ -120,29 +281,79 @@ class Floor(Base):
 
     def activate(self) -> None:
         """Floor gets pushed onto the queue."""
-        logger.info(f"Floor({self.floor_number}): Pushed onto queue")
+        logger.info("Floor(%s): Pushed onto queue", self.floor_number)
+        self._pressed_at = time.monotonic()
         liftaway.low_level.floor_button_led(self.floor_number, on=True)
+        # Decode our next clip while the car travels
+        audios = self._staged or self._audios
+        audios[(self._audios_i + 1) % len(audios)].prefetch()
 
-    def run(self, interrupted: bool = False) -> None:
+    def run(self, interrupted: bool = False, cancelled: Future = None) -> None:
         """Floor gets popped off the queue."""
         logger.info(
-            f"Floor({self.floor_number}): Popped off queue; Interrupted({interrupted})"
+            "Floor(%s): Popped off queue; Interrupted(%s)",
+            self.floor_number,
+            interrupted,
+        )
+        self._swap_sounds()
+        # When interrupted the controller flushes every floor LED in one go
+        liftaway.low_level.floor_button_led(
+            self.floor_number, on=False, flush=not interrupted
         )
+        if interrupted:
+            return
+        self._cancelled = cancelled or Future()
+        self.no_direction()
+        # Each step queues behind the last as soon as the queue slot frees
+        # (when the last one starts playing), so there's no gap between them
+        completed = (
+            self._step(self.ding, wait=False)
+            and self._step(self.door_open, wait=False)
+            and self._wait(self._open.queue_free())
+            and self._step(self.floor_sounds, wait=False)
+            and self._wait(self._audios[self._audios_i].queue_free())
+            and self._step(self.door_close)
+        )
+        if completed:
+            self.door_closed()
+
+    async def arun(self) -> None:
+        """Floor as a coroutine; cancelling it cuts the floor audio short."""
+        logger.info("Floor(%s): Popped off queue (async)", self.floor_number)
+        self._swap_sounds()
         liftaway.low_level.floor_button_led(self.floor_number, on=False)
-        if not interrupted:
+        try:
             self.no_direction()
+            # Nothing below may block the loop: wait for decoding and for
+            # queue slots here, so the Sound calls return straight away
+            await asyncio.wrap_future(self.ready)
             self.ding()
-            self.door_open()
-            self.floor_sounds()
-            self.door_close()
-        else:
-            # Take some time to dequeue the floors
-            time.sleep(0.2)
+            self.door_open(blocking=False)
+            # (Lazy floor audio decodes on the prefetch thread meanwhile)
+            await asyncio.wrap_future(self._next_audio().prefetch())
+            await asyncio.wrap_future(self._open.queue_free())
+            self.floor_sounds(blocking=False)
+            await asyncio.wrap_future(self._audios[self._audios_i].queue_free())
+            await asyncio.wrap_future(self.door_close())
+            self.door_closed()
+        except asyncio.CancelledError:
+            self.silence()
+            raise
+
+    def silence(self) -> None:
+        """Silence (and unqueue) whatever this floor has playing."""
+        logger.info("Floor(%s): Silenced", self.floor_number)
+        channels = set()
+        for sound in (self._ding, self._open, self._close) + self._audios:
+            if sound.is_busy and sound.channel_num not in channels:
+                channels.add(sound.channel_num)
+                sound.silence()
 
     def interrupt(self) -> None:
-        """Floor gets interrupted... noop for floors."""
-        logger.info(f"Floor({self.floor_number}): Interrupted")
-        pass
+        """Floor gets interrupted... silence the floor."""
+        logger.info("Floor(%s): Interrupted", self.floor_number)
+        with self._lock:
+            self.silence()
 
 
 class Flavour:
@@ -155,17 +366,32 @@ class Flavour:
     ):
         """Initialize."""
         self.irqable = self_interruptable
-        audios = []
-        for f in sounds:
-            audios.append(Sound(**f))
-        self._audios = tuple(audios)
+        self._audios = self.build_sounds(sounds)
         self._audios_i = 0
+        # Resolves once our clips are decoded
+        self.ready = all_done([a.loaded for a in self._audios])
+
+    @staticmethod
+    def build_sounds(
+        sounds: Sequence[Dict[str, Union[str, float]]]
+    ) -> Tuple[Sound, ...]:
+        """Flavour audio (decoded up front) for Sound arguments."""
+        return tuple(Sound(**f) for f in sounds)
+
+    def replace_sounds(self, audios: Tuple[Sound, ...]) -> None:
+        """Play audios from now on (whatever's playing carries on)."""
+        self._audios_i %= max(len(audios), 1)
+        self._audios = audios
 
     def run(self):
         """Welcome to Flavourtown."""
-        if not self.irqable and self._audios[self._audios_i].is_busy:
-            logger.error(f"Flavour: Already playing audio")
+        audios = self._audios
+        if not audios:
             return
-        self._audios_i = (self._audios_i + 1) % len(self._audios)
-        logger.info(f"Flavour: Playing audio({self._audios_i})")
-        self._audios[self._audios_i].play(blocking=False)
+        i = self._audios_i % len(audios)
+        if not self.irqable and audios[i].is_busy:
+            logger.error("Flavour: Already playing audio")
+            return
+        self._audios_i = i = (i + 1) % len(audios)
+        logger.info("Flavour: Playing audio(%s)", i)
+        audios[i].play(blocking=False)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liftaway shared (decoded) audio asset cache."""
+
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Tuple
+
+from liftaway.constants import lazy_audio_byte_budget, startup_decode_workers
+from liftaway.hardware import pygame
+from liftaway.mixer import share
+from liftaway.shared_assets import shared_assets
+from liftaway.util import data_resource_filename
+
+
+logger = logging.getLogger(__name__)
+
+AssetKey = Tuple[str, float]
+
+
+def sound_bytes(sound: pygame.mixer.Sound) -> int:
+    """Return the decoded (PCM) size of a pygame Sound in bytes."""
+    freq, size, channels = pygame.mixer.get_init()
+    return int(round(sound.get_length() * freq)) * channels * (abs(size) // 8)
+
+
+class AssetCache:
+    """
+    Process-wide cache of decoded sounds.
+
+    Every user of the same file at the same volume shares one decoded
+    pygame Sound (and so one PCM buffer) instead of decoding its own.
+
+    Pinned entries (short, always-needed sounds) are kept forever. Unpinned
+    entries (long floor ambience) are loaded on demand and evicted least
+    recently used first once they exceed the byte budget. Evicting a sound
+    that is still playing is safe; the mixer channel holds its own reference.
+    """
+
+    def __init__(self, budget: int = 0, workers: int = 0):
+        """
+        Initialize the cache.
+
+        :param budget: byte budget for unpinned entries (0 is unlimited).
+        :param workers: threads decoding pinned entries for load() (0 is
+            one per CPU).
+        """
+        self.budget = budget
+        self._lock = Lock()
+        self._sounds = OrderedDict()  # type: Dict[AssetKey, pygame.mixer.Sound]
+        self._sizes = {}  # type: Dict[AssetKey, int]
+        self._pinned = set()
+        self._loading = {}  # type: Dict[AssetKey, Future]
+        self._prefetcher = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="asset-prefetch"
+        )
+        self._loader = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1, thread_name_prefix="asset-load"
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self, filename: str, volume: float = 1.0, pin: bool = True
+    ) -> pygame.mixer.Sound:
+        """
+        Return the decoded Sound for filename at volume, decoding once.
+
+        :param pin: never evict this entry.
+        """
+        key = (filename, volume)
+        with self._lock:
+            sound = self._sounds.get(key)
+            if sound is not None:
+                self.hits += 1
+                self._sounds.move_to_end(key)
+                if pin:
+                    self._pinned.add(key)
+                return sound
+            loading = self._loading.get(key)
+            if loading is None:
+                self.misses += 1
+                loading = self._loading[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # Somebody (likely the prefetcher) is already decoding it
+            sound = loading.result()
+            if pin:
+                with self._lock:
+                    self._pinned.add(key)
+            return sound
+        try:
+            sound = self._decode(filename, volume)
+        except Exception as e:
+            with self._lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._sounds[key] = sound
+            self._sizes[key] = sound_bytes(sound)
+            if pin:
+                self._pinned.add(key)
+            else:
+                self._evict(keep=key)
+        loading.set_result(sound)
+        return sound
+
+    def load(self, filename: str, volume: float = 1.0) -> Future:
+        """Decode a pinned entry in the background (alongside other loads)."""
+        return self._loader.submit(self.get, filename, volume)
+
+    def prefetch(self, filename: str, volume: float = 1.0) -> Future:
+        """Decode an unpinned entry in the background."""
+        return self._prefetcher.submit(self.get, filename, volume, pin=False)
+
+    def invalidate(self, filename: str) -> int:
+        """
+        Forget filename's decoded Sounds (it's changed on disk).
+
+        Sounds already handed out keep playing the old audio; the next get()
+        decodes the file again. Returns the number of entries dropped.
+        """
+        with self._lock:
+            keys = [k for k in self._sounds if k[0] == filename]
+            for key in keys:
+                del self._sounds[key]
+                del self._sizes[key]
+                self._pinned.discard(key)
+        return len(keys)
+
+    @staticmethod
+    def _decode(filename: str, volume: float) -> pygame.mixer.Sound:
+        """Decode filename into a pygame Sound (from shared PCM if we can)."""
+        registry = shared_assets()
+        if registry is not None and filename in registry:
+            logger.debug("Load %s from shared PCM, volume:%s", filename, volume)
+            view = registry.view(filename)
+            sound = pygame.mixer.Sound(buffer=view)
+            # The software mixer renders from the shared PCM, not a copy
+            share(sound, view)
+        else:
+            logger.debug("Decode %s, volume:%s", filename, volume)
+            sound = pygame.mixer.Sound(data_resource_filename(filename))
+        sound.set_volume(volume)
+        return sound
+
+    def _evict(self, keep: AssetKey) -> None:
+        """Drop least recently used unpinned entries until under budget."""
+        if not self.budget:
+            return
+        for key in list(self._sounds):
+            if self.lazy_bytes <= self.budget:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            logger.debug("Evict %s, volume:%s", key[0], key[1])
+            del self._sounds[key]
+            del self._sizes[key]
+            self.evictions += 1
+
+    @property
+    def nbytes(self) -> int:
+        """Total decoded bytes held by the cache."""
+        return sum(self._sizes.values())
+
+    @property
+    def lazy_bytes(self) -> int:
+        """Decoded bytes held by unpinned (evictable) entries."""
+        return sum(v for k, v in self._sizes.items() if k not in self._pinned)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache statistics (entries, decoded bytes, hits, misses, evictions)."""
+        with self._lock:
+            return {
+                "entries": len(self._sounds),
+                "bytes": self.nbytes,
+                "lazy_bytes": self.lazy_bytes,
+                "budget": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = AssetCache(budget=lazy_audio_byte_budget, workers=startup_decode_workers)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway asyncio controller (LIFTAWAY_CONTROLLER=async).
+
+All controller state lives on one event loop. GPIO callbacks (which arrive
+on RPi.GPIO's threads) are bridged onto the loop with
+call_soon_threadsafe, and each Floor/Movement runs as a Task (see
+Base.arun). Cancel cancels the running Task, so it takes effect at its next
+await point rather than once the current clip has finished.
+"""
+
+import asyncio
+import logging
+import time
+
+import liftaway.low_level as low_level
+from liftaway.actions import Floor
+from liftaway.lift_main import CANCEL_LATENCY, CANCEL_LED_S, Controller
+from liftaway.trace import emit as trace, Kind
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncController(Controller):
+    """Controller with Floors and Movements run as asyncio Tasks."""
+
+    def __init__(self):
+        """Initialize the controller (its loop runs in run())."""
+        # GPIO callbacks may fire as soon as Controller.__init__ sets them up
+        self.loop = asyncio.new_event_loop()
+        self._queued = None  # asyncio.Event, made on the loop's thread in run()
+        self._task = None
+        super().__init__()
+
+    def _bridge(self, handler, *args) -> None:
+        """Run handler(*args) on the loop (from any thread)."""
+        self.loop.call_soon_threadsafe(handler, *args)
+
+    def floor(self, requested_floor: int, gpio: int) -> None:
+        """Run Handler for Floor GPIO (on the loop)."""
+        self._bridge(super().floor, requested_floor, gpio)
+
+    def voicemail(self, _: int, gpio: int) -> None:
+        """Run Call for Help Routine (on the loop)."""
+        self._bridge(super().voicemail, _, gpio)
+
+    def squeaker(self, _: int, gpio: int) -> None:
+        """Run Squeaker Routine (on the loop)."""
+        self._bridge(super().squeaker, _, gpio)
+
+    def emergency(self, _: int, gpio: int) -> None:
+        """Run Emergency/Remain Calm Routine (on the loop)."""
+        self._bridge(super().emergency, _, gpio)
+
+    def no_press(self, _: int, gpio: int) -> None:
+        """Run Don't Press This Button Routine (on the loop)."""
+        self._bridge(super().no_press, _, gpio)
+
+    def cancel(self, _: int, gpio: int) -> None:
+        """Run Call Cancel Routine (on the loop)."""
+        self._bridge(super().cancel, _, gpio)
+
+    def _push_floor(self, floor) -> bool:
+        """Push requested Floor onto Queue and wake the run loop."""
+        queued = super()._push_floor(floor)
+        if queued and self._queued is not None:
+            # (None while restoring a snapshot, before run())
+            self._queued.set()
+        return queued
+
+    def interrupt(self) -> None:
+        """Interrupt! (Call Cancel); safe to call from any thread."""
+        trace(Kind.INTERRUPT)
+        self._bridge(self._interrupt)
+
+    def _interrupt(self) -> None:
+        """Drop the queue and cancel the running Floor/Movement."""
+        with self.wakeup:
+            dropped = list(self.queue)
+            self.queue.clear()
+            self.dispatch.clear()
+            self._pending = 0
+        for action in dropped:
+            if isinstance(action, Floor):
+                low_level.floor_button_led(action.floor_number, on=False, flush=False)
+        low_level.flush()
+        self._snapshot()
+        if self._task is not None:
+            self._task.cancel()
+        else:
+            self._cancelled()
+
+    def _cancelled(self) -> None:
+        """Cancel has taken effect."""
+        low_level.direction_led(on=False)
+        self.loop.call_later(CANCEL_LED_S, low_level.cancel_call_led, False)
+        if self._cancelled_at is not None:
+            latency = time.monotonic() - self._cancelled_at
+            CANCEL_LATENCY.observe(latency)
+            logger.info("Cancel took effect %.2fms after press", latency * 1000)
+            self._cancelled_at = None
+
+    async def _run(self) -> None:
+        """Pop and run actions until stopped."""
+        while self.running:
+            if not self._pop_action():
+                # Going idle; bring the muzak back before we sleep
+                self.muzak.play() or self.muzak.fadein()
+                self._queued.clear()
+                await self._queued.wait()
+                continue
+            self._task = self.loop.create_task(self.action.arun())
+            await asyncio.wait({self._task})
+            if self._task.cancelled():
+                self._cancelled()
+            elif self._task.exception() is not None:
+                logger.error("%s failed", self.action, exc_info=self._task.exception())
+            self._task = None
+            self.action = None
+            self._snapshot()
+
+    def run(self) -> None:
+        """Run Controller (blocks running the event loop)."""
+        asyncio.set_event_loop(self.loop)
+        self._queued = asyncio.Event()
+        self.running = True
+        self.paused = False
+        self.loop.run_until_complete(self._run())
+
+    def stop(self) -> None:
+        """Stop the Controller run loop; safe to call from any thread."""
+        self._bridge(self._stop)
+
+    def _stop(self) -> None:
+        """Stop (on the loop)."""
+        self.running = False
+        self._queued.set()
+        if self._task is not None:
+            self._task.cancel()
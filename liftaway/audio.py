@@ -3,23 +3,273 @@
 """Liftaway Audio Abstractions."""
 
 import logging
-import time
+import mmap
+import os
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, Hashable, List, Tuple, Union
 
-import pygame
+import liftaway.constants as constants
+import liftaway.metrics as metrics
+from liftaway import mixer
+from liftaway.assets import cache
+from liftaway.config import cabin
+from liftaway.constants import mixer_format
+from liftaway.fade import Curve, fader, linear
+from liftaway.hardware import pygame
+from liftaway.shared_assets import shared_assets
+from liftaway.trace import emit as trace, Kind
 from liftaway.util import data_resource_filename
+from liftaway.wavfile import read_header
 
 
 logger = logging.getLogger(__name__)
 
-# PyGame Channels
-audio_channels = {
-    "default": 0,
-    "movement": 1,
-    "no_press": 2,
-    "voicemail": 3,
-    "emergency": 4,
-    "squeaker": 5,
-}
+# PyGame Channels (name -> number; see liftaway.config)
+audio_channels = {name: n for n, name in enumerate(cabin().channels)}
+
+PLAYS = metrics.counter(
+    "liftaway_sound_plays_total", "Sounds played or queued.", ["channel"]
+)
+BUSY = metrics.counter(
+    "liftaway_channel_busy_total",
+    "Sounds not played because their channel was busy.",
+    ["channel"],
+)
+_plays = {n: PLAYS.labels(name) for name, n in audio_channels.items()}
+_busy = {n: BUSY.labels(name) for name, n in audio_channels.items()}
+
+# pygame channel the software mixer plays its output on
+OUTPUT_CHANNEL = len(audio_channels)
+
+# Frames per streamed chunk; 16 mixer buffers (~1.1s, 192KB) gives the feeder
+# plenty of slack to queue the next chunk before the mixer runs dry.
+STREAM_CHUNK_FRAMES = 16 * mixer_format[3]
+
+# Channel end events are posted as pygame.USEREVENT + channel number
+END_EVENT_BASE = pygame.USEREVENT
+
+# Fade applied when a channel is silenced (just long enough not to click)
+SILENCE_FADE_MS = 20
+
+# channel number -> [(pygame Sound, Future)] waiting for that sound to end
+_pending: Dict[int, List[Tuple[pygame.mixer.Sound, Future]]] = {}
+_pending_lock = Lock()
+
+# channel number -> StreamingSound currently feeding that channel (or the
+# software mixer, feeding OUTPUT_CHANNEL)
+_feeders: Dict[int, Union["StreamingSound", mixer.Engine]] = {}
+
+# The end event loop parks on this while nothing is waiting for an end event
+# (pygame.event.wait() polls SDL, hundreds of wakeups a second, even when
+# there's nothing to deliver); see _listen()
+_listening = Condition()
+
+# Software mixer (None unless constants.software_mixer); see init()
+engine = None
+
+# One frame of silence; see silence()
+_blank = None
+
+# Is the audio device closed (see suspend()), and the lock for changing that
+_suspended = False
+_device_lock = Lock()
+
+
+def channel(channel_num: int) -> pygame.mixer.Channel:
+    """Return the named channel, on the software mixer if it's running."""
+    if engine is not None:
+        return engine.channel(channel_num)
+    return pygame.mixer.Channel(channel_num)
+
+
+def music():
+    """Return pygame's muzak player, or the software mixer's muzak channel."""
+    if engine is not None:
+        return engine.music
+    return pygame.mixer.music
+
+
+def _ramp(
+    key: Hashable,
+    target,
+    set_volume: Callable[[float], None],
+    start: float,
+    end: float,
+    duration_ms: int,
+    curve: Curve,
+) -> Future:
+    """Volume ramp; sample accurate on the software mixer, else the fader."""
+    if engine is not None:
+        return target.ramp(end, duration_ms, curve)
+    return fader.ramp(key, set_volume, start, end, duration_ms, curve)
+
+
+def _channel_idle_of(channel: pygame.mixer.Channel, sound: pygame.mixer.Sound) -> bool:
+    """Return True if sound is neither playing nor queued on channel."""
+    return channel.get_sound() != sound and channel.get_queue() != sound
+
+
+def _slot_free(channel_num: int) -> bool:
+    """Is the channel's queue slot free (and not about to be refilled)."""
+    if channel(channel_num).get_queue() is not None:
+        return False
+    feeder = _feeders.get(channel_num)
+    return not isinstance(feeder, StreamingSound) or not feeder._more()
+
+
+def _resolve(channel_num: int) -> None:
+    """Resolve Futures for sounds which are no longer on the channel."""
+    ch = channel(channel_num)
+    with _pending_lock:
+        waiting = _pending.get(channel_num, [])
+        done = [
+            w
+            for w in waiting
+            if (_slot_free(channel_num) if w[0] is None else _channel_idle_of(ch, w[0]))
+        ]
+        _pending[channel_num] = [w for w in waiting if w not in done]
+    # One END per sound, however many Futures were waiting on it
+    for _ in {id(sound) for sound, _ in done if sound is not None}:
+        trace(Kind.END, channel_num)
+    for _, future in done:
+        if not future.done():
+            future.set_result(True)
+
+
+def _await(channel_num: int, sound: pygame.mixer.Sound, done: bool) -> Future:
+    """Future resolved by _resolve() (now, if done already)."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    with _pending_lock:
+        _pending.setdefault(channel_num, []).append((sound, future))
+    if done:
+        _resolve(channel_num)
+    else:
+        _listen()
+    return future
+
+
+def completion(channel_num: int, sound: pygame.mixer.Sound) -> Future:
+    """
+    Future which resolves once sound has finished on the given channel.
+
+    Must be called *after* the sound has been played (or queued).
+    """
+    # It may have already ended (or been kicked out) before we registered
+    return _await(
+        channel_num, sound, _channel_idle_of(channel(channel_num), sound)
+    )
+
+
+def queue_free(channel_num: int) -> Future:
+    """
+    Future which resolves once nothing is queued on the given channel.
+
+    That's when the queued sound starts playing (for a stream, its last
+    chunk), so a sound queued then follows it with no gap.
+    """
+    return _await(channel_num, None, _slot_free(channel_num))
+
+
+def all_done(futures: List[Future]) -> Future:
+    """Future resolving to True once every one of futures has."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    remaining = len(futures)
+    lock = Lock()
+
+    def done(_: Future) -> None:
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        future.set_result(True)
+
+    if not futures:
+        future.set_result(True)
+    for f in futures:
+        f.add_done_callback(done)
+    return future
+
+
+def finished(result: bool = False) -> Future:
+    """Already resolved Future (e.g. sound was never played)."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def silence(channel_num: int, fade_ms: int = SILENCE_FADE_MS) -> Future:
+    """
+    Fade a channel out and drop whatever is queued on it.
+
+    A halted channel starts its queued sound, and there's no way to unqueue
+    one, so the queue slot is first overwritten with a one frame blank.
+    :returns: Future resolving once the channel is idle.
+    """
+    global _blank
+    ch = channel(channel_num)
+    if not ch.get_busy():
+        return finished(True)
+    feeder = _feeders.get(channel_num)
+    if feeder is not None:
+        with feeder._lock:
+            feeder._stopping = True
+    last = ch.get_sound()
+    if ch.get_queue() is not None:
+        if _blank is None:
+            _, size, channels = pygame.mixer.get_init()
+            _blank = pygame.mixer.Sound(buffer=bytes(channels * abs(size) // 8))
+        ch.queue(_blank)
+        last = _blank
+    if fade_ms:
+        ch.fadeout(fade_ms)
+    else:
+        ch.stop()
+    return completion(channel_num, last)
+
+
+def _expecting() -> bool:
+    """Return whether anything is waiting for a channel end event."""
+    with _pending_lock:
+        if any(_pending.values()):
+            return True
+    return any(f is not engine or engine.running for f in list(_feeders.values()))
+
+
+def _listen() -> None:
+    """Something now waits for an end event; wake the end event loop."""
+    with _listening:
+        _listening.notify()
+
+
+def _end_event_loop() -> None:
+    """
+    Dispatch pygame channel end events to waiting Futures.
+
+    Sleeps (without touching pygame) while nothing is waiting for one; end
+    events posted meanwhile stay queued until it's next woken.
+    """
+    while True:
+        with _listening:
+            _listening.wait_for(_expecting)
+        try:
+            event = pygame.event.wait()
+        except pygame.error:
+            # pygame.quit() (e.g. at interpreter exit)
+            return
+        channel_num = event.type - END_EVENT_BASE
+        feeder = _feeders.get(channel_num)
+        if feeder is not None:
+            try:
+                feeder._feed()
+            except Exception:
+                logger.exception("Feeding channel %s failed", channel_num)
+        if channel_num in _pending:
+            _resolve(channel_num)
 
 
 class Music:
@@ -27,53 +277,70 @@ class Music:
 
     def __init__(self, filename: str, volume: float = 1.0):
         """Initializer."""
-        logger.debug(f"Init Music {filename}, volume:{volume}")
+        logger.debug("Init Music %s, volume:%s", filename, volume)
         self._filename = filename
-        self._music = pygame.mixer.music
+        self._music = music()
         self.volume = volume
         if not self._music.get_busy():
-            self._music.load(data_resource_filename(filename))
+            self.load()
             self._music.set_volume(volume)
             self._music.play(loops=-1)
 
+    def load(self) -> None:
+        """(Re)load the track (e.g. after resume())."""
+        self._music.load(data_resource_filename(self._filename))
+
     @property
     def filename(self):
         """Fully qualified data pathname."""
         return data_resource_filename(self._filename)
 
-    def fadein(self):
+    def _set_volume(self, volume: float) -> None:
+        """Fader callback."""
+        self._music.set_volume(round(volume, 2))
+
+    def fadein(self, fadein_ms: int = 2000, curve: Curve = linear):
         """
-        Fade in music.
+        Fade in music (in the background).
 
         Returns False if not already Playing.
         """
         if not self._music.get_busy():
-            logger.error(f"Fadein Music {self.filename} not playing")
+            logger.error("Fadein Music %s not playing", self.filename)
             return False
         s_vol = self._music.get_volume()
         e_vol = self.volume
-        if s_vol == e_vol:
+        if s_vol == e_vol and not fader.active("music"):
             return True
-        logger.debug(f"Fadein Music {self.filename}")
-        for i in range(1, 11):
-            vol = ((e_vol - s_vol) * i / 10) + s_vol
-            self._music.set_volume(round(vol, 2))
-            time.sleep(0.2)
+        logger.debug("Fadein Music %s", self.filename)
+        _ramp("music", self._music, self._set_volume, s_vol, e_vol, fadein_ms, curve)
         return True
 
-    def fadeout(self, fadeout_ms: int = 0):
-        """Fade out music."""
-        logger.debug(f"Fadeout Music {self.filename}")
+    def fadeout(self, fadeout_ms: int = 0, curve: Curve = linear) -> Future:
+        """
+        Fade out music (in the background).
+
+        :param fadeout_ms: milliseconds to run fadeout (0 is the default 1s).
+        :returns: Future resolving when the fade completes (False if it was
+            superseded by another fade).
+        """
+        logger.debug("Fadeout Music %s", self.filename)
         s_vol = self._music.get_volume()
-        for i in range(10, -1, -1):
-            vol = (s_vol) * i / 10
-            self._music.set_volume(round(vol, 2))
-            time.sleep(0.1)
+        return _ramp(
+            "music",
+            self._music,
+            self._set_volume,
+            s_vol,
+            0.0,
+            fadeout_ms or 1000,
+            curve,
+        )
 
     def play(self):
         """Play Music."""
         if not self._music.get_busy():
-            logger.debug(f"Play Music {self.filename}")
+            logger.debug("Play Music %s", self.filename)
+            fader.cancel("music")
             self._music.set_volume(self.volume)
             self._music.play(loops=-1)
             return True
@@ -83,12 +350,14 @@ class Music:
 
     def stop(self):
         """Stop Music."""
+        fader.cancel("music")
         if self._music.get_busy():
             self._music.stop()
 
     def zero(self):
         """Zero out volume."""
-        logger.debug(f"Kill Music {self.filename}")
+        logger.debug("Kill Music %s", self.filename)
+        fader.cancel("music")
         self._music.set_volume(0)
 
 
@@ -103,17 +372,25 @@ class Sound:
         fade_ms: int = 0,
         volume: float = 1.0,
         audio_channel: str = "default",
+        lazy: bool = False,
     ):
-        """Initializer."""
-        logger.debug(f"Init Sound {filename}, volume:{volume}")
+        """
+        Initialize the sound.
+
+        :param lazy: don't decode until first played (or prefetched); the
+            decoded audio may be evicted from the asset cache when cold.
+            Otherwise decoding starts straight away in the background (see
+            loaded).
+        """
+        logger.debug("Init Sound %s, volume:%s, lazy:%s", filename, volume, lazy)
         self._filename = filename
         self._loops = loops
         self._maxtime = maxtime
         self._fade_ms = fade_ms
-        self._sound = pygame.mixer.Sound(data_resource_filename(filename))
-        self._sound.set_volume(volume)
+        self._lazy = lazy
+        self._loaded = None if lazy else cache.load(filename, volume)
         self._channel_num = audio_channels[audio_channel]  # KeyError Exception
-        self._channel = pygame.mixer.Channel(self._channel_num)
+        self._channel = channel(self._channel_num)
         self._volume = volume
 
     @property
@@ -126,6 +403,68 @@ class Sound:
         """Boolean saying whether the channel is busy."""
         return self._channel.get_busy()
 
+    @property
+    def channel_num(self) -> int:
+        """Channel number (see audio_channels)."""
+        return self._channel_num
+
+    @property
+    def loaded(self) -> Future:
+        """Future resolving once decoded (right away for lazy Sounds)."""
+        return self._loaded or finished(True)
+
+    @property
+    def _sound(self) -> pygame.mixer.Sound:
+        """Decoded pygame Sound (decoded on demand if lazy)."""
+        if self._loaded is not None:
+            # Waits if it's still being decoded
+            return self._loaded.result()
+        return cache.get(self._filename, self._volume, pin=False)
+
+    def prefetch(self) -> Future:
+        """Decode a lazy Sound in the background ahead of playing it."""
+        if self._loaded is not None:
+            return self._loaded
+        return cache.prefetch(self._filename, self._volume)
+
+    def reload(self) -> Future:
+        """
+        Decode our file again (after asset_cache.invalidate()).
+
+        A pinned Sound carries on playing the old audio until the new has
+        decoded, and keeps it if decoding fails.
+        """
+        if self._loaded is None:
+            return cache.prefetch(self._filename, self._volume)
+        loaded = cache.load(self._filename, self._volume)
+
+        def swap(future: Future) -> None:
+            if future.exception() is None:
+                self._loaded = future
+
+        loaded.add_done_callback(swap)
+        return loaded
+
+    def ramp_volume(
+        self, volume: float, duration_ms: int, curve: Curve = linear
+    ) -> Future:
+        """
+        Ramp this Sound's channel volume (in the background).
+
+        :param volume: target channel volume (0.0 - 1.0).
+        :param duration_ms: ramp length.
+        :returns: Future resolving when the ramp completes.
+        """
+        return _ramp(
+            ("channel", self._channel_num),
+            self._channel,
+            self._channel.set_volume,
+            self._channel.get_volume(),
+            volume,
+            duration_ms,
+            curve,
+        )
+
     def fadein(self, fadein_ms: int = 0, loop: int = 0):
         """
         Fadein Sound.
@@ -141,50 +480,496 @@ class Sound:
         :param fadeout_ms: milliseconds to run fadeout.
         """
         ms = fadeout_ms or self._fade_ms
-        logger.debug(f"Fadeout Sound {self.filename}, fadeout_ms:{ms}")
-        self._sound.fadeout(fadeout_ms)
+        logger.debug("Fadeout Sound %s, fadeout_ms:%s", self.filename, ms)
+        sound = self._sound
+        if self._channel.get_sound() is sound:
+            self._channel.fadeout(fadeout_ms)
+        else:
+            sound.fadeout(fadeout_ms)
 
-    def play(self, interrupt: bool = True, blocking: bool = False, fadein_ms: int = 0):
+    def play(
+        self,
+        interrupt: bool = True,
+        blocking: bool = False,
+        fadein_ms: int = 0,
+        loops: int = None,
+        maxtime: int = None,
+    ) -> Future:
         """
         Play Sound.
         :param interrupt: interrupt sounds already on channel.
         :param blocking: block until playing sound is finished.
         :param fadein_ms: millisecond fadein.
+        :param loops: repeats (-1 forever) instead of the Sound's own.
+        :param maxtime: stop after this many milliseconds instead of the
+            Sound's own maxtime.
+        :returns: Future resolving to True when the sound has finished, or to
+            False if the channel was busy and nothing was played.
         """
         busy = self.is_busy
         logger.info(
-            f"Play Sound {self.filename} on channel:{self._channel_num}, fadein:{fadein_ms}"
+            "Play Sound %s on channel:%s, fadein:%s",
+            self.filename,
+            self._channel_num,
+            fadein_ms,
         )
         if not busy or (busy and interrupt):
-            self._channel.play(self._sound, maxtime=self._maxtime, fade_ms=fadein_ms)
+            sound = self._sound
+            self._channel.play(
+                sound,
+                loops=self._loops if loops is None else loops,
+                maxtime=self._maxtime if maxtime is None else maxtime,
+                fade_ms=fadein_ms,
+            )
+            trace(Kind.PLAY, self._channel_num, self._filename)
+            _plays[self._channel_num].inc()
         else:
             logger.warn(
-                f"Channel {self._channel_num} Busy; couldn't play {self.filename}"
+                "Channel %s Busy; couldn't play %s", self._channel_num, self.filename
             )
-            return
+            _busy[self._channel_num].inc()
+            return finished(False)
+        future = completion(self._channel_num, sound)
         if blocking:
-            while self._channel.get_sound() == self._sound:
-                time.sleep(0.1)
-            logger.info(f"Sound {self.filename} finished (blocked)")
+            future.result()
+            logger.info("Sound %s finished (blocked)", self.filename)
+        return future
+
+    def silence(self, fade_ms: int = SILENCE_FADE_MS) -> Future:
+        """Silence our channel, fading out over fade_ms."""
+        return silence(self._channel_num, fade_ms)
 
-    def queue(self, blocking: bool = True):
+    def queue_free(self) -> Future:
+        """Future resolving once nothing is queued on our channel."""
+        return queue_free(self._channel_num)
+
+    def queue(self, blocking: bool = True) -> Future:
         """
         Queue Sound.
         :param blocking: block until able to queue.
+        :returns: Future resolving when the queued sound has finished.
+        """
+        queued = self._channel.get_queue()
+        if queued and blocking:
+            logger.info("Queue Sound %s waiting", self.filename)
+            self.queue_free().result()
+        elif queued:
+            logger.info("Queue Sound %s kicked somebody out", self.filename)
+        sound = self._sound
+        self._channel.queue(sound)
+        trace(Kind.PLAY, self._channel_num, self._filename, 1)
+        _plays[self._channel_num].inc()
+        logger.info("Queue Sound %s queued", self.filename)
+        return completion(self._channel_num, sound)
+
+
+class StreamingSound(Sound):
+    """
+    Sound streamed in chunks from a WAV.
+
+    At most two chunks are decoded at a time: the one playing and the one
+    queued behind it on the channel (the mixer plays a queued sound back to
+    back with no gap). Each channel end event tops the queue back up, so a
+    long clip costs ~2 * STREAM_CHUNK_FRAMES frames instead of the whole file.
+
+    Streams from shared PCM (the asset bundle, or blocks published by the
+    supervisor; see liftaway.shared_assets) when the clip is there.
+    Otherwise the WAV must already be in the mixer's format (see
+    constants.mixer_format) or this falls back to a lazily decoded Sound.
+    A WAV is read (pread) a chunk at a time rather than memory-mapped: a
+    mapped file rewritten in place (cp over it, say) faults the process
+    with SIGBUS, while a read just comes up short and ends the stream.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        loops: int = 0,
+        maxtime: int = -1,
+        fade_ms: int = 0,
+        volume: float = 1.0,
+        audio_channel: str = "default",
+    ):
+        """Initialize the stream (nothing is read until it's played)."""
+        super().__init__(
+            filename,
+            loops=loops,
+            maxtime=maxtime,
+            fade_ms=fade_ms,
+            volume=volume,
+            audio_channel=audio_channel,
+            lazy=True,
+        )
+        self._info = None
+        self._map = None  # shared PCM
+        self._file = None  # or the WAV
+        registry = shared_assets()
+        if registry is not None and filename in registry:
+            segment = registry.segment(filename)
+            self._info = segment.info
+            self._map = segment.buffer
+        else:
+            self._probe()
+        self._lock = Lock()
+        self._chunks = deque(maxlen=2)  # playing and queued chunk
+        self._position = 0
+        self._loops_left = 0
+        self._budget = None  # bytes left to play (maxtime), if limited
+        self._future = None
+        self._stopping = False
+
+    def _probe(self) -> None:
+        """Stream straight from the WAV if it's in the mixer's format."""
+        try:
+            info = read_header(self.filename)
+            fmt = (info.rate, -8 * info.sample_width, info.channels)
+            if fmt == pygame.mixer.get_init():
+                self._info = info
+            else:
+                logger.warning("Can't stream %s %s; decoding", self.filename, fmt)
+        except (OSError, ValueError) as e:
+            logger.warning("Can't stream %s (%s); decoding", self.filename, e)
+
+    @property
+    def _data_end(self) -> int:
+        """Offset of the end of the sample data."""
+        end = self._info.data_offset + self._info.data_size
+        return end if self._map is None else min(end, len(self._map))
+
+    def _open(self) -> None:
+        """Open the WAV (once) unless we stream shared PCM."""
+        if self._map is None and self._file is None:
+            self._file = open(self.filename, "rb", buffering=0)
+
+    def _read(self, start: int, end: int) -> Union[bytes, memoryview]:
+        """Sample data between offsets (short if the WAV has shrunk)."""
+        if self._map is not None:
+            return memoryview(self._map)[start:end]
+        data = os.pread(self._file.fileno(), end - start, start)
+        if len(data) < end - start:
+            logger.warning("%s was rewritten while streaming", self.filename)
+            frame = self._info.channels * self._info.sample_width
+            data = data[: len(data) - len(data) % frame]
+        return data
+
+    def _is_ours(self, sound: pygame.mixer.Sound) -> bool:
+        """Is sound one of our chunks."""
+        return any(sound is c for c in self._chunks)
+
+    def _more(self) -> bool:
+        """Are there chunks still to queue."""
+        if self._stopping or self._future is None or self._budget == 0:
+            return False
+        return self._position < self._data_end or self._loops_left != 0
+
+    def _next_chunk(self) -> pygame.mixer.Sound:
+        """Decode the next chunk (None when we've run out)."""
+        if self._budget == 0:
+            return None
+        if self._position >= self._data_end:
+            if self._loops_left == 0:
+                return None
+            self._loops_left -= 1 if self._loops_left > 0 else 0
+            self._position = self._info.data_offset
+        chunk_bytes = (
+            STREAM_CHUNK_FRAMES * self._info.channels * self._info.sample_width
+        )
+        end = min(self._position + chunk_bytes, self._data_end)
+        if self._budget is not None:
+            end = min(end, self._position + self._budget)
+        data = self._read(self._position, end)
+        if len(data) < end - self._position:
+            # Cut short; don't go round again either
+            self._loops_left = 0
+            end = self._data_end
+            if not data:
+                self._position = end
+                return None
+        if self._budget is not None:
+            self._budget -= len(data)
+        chunk = pygame.mixer.Sound(buffer=data)
+        chunk.set_volume(self._volume)
+        self._position = end
+        self._chunks.append(chunk)
+        return chunk
+
+    def _start(
+        self, loops: int = None, maxtime: int = -1
+    ) -> Tuple[Future, "StreamingSound"]:
+        """
+        Rewind and take over feeding our channel (our lock held).
+
+        :param loops: repeats (-1 forever) instead of the Sound's own.
+        :param maxtime: stop after this many milliseconds (if positive).
+        :returns: our Future, and the stream which was feeding the channel
+            (if any); _retire() it once our lock is released.
+        """
+        self._open()
+        self._position = self._info.data_offset
+        self._loops_left = self._loops if loops is None else loops
+        self._budget = None
+        if maxtime and maxtime > 0:
+            frame = self._info.channels * self._info.sample_width
+            self._budget = maxtime * self._info.rate // 1000 * frame
+        self._stopping = False
+        self._chunks.clear()
+        if self._future is not None and not self._future.done():
+            self._future.set_result(True)
+        self._future = Future()
+        self._future.set_running_or_notify_cancel()
+        previous = _feeders.get(self._channel_num)
+        _feeders[self._channel_num] = self
+        _listen()
+        return self._future, previous
+
+    def _retire(self, previous: "StreamingSound") -> None:
+        """
+        Finish the stream we took the channel from.
+
+        Only ever called without our lock: holding both locks, two streams
+        taking the same channel from each other on two threads deadlock.
+        """
+        if previous is not None and previous is not self:
+            with previous._lock:
+                previous._finish()
+
+    def _finish(self) -> None:
+        """Stream is done (ran out or was kicked off the channel)."""
+        if _feeders.get(self._channel_num) is self:
+            del _feeders[self._channel_num]
+        self._chunks.clear()
+        if self._future is not None and not self._future.done():
+            trace(Kind.END, self._channel_num)
+            self._future.set_result(True)
+        self._future = None
+
+    def _top_up(self) -> None:
+        """Queue the next chunk if ours is playing and the queue is empty."""
+        if self._stopping or self._channel.get_queue() is not None:
+            return
+        if self._is_ours(self._channel.get_sound()):
+            chunk = self._next_chunk()
+            if chunk is not None:
+                self._channel.queue(chunk)
+
+    def _feed(self) -> None:
+        """Channel end event; keep the channel fed (or wrap up)."""
+        with self._lock:
+            if self._future is None:
+                return
+            current = self._channel.get_sound()
+            if not self._is_ours(current) and not self._is_ours(
+                self._channel.get_queue()
+            ):
+                self._finish()
+            elif self._stopping and self._is_ours(current):
+                # Our (silenced) queued chunk started after a fadeout
+                self._channel.stop()
+                self._finish()
+            else:
+                self._top_up()
+
+    def prefetch(self) -> Future:
+        """Open the WAV and ask the kernel to read ahead the first chunk."""
+        if self._info is None:
+            return super().prefetch()
+        self._open()
+        start = self._info.data_offset - self._info.data_offset % mmap.PAGESIZE
+        length = min(
+            self._data_end - start,
+            STREAM_CHUNK_FRAMES * self._info.channels * self._info.sample_width
+            + mmap.PAGESIZE,
+        )
+        if hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_WILLNEED, start, length)
+        elif self._file is not None and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(
+                self._file.fileno(), start, length, os.POSIX_FADV_WILLNEED
+            )
+        return finished(True)
+
+    def fadeout(self, fadeout_ms: int = 100):
         """
+        Fadeout Sound.
+        :param fadeout_ms: milliseconds to run fadeout.
+        """
+        if self._info is None:
+            return super().fadeout(fadeout_ms)
+        logger.debug("Fadeout Sound %s, fadeout_ms:%s", self.filename, fadeout_ms)
+        with self._lock:
+            self._stopping = True
+            queued = self._channel.get_queue()
+            if self._is_ours(queued):
+                queued.set_volume(0)
+        self._channel.fadeout(fadeout_ms)
+
+    def play(
+        self,
+        interrupt: bool = True,
+        blocking: bool = False,
+        fadein_ms: int = 0,
+        loops: int = None,
+        maxtime: int = None,
+    ) -> Future:
+        """
+        Play Sound (streamed).
+        :param interrupt: interrupt sounds already on channel.
+        :param blocking: block until playing sound is finished.
+        :param fadein_ms: millisecond fadein.
+        :param loops: repeats (-1 forever) instead of the Sound's own.
+        :param maxtime: stop after this many milliseconds instead of the
+            Sound's own maxtime.
+        :returns: Future resolving to True when the stream has finished, or to
+            False if the channel was busy and nothing was played.
+        """
+        if self._info is None:
+            return super().play(interrupt, blocking, fadein_ms, loops, maxtime)
+        logger.info(
+            "Stream Sound %s on channel:%s, fadein:%s",
+            self.filename,
+            self._channel_num,
+            fadein_ms,
+        )
+        if self.is_busy and not interrupt:
+            logger.warn(
+                "Channel %s Busy; couldn't play %s", self._channel_num, self.filename
+            )
+            _busy[self._channel_num].inc()
+            return finished(False)
+        with self._lock:
+            future, previous = self._start(
+                loops, self._maxtime if maxtime is None else maxtime
+            )
+            self._channel.play(self._next_chunk(), fade_ms=fadein_ms)
+            self._top_up()
+        self._retire(previous)
+        trace(Kind.PLAY, self._channel_num, self._filename)
+        _plays[self._channel_num].inc()
         if blocking:
-            logger.info(f"Queue Sound {self.filename} waiting")
-            while self._channel.get_queue():
-                time.sleep(0.1)
-        elif self._channel.get_queue():
-            logger.info(f"Queue Sound {self.filename} kicked somebody out")
-        self._channel.queue(self._sound)
-        logger.info(f"Queue Sound {self.filename} queued")
+            future.result()
+            logger.info("Sound %s finished (blocked)", self.filename)
+        return future
+
+    def queue(self, blocking: bool = True) -> Future:
+        """
+        Queue Sound (streamed).
+        :param blocking: block until able to queue.
+        :returns: Future resolving when the stream has finished.
+        """
+        if self._info is None:
+            return super().queue(blocking)
+        queued = self._channel.get_queue()
+        if queued and blocking:
+            logger.info("Queue Sound %s waiting", self.filename)
+            self.queue_free().result()
+        with self._lock:
+            future, previous = self._start()
+            self._channel.queue(self._next_chunk())
+            # An idle channel plays a queued sound straight away
+            self._top_up()
+        self._retire(previous)
+        trace(Kind.PLAY, self._channel_num, self._filename, 1)
+        _plays[self._channel_num].inc()
+        logger.info("Queue Sound %s queued (streamed)", self.filename)
+        return future
+
+
+def _init_engine() -> None:
+    """Start the software mixer (if configured and numpy is installed)."""
+    global engine
+    if not constants.software_mixer:
+        return
+    if not mixer.available():
+        logger.warning("Software mixer needs numpy; using the pygame mixer")
+        return
+    engine = mixer.Engine(
+        output=OUTPUT_CHANNEL,
+        names=audio_channels,
+        block_frames=mixer_format[3],
+        gain_db=constants.mixer_gain_db,
+        ducking=constants.mixer_ducking,
+        limiter=constants.mixer_limiter,
+        on_start=_listen,
+    )
+    _feeders[OUTPUT_CHANNEL] = engine
+    logger.info("Software mixer: %s frame blocks", mixer_format[3])
+
+
+def _open() -> None:
+    """Open the audio device (in the pre_init() format)."""
+    pygame.mixer.init()
+    # must come *after* .init; the last channel carries the software mix
+    pygame.mixer.set_num_channels(len(audio_channels) + 1)
+
+
+def _set_endevents() -> None:
+    """Have every channel (and the software mixer's output) post end events."""
+    if engine is not None:
+        output = pygame.mixer.Channel(OUTPUT_CHANNEL)
+        output.set_endevent(END_EVENT_BASE + OUTPUT_CHANNEL)
+    for n in audio_channels.values():
+        channel(n).set_endevent(END_EVENT_BASE + n)
+
+
+def suspend() -> bool:
+    """
+    Close the audio device (e.g. while idle; see liftaway.idle).
+
+    Even in silence, its thread wakes for every mixer buffer. Decoded
+    sounds are kept; resume() opens it again.
+
+    :returns: whether it was closed (it isn't if anything is playing).
+    """
+    global _suspended
+    with _device_lock:
+        if _suspended:
+            return True
+        busy = [pygame.mixer.Channel(n).get_busy() for n in range(OUTPUT_CHANNEL + 1)]
+        if any(busy) or music().get_busy() or (engine and engine.running):
+            return False
+        pygame.mixer.quit()
+        _suspended = True
+    logger.info("Audio device closed")
+    return True
+
+
+def suspended() -> bool:
+    """Is the audio device closed (see suspend())."""
+    return _suspended
+
+
+def resume() -> bool:
+    """
+    Reopen the audio device after suspend().
+
+    :returns: whether Music must be load()ed again (pygame.mixer.music
+        forgets its track when closed; the software mixer keeps its own).
+    """
+    global _suspended
+    with _device_lock:
+        if not _suspended:
+            return False
+        _open()
+        _set_endevents()
+        _suspended = False
+    logger.info("Audio device reopened")
+    return engine is None
 
 
 def init():
     """Initialize Audio subsystem (pygame)."""
-    pygame.mixer.pre_init(44100, -16, 2, 3072)  # setup mixer to avoid sound lag
+    pygame.mixer.pre_init(*mixer_format)  # setup mixer to avoid sound lag
     # (freq, bits, channels, buffer)
-    pygame.init()  # initialize pygame - this is where terrible things happen
-    pygame.mixer.set_num_channels(len(audio_channels))  # must come *after* .init
+    # No display on the cabin; the event queue still needs a video driver
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    # Just the mixer and the event queue (which lives in the video
+    # subsystem); pygame.init() would bring up every module we don't use
+    pygame.display.init()
+    _open()
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(
+        [END_EVENT_BASE + n for n in range(OUTPUT_CHANNEL + 1)]
+    )
+    _init_engine()
+    _set_endevents()
+    Thread(target=_end_event_loop, name="audio-end-events", daemon=True).start()
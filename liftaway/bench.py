@@ -0,0 +1,488 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway button-storm load generator and latency benchmarks.
+
+Scenarios are timed sequences of button presses replayed through the
+simulated GPIO backend (LIFTAWAY_BACKEND=sim) into a real Controller. The
+simulated hardware log is then mined for:
+
+* press_to_led: floor press -> floor LED on
+* press_to_audio: press -> first clip started (travel for floors, the
+  flavour clip for flavour buttons)
+* cancel_to_silence: cancel press -> default and movement channels idle
+  (the halt screech a cancel plays on purpose doesn't count)
+* cancel_to_dark: cancel press -> floor and direction LEDs all off
+
+plus presses sent/handled, floor presses dropped (handled, but neither
+queued nor coalesced with one already pending), edges the debouncer
+rejected and CPU time per scenario. Results are saved as JSON so runs can
+be compared, and check() reports any cancel slower than CANCEL_BOUND_MS.
+
+power() measures CPU wakeups per minute with the cabin awake and idle (see
+liftaway.idle), and how quickly a press wakes it: the ceiling light back on,
+and the audio device (closed while idle) open again.
+"""
+
+import json
+import logging
+import random
+import time
+from threading import Thread
+from typing import Dict, List, NamedTuple, Tuple
+
+import liftaway.audio as audio
+import liftaway.constants as constants
+from liftaway.audio import audio_channels
+from liftaway.config import cabin
+from liftaway.hardware import BACKEND
+from liftaway.idle import IDLE, WAKE_BOUND_S, wakeups
+from liftaway.low_level import CEILING_NORMAL
+
+
+logger = logging.getLogger(__name__)
+
+# (seconds from scenario start, button) where button is "floor:N" or a
+# flavour/cancel name (see liftaway.config.ACTIONS)
+Press = Tuple[float, str]
+
+# bounces: contact bounces on every press and release (see GPIO.press())
+Scenario = NamedTuple(
+    "Scenario",
+    [("name", str), ("presses", List[Press]), ("settle", float), ("bounces", int)],
+)
+
+FLAVOURS = ("voicemail", "no_press", "emergency", "squeaker")
+
+# Channels which must go quiet on cancel
+CABIN_CHANNELS = (audio_channels["default"], audio_channels["movement"])
+
+# Played by a cancel itself; not something cancel has to silence
+HALT_CLIP = constants.in_between_audio["halt"]["filename"]
+
+# LED outputs which must go dark on cancel: the PCA9685 floor LEDs and the
+# direction GPIOs
+FLOOR_LEDS = cabin().floor_leds
+DIRECTION_GPIOS = (cabin().outputs["direction_up"], cabin().outputs["direction_dn"])
+
+# The ceiling light's red channel (full on when awake; see power())
+CEILING_RED = cabin().ceiling_leds.get("red")
+
+# GPIO pin by button name
+PINS = {b.name: b.pin for b in cabin().buttons}
+
+# Cancel must silence the cabin and clear the LEDs within this
+CANCEL_BOUND_MS = 50.0
+
+# power(): quiet time before the cabin goes idle, and how long after it's
+# gone idle (and the fade is over) to start measuring (seconds)
+IDLE_AFTER_S = 1.0
+IDLE_SETTLE_S = 1.0
+
+# power(): how often to check whether the audio device is back (seconds)
+AUDIO_POLL_S = 0.001
+
+
+def button_pin(button: str) -> int:
+    """GPIO pin for a button name."""
+    return PINS[button]
+
+
+def storm(
+    seed: int = 0, duration: float = 2.0, rate: float = 40.0, cancel: bool = True
+) -> Scenario:
+    """Randomized mashing of every floor and flavour button (then cancel)."""
+    rng = random.Random(seed)
+    buttons = [f"floor:{f}" for f in range(cabin().floors)]
+    buttons.extend(FLAVOURS)
+    presses = []  # type: List[Press]
+    t = 0.0
+    while t < duration:
+        presses.append((t, rng.choice(buttons)))
+        t += rng.expovariate(rate)
+    if cancel:
+        presses.append((duration + 0.5, "cancel"))
+    return Scenario(
+        name=f"storm(seed={seed})", presses=presses, settle=3.0, bounces=0
+    )
+
+
+def scenarios(seed: int = 0) -> List[Scenario]:
+    """Built-in scenarios."""
+    return [
+        Scenario(
+            name="single_floor", presses=[(0.0, "floor:4")], settle=2.0, bounces=0
+        ),
+        Scenario(
+            name="flavours",
+            presses=[(i * 0.5, f) for i, f in enumerate(FLAVOURS)],
+            settle=1.0,
+            bounces=0,
+        ),
+        Scenario(
+            name="all_floors",
+            presses=[(i * 0.01, f"floor:{i}") for i in range(cabin().floors)],
+            settle=1.0,
+            bounces=0,
+        ),
+        Scenario(
+            name="cancel_waiting",
+            presses=[(0.0, "floor:3"), (0.0, "floor:7"), (0.5, "cancel")],
+            settle=1.0,
+            bounces=0,
+        ),
+        Scenario(
+            name="cancel_travel",
+            presses=[(0.0, "floor:2"), (1.4, "cancel")],
+            settle=2.0,
+            bounces=0,
+        ),
+        Scenario(
+            name="cancel_floor",
+            presses=[(0.0, "floor:6"), (0.0, "floor:9"), (2.5, "cancel")],
+            settle=2.0,
+            bounces=0,
+        ),
+        # Chattering contacts, and quick repeat presses (each should count)
+        Scenario(
+            name="bouncy",
+            presses=[(0.0, "floor:1"), (0.2, "floor:8")]
+            + [(0.4 + i * 0.2, "squeaker") for i in range(3)],
+            settle=1.0,
+            bounces=4,
+        ),
+        storm(seed=seed),
+    ]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Return the nearest-rank percentiles, in ms, of samples in seconds."""
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "n": len(ordered),
+        "p50": rank(0.50),
+        "p90": rank(0.90),
+        "p99": rank(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _first(records, kind: str, key: int, after: float, value=None) -> float:
+    """Time of the first matching record at or after a time (None if none)."""
+    for r in records:
+        if r.t >= after and r.kind == kind and r.key == key:
+            if value is None or value(r.value):
+                return r.t
+    return None
+
+
+def _level_at(records, kind: str, key: int, at: float, default=0):
+    """Last recorded value (of kind/key) before a time."""
+    value = default
+    for r in records:
+        if r.t >= at:
+            break
+        if r.kind == kind and r.key == key:
+            value = r.value
+    return value
+
+
+def _silent_at(records, after: float) -> float:
+    """First time at or after `after` when every cabin channel is idle."""
+    playing = set()
+    reached = False
+    for r in records:
+        if r.key not in CABIN_CHANNELS or r.kind not in ("play", "end"):
+            continue
+        if r.t >= after and not reached:
+            reached = True
+            if not playing:
+                return after
+        if r.kind == "play" and r.value != HALT_CLIP:
+            playing.add(r.key)
+        else:
+            playing.discard(r.key)
+        if reached and not playing:
+            return r.t
+    return after if not playing else None
+
+
+def _dark_at(records, after: float) -> float:
+    """First time at or after `after` when floor/direction LEDs are all off."""
+    lit = set()
+    reached = False
+    for r in records:
+        if r.kind == "led" and r.key in FLOOR_LEDS:
+            key = ("led", r.key)
+        elif r.kind == "gpio" and r.key in DIRECTION_GPIOS:
+            key = ("gpio", r.key)
+        else:
+            continue
+        if r.t >= after and not reached:
+            reached = True
+            if not lit:
+                return after
+        if r.value:
+            lit.add(key)
+        else:
+            lit.discard(key)
+        if reached and not lit:
+            return r.t
+    return after if not lit else None
+
+
+def measure(presses: List[Tuple[float, str]], records) -> Dict[str, List[float]]:
+    """Latencies (seconds) for presses sent at absolute monotonic times."""
+    latencies = {
+        "press_to_led": [],
+        "press_to_audio": [],
+        "cancel_to_silence": [],
+        "cancel_to_dark": [],
+    }  # type: Dict[str, List[float]]
+    for sent, button in presses:
+        if button.startswith("floor:"):
+            led = FLOOR_LEDS[int(button[6:])]
+            if _level_at(records, "led", led, sent):
+                # Already lit (floor was pending); nothing to wait for
+                lit = sent
+            else:
+                lit = _first(records, "led", led, sent, value=bool)
+            if lit is not None:
+                latencies["press_to_led"].append(lit - sent)
+            played = _first(records, "play", audio_channels["movement"], sent)
+        elif button == "cancel":
+            silent = _silent_at(records, sent)
+            if silent is not None:
+                latencies["cancel_to_silence"].append(silent - sent)
+            dark = _dark_at(records, sent)
+            if dark is not None:
+                latencies["cancel_to_dark"].append(dark - sent)
+            continue
+        else:
+            played = _first(records, "play", audio_channels[button], sent)
+        if played is not None:
+            latencies["press_to_audio"].append(played - sent)
+    return latencies
+
+
+class Bench:
+    """Drives one Controller (simulated hardware) through scenarios."""
+
+    def __init__(self, controller: str = "thread"):
+        """
+        Start a Controller running; needs LIFTAWAY_BACKEND=sim.
+
+        :param controller: "thread" (lift_main.Controller) or "async"
+            (async_controller.AsyncController).
+        """
+        if BACKEND != "sim":
+            raise RuntimeError("benchmarks need LIFTAWAY_BACKEND=sim")
+        from liftaway.simulated import GPIO
+
+        if controller == "async":
+            from liftaway.async_controller import AsyncController as Controller
+        else:
+            from liftaway.lift_main import Controller
+
+        self.gpio = GPIO
+        self.controller = Controller()
+        Thread(target=self.controller.run, name="controller", daemon=True).start()
+
+    def _quiesce(self, timeout: float = 30.0) -> None:
+        """Cancel everything and wait for the cabin to go idle."""
+        from liftaway.hardware import pygame
+
+        self.controller.interrupt()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            busy = any(
+                pygame.mixer.Channel(n).get_busy() for n in audio_channels.values()
+            )
+            c = self.controller
+            if not busy and not c.queue and not c.paused:
+                break
+            time.sleep(0.05)
+        # Let any held presses go
+        time.sleep(0.5)
+
+    def _rejected(self) -> int:
+        """Button edges the debouncer has rejected so far."""
+        stats = self.controller.debouncer.stats().values()
+        return sum(s["rejected"] for s in stats)
+
+    def run(self, scenario: Scenario) -> Dict:
+        """Replay a scenario and return its results."""
+        from liftaway import simulated
+
+        self._quiesce()
+        before = dict(self.controller.counters)
+        rejected = self._rejected()
+        cpu = time.process_time()
+        start = time.monotonic()
+        sent = []  # type: List[Tuple[float, str]]
+        for offset, button in scenario.presses:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            sent.append((time.monotonic(), button))
+            self.gpio.press(button_pin(button), bounces=scenario.bounces)
+        time.sleep(scenario.settle)
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu
+        counters = {
+            k: v - before.get(k, 0) for k, v in self.controller.counters.items()
+        }
+        records = simulated.records(since=start)
+        latencies = measure(sent, records)
+        handled = sum(
+            counters.get(k, 0) for k in ("floor", "cancel") + FLAVOURS
+        )
+        # Floor presses the controller saw but neither queued nor coalesced
+        dropped = counters.get("floor", 0) - sum(
+            counters.get(k, 0)
+            for k in ("floor_queued", "floor_duplicate", "floor_lamp_test")
+        )
+        return {
+            "scenario": scenario.name,
+            "presses": len(sent),
+            "handled": handled,
+            "debounced": len(sent) - handled,
+            "rejected_edges": self._rejected() - rejected,
+            "dropped": dropped,
+            "duplicates": counters.get("floor_duplicate", 0),
+            "latency_ms": {k: percentiles(v) for k, v in latencies.items()},
+            "cpu_s": round(cpu, 4),
+            "wall_s": round(elapsed, 3),
+        }
+
+
+def run_all(seed: int = 0, controller: str = "thread") -> Dict:
+    """Run every built-in scenario."""
+    bench = Bench(controller=controller)
+    results = [bench.run(s) for s in scenarios(seed)]
+    return {
+        "created": time.time(),
+        "seed": seed,
+        "controller": controller,
+        "results": results,
+    }
+
+
+def _wakeup_rate(window: float) -> float:
+    """CPU wakeups per minute over the next window seconds."""
+    before = wakeups()
+    time.sleep(window)
+    return round((wakeups() - before) * 60 / window, 1)
+
+
+def power(window: float = 30.0, controller: str = "thread") -> Dict:
+    """
+    Measure CPU wakeups per minute awake and idle, and how long waking takes.
+
+    Wakeups are counted with the cabin awake (muzak playing, nobody
+    pressing anything) and then idle, over window seconds each. Waking
+    is timed from a cancel press to the ceiling light being back on and
+    to the audio device being open again (None if it wasn't closed while
+    idle).
+    """
+    from liftaway import simulated
+
+    bench = Bench(controller=controller)
+    idle = bench.controller.idle
+    bench.controller.ready.result()
+    # Stay awake while measuring that
+    idle.after_s = 0
+    idle.start()
+    active = _wakeup_rate(window)
+    idle.after_s = IDLE_AFTER_S
+    idle.start()
+    time.sleep(IDLE_AFTER_S + constants.idle_fade_ms / 1000 + IDLE_SETTLE_S)
+    if idle.mode != IDLE:
+        raise RuntimeError("the cabin didn't go idle")
+    idling = _wakeup_rate(window)
+    closed = audio.suspended()
+    sent = time.monotonic()
+    bench.gpio.press(button_pin("cancel"))
+    opened = None
+    while closed and time.monotonic() - sent < 1.0:
+        if not audio.suspended():
+            opened = time.monotonic()
+            break
+        time.sleep(AUDIO_POLL_S)
+    # (Until the muzak has faded back in)
+    time.sleep(constants.idle_wake_fade_ms / 1000 + IDLE_SETTLE_S)
+    lit = _first(
+        simulated.records(since=sent),
+        "led",
+        CEILING_RED,
+        sent,
+        lambda duty: duty == CEILING_NORMAL[0],
+    )
+    return {
+        "created": time.time(),
+        "controller": controller,
+        "window_s": window,
+        "wakeups_per_minute": {"active": active, "idle": idling},
+        "wake_ms": round((lit - sent) * 1000, 2) if lit is not None else None,
+        "audio_ms": round((opened - sent) * 1000, 2) if opened else None,
+        "wake_bound_ms": WAKE_BOUND_S * 1000,
+    }
+
+
+def check(results: Dict, bound_ms: float = CANCEL_BOUND_MS) -> List[str]:
+    """Return the cancels slower than bound_ms (empty if all were within it)."""
+    violations = []
+    for r in results["results"]:
+        for metric in ("cancel_to_silence", "cancel_to_dark"):
+            stats = r["latency_ms"].get(metric, {})
+            if stats.get("n") and stats["max"] > bound_ms:
+                violations.append(
+                    f"{r['scenario']}: {metric} max {stats['max']:.2f}ms "
+                    f"> {bound_ms:.0f}ms"
+                )
+    return violations
+
+
+def compare(base: Dict, new: Dict) -> List[str]:
+    """Human readable p50/p99 deltas between two saved runs."""
+    lines = []
+    old = {r["scenario"]: r for r in base["results"]}
+    for r in new["results"]:
+        b = old.get(r["scenario"])
+        if b is None:
+            continue
+        for metric, stats in r["latency_ms"].items():
+            was = b["latency_ms"].get(metric, {})
+            for p in ("p50", "p99"):
+                if p in stats and p in was:
+                    lines.append(
+                        f"{r['scenario']:<20} {metric:<18} {p} "
+                        f"{was[p]:>9.2f} -> {stats[p]:>9.2f} ms"
+                    )
+        lines.append(
+            f"{r['scenario']:<20} {'dropped':<18}     "
+            f"{b['dropped']:>9} -> {r['dropped']:>9}"
+        )
+        lines.append(
+            f"{r['scenario']:<20} {'cpu_s':<18}     "
+            f"{b['cpu_s']:>9.3f} -> {r['cpu_s']:>9.3f}"
+        )
+    return lines
+
+
+def save(results: Dict, path: str) -> None:
+    """Save results as JSON."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> Dict:
+    """Load saved results."""
+    with open(path) as f:
+        return json.load(f)
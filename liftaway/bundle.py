@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway audio asset bundle.
+
+Every asset referenced in liftaway.constants is converted offline to the
+mixer's native format (see constants.mixer_format), loudness normalized and
+packed into one page-aligned file::
+
+    b"LIFTPCM1" | u32 index length | JSON index | pad | PCM | pad | PCM ...
+
+The index maps filename -> [offset, length]. At runtime the bundle is memory
+mapped once; sounds are created straight from the mapped PCM (no WAV parsing
+or resampling) and StreamingSound reads its chunks from it directly.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import warnings
+import wave
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import liftaway.config as config
+import liftaway.constants as constants
+from liftaway.util import data_resource_filename
+from liftaway.wavfile import WavInfo
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LIFTPCM1"
+PAGE_SIZE = mmap.PAGESIZE
+BUNDLE_FILENAME = "assets.bundle"
+
+# Default loudness targets (dBFS) for normalize()
+RMS_DBFS = -20.0
+PEAK_DBFS = -1.0
+
+
+def referenced_assets(cabin: config.Cabin = None) -> List[str]:
+    """Every audio filename the cabin (default: liftaway.config's) plays."""
+    cabin = cabin or config.cabin()
+    specs = list(constants.in_between_audio.values())  # type: List[Dict]
+    for sounds in cabin.floor_audio + tuple(cabin.button_audio.values()):
+        specs.extend(sounds)
+    return sorted({s["filename"] for s in specs})
+
+
+def _audioop():
+    """
+    audioop, imported when first needed rather than with this module.
+
+    It's deprecated (PEP 594) and gone from the standard library in Python
+    3.13 (audioop-lts stands in there), but is still the only C-speed PCM
+    toolkit; the controller imports this module without ever converting.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+    return audioop
+
+
+def convert(path: str, rate: int, width: int, channels: int) -> bytes:
+    """Read a WAV and convert it to rate/width(bytes)/channels PCM."""
+    audioop = _audioop()
+    with wave.open(path, "rb") as w:
+        src_channels = w.getnchannels()
+        src_width = w.getsampwidth()
+        src_rate = w.getframerate()
+        pcm = w.readframes(w.getnframes())
+    if src_width == 1:
+        # 8-bit WAV is unsigned
+        pcm = audioop.bias(pcm, 1, -128)
+    if src_width != width:
+        pcm = audioop.lin2lin(pcm, src_width, width)
+    if src_channels == 1 and channels == 2:
+        pcm = audioop.tostereo(pcm, width, 1, 1)
+    elif src_channels == 2 and channels == 1:
+        pcm = audioop.tomono(pcm, width, 0.5, 0.5)
+    elif src_channels != channels:
+        raise ValueError(f"{path}: can't convert {src_channels} channels")
+    if src_rate != rate:
+        pcm, _ = audioop.ratecv(pcm, width, channels, src_rate, rate, None)
+    return pcm
+
+
+def normalize(pcm: bytes, width: int, rms_dbfs: float, peak_dbfs: float) -> bytes:
+    """
+    Scale PCM toward a target RMS level without exceeding a peak ceiling.
+
+    Levels are in dB relative to full scale.
+    """
+    audioop = _audioop()
+    full_scale = float(1 << (8 * width - 1))
+    rms = audioop.rms(pcm, width)
+    peak = audioop.max(pcm, width)
+    if not rms or not peak:
+        return pcm
+    gain = (full_scale * 10 ** (rms_dbfs / 20)) / rms
+    gain = min(gain, (full_scale * 10 ** (peak_dbfs / 20)) / peak)
+    return audioop.mul(pcm, width, gain)
+
+
+def prepare(
+    path: str,
+    rate: int,
+    width: int,
+    channels: int,
+    rms_dbfs: float = RMS_DBFS,
+    peak_dbfs: float = PEAK_DBFS,
+    normalized: bool = True,
+) -> bytes:
+    """Convert a WAV to mixer PCM and (unless not normalized) normalize it."""
+    pcm = convert(path, rate, width, channels)
+    if normalized:
+        pcm = normalize(pcm, width, rms_dbfs, peak_dbfs)
+    return pcm
+
+
+def _pad(n: int) -> int:
+    """Bytes needed to bring n up to a page boundary."""
+    return -n % PAGE_SIZE
+
+
+def build(
+    path: str,
+    filenames: Iterable[str] = None,
+    rms_dbfs: float = RMS_DBFS,
+    peak_dbfs: float = PEAK_DBFS,
+    normalized: bool = True,
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Convert and pack assets into a bundle at path.
+
+    Returns the index (filename -> (offset, length)).
+    """
+    rate, bits, channels, _ = constants.mixer_format
+    width = abs(bits) // 8
+    blobs = []  # type: List[Tuple[str, bytes]]
+    for filename in filenames or referenced_assets():
+        source = data_resource_filename(filename)
+        if not os.path.exists(source):
+            logger.warning("Bundle: %s missing; skipped", filename)
+            continue
+        pcm = prepare(
+            source, rate, width, channels, rms_dbfs, peak_dbfs, normalized
+        )
+        logger.info("Bundle: %s %s bytes", filename, len(pcm))
+        blobs.append((filename, pcm))
+
+    # Offsets depend on the index size and vice versa; widths are fixed so
+    # iterate until the page-aligned data start settles.
+    start = PAGE_SIZE
+    while True:
+        index = {}
+        offset = start
+        for filename, pcm in blobs:
+            index[filename] = (offset, len(pcm))
+            offset += len(pcm) + _pad(len(pcm))
+        header = json.dumps(
+            {"format": [rate, bits, channels], "assets": index}, sort_keys=True
+        ).encode("utf-8")
+        header_size = len(MAGIC) + 4 + len(header)
+        if header_size + _pad(header_size) == start:
+            break
+        start = header_size + _pad(header_size)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(b"\0" * _pad(header_size))
+        for _, pcm in blobs:
+            f.write(pcm)
+            f.write(b"\0" * _pad(len(pcm)))
+    os.replace(tmp, path)
+    return index
+
+
+class Bundle:
+    """Read-only memory-mapped asset bundle."""
+
+    def __init__(self, path: str):
+        """Map the bundle at path; raises ValueError if it's stale or foreign."""
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an asset bundle")
+        (size,) = struct.unpack_from("<I", self.map, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self.map[start : start + size].decode("utf-8"))
+        rate, bits, channels = header["format"]
+        if (rate, bits, channels) != tuple(constants.mixer_format[:3]):
+            raise ValueError(f"{path} format {header['format']} != mixer format")
+        self.rate = rate
+        self.sample_width = abs(bits) // 8
+        self.channels = channels
+        self._index = {k: tuple(v) for k, v in header["assets"].items()}
+
+    def __contains__(self, filename: str) -> bool:
+        """Is filename in the bundle."""
+        return filename in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        """Filenames in the bundle."""
+        return iter(self._index)
+
+    def info(self, filename: str) -> WavInfo:
+        """Location of filename's PCM, WavInfo style (offsets into map)."""
+        offset, length = self._index[filename]
+        return WavInfo(
+            channels=self.channels,
+            sample_width=self.sample_width,
+            rate=self.rate,
+            data_offset=offset,
+            data_size=length,
+        )
+
+    def view(self, filename: str) -> memoryview:
+        """Zero-copy view of filename's PCM."""
+        offset, length = self._index[filename]
+        return memoryview(self.map)[offset : offset + length]
+
+    @property
+    def nbytes(self) -> int:
+        """Mapped size."""
+        return len(self.map)
+
+
+_bundle = None
+_bundle_checked = False
+
+
+def open_bundle() -> Bundle:
+    """Return the installed asset bundle (None if there isn't a usable one)."""
+    global _bundle, _bundle_checked
+    if not _bundle_checked:
+        _bundle_checked = True
+        path = data_resource_filename(BUNDLE_FILENAME)
+        if os.path.exists(path):
+            try:
+                _bundle = Bundle(path)
+                logger.info("Asset bundle %s (%s bytes)", path, _bundle.nbytes)
+            except ValueError as e:
+                logger.warning("Ignoring asset bundle: %s", e)
+    return _bundle
@@ -1,16 +1,222 @@
 # -*- coding: utf-8 -*-
 
 """Console script for liftaway."""
+import logging
+import os
 import sys
+import time
 
 import click
 
 
-@click.command()
-def main(args=None):
-    """Console script for liftaway."""
-    click.echo("Replace this message by putting your code into liftaway.cli.main")
-    click.echo("See click documentation at http://click.pocoo.org/")
+@click.group()
+@click.option("-v", "--verbose", is_flag=True, help="Debug logging.")
+def main(verbose=False):
+    """Liftaway maintenance tools."""
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+
+@main.command()
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Bundle path (default: the package data directory).",
+)
+@click.option("--rms-dbfs", default=-20.0, show_default=True, help="Target RMS level.")
+@click.option("--peak-dbfs", default=-1.0, show_default=True, help="Peak ceiling.")
+@click.option("--no-normalize", is_flag=True, help="Convert only; keep levels.")
+def bundle(output, rms_dbfs, peak_dbfs, no_normalize):
+    """Convert, normalize and pack audio assets into one mmap-able bundle."""
+    from liftaway.bundle import BUNDLE_FILENAME, build
+    from liftaway.util import data_resource_filename
+
+    path = output or data_resource_filename(BUNDLE_FILENAME)
+    index = build(
+        path, rms_dbfs=rms_dbfs, peak_dbfs=peak_dbfs, normalized=not no_normalize
+    )
+    total = sum(length for _, length in index.values())
+    click.echo(f"Wrote {len(index)} assets ({total} PCM bytes) to {path}")
+    return 0
+
+
+@main.command()
+@click.option("--seed", default=0, show_default=True, help="Button storm seed.")
+@click.option(
+    "--speed", default=20.0, show_default=True, help="Simulated clip speedup."
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Results file (default: bench-<timestamp>.json).",
+)
+@click.option(
+    "--compare",
+    "baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Earlier results to compare against.",
+)
+@click.option(
+    "--controller",
+    type=click.Choice(["thread", "async"]),
+    default="thread",
+    show_default=True,
+    help="Controller implementation to drive.",
+)
+def bench(seed, speed, output, baseline, controller):
+    """Replay button storms on simulated hardware and report latencies."""
+    # Must be set before liftaway.hardware is imported
+    os.environ["LIFTAWAY_BACKEND"] = "sim"
+    os.environ["LIFTAWAY_SIM_SPEED"] = str(speed)
+    logging.getLogger("liftaway").setLevel(logging.WARNING)
+    from liftaway import bench as benchmarks
+
+    results = benchmarks.run_all(seed=seed, controller=controller)
+    results["speed"] = speed
+    path = output or time.strftime("bench-%Y%m%d-%H%M%S.json")
+    benchmarks.save(results, path)
+    for r in results["results"]:
+        click.echo(
+            f"{r['scenario']:<20} presses:{r['presses']:<4} "
+            f"handled:{r['handled']:<4} dropped:{r['dropped']:<3} "
+            f"rejected:{r['rejected_edges']:<4} cpu:{r['cpu_s']:.3f}s"
+        )
+        for metric, stats in r["latency_ms"].items():
+            if stats["n"]:
+                click.echo(
+                    f"    {metric:<18} n={stats['n']:<4} p50={stats['p50']:.2f} "
+                    f"p90={stats['p90']:.2f} p99={stats['p99']:.2f} ms"
+                )
+    click.echo(f"Saved {path}")
+    if baseline:
+        for line in benchmarks.compare(benchmarks.load(baseline), results):
+            click.echo(line)
+    violations = benchmarks.check(results)
+    for line in violations:
+        click.echo(f"FAIL {line}")
+    if violations:
+        sys.exit(1)
+    return 0
+
+
+@main.command()
+@click.option(
+    "--window", default=30.0, show_default=True, help="Seconds measured per mode."
+)
+@click.option(
+    "--controller",
+    type=click.Choice(["thread", "async"]),
+    default="thread",
+    show_default=True,
+    help="Controller implementation to drive.",
+)
+def power(window, controller):
+    """
+    Measure CPU wakeups per minute awake and idle (simulated hardware).
+
+    LIFTAWAY_MIXER=pygame measures with the real pygame mixer and event queue.
+    """
+    # Must be set before liftaway.hardware is imported
+    os.environ["LIFTAWAY_BACKEND"] = "sim"
+    logging.getLogger("liftaway").setLevel(logging.WARNING)
+    from liftaway import bench as benchmarks
+
+    r = benchmarks.power(window=window, controller=controller)
+    for mode, rate in r["wakeups_per_minute"].items():
+        click.echo(f"{mode:<7} {rate:8.1f} wakeups/min")
+    if r["wake_ms"] is None:
+        click.echo("FAIL the ceiling light never came back on")
+        sys.exit(1)
+    click.echo(f"wake    {r['wake_ms']:8.2f} ms (press to ceiling light)")
+    if r["audio_ms"] is None:
+        click.echo("FAIL the audio device wasn't closed, or never reopened")
+        sys.exit(1)
+    click.echo(f"audio   {r['audio_ms']:8.2f} ms (press to audio device open)")
+    if max(r["wake_ms"], r["audio_ms"]) > r["wake_bound_ms"]:
+        click.echo(f"FAIL waking took over {r['wake_bound_ms']:.0f}ms")
+        sys.exit(1)
+    return 0
+
+
+@main.command()
+@click.option("--seed", default=0, show_default=True, help="Workload seed.")
+@click.option("--presses", default=200, show_default=True, help="Floor presses.")
+@click.option(
+    "--rate", default=0.1, show_default=True, help="Presses per second (average)."
+)
+@click.option("--cars", default=3, show_default=True, help="Up to this many cars.")
+def dispatch(seed, presses, rate, cars):
+    """Compare dispatch policies' average wait per press (simulated cars)."""
+    import liftaway.constants as constants
+    from liftaway.config import cabin
+    from liftaway.dispatch import POLICIES, simulate, workload
+
+    floors = cabin().floors
+    load = workload(seed=seed, presses=presses, rate=rate, floors=floors)
+    for n in range(1, cars + 1):
+        for policy in POLICIES:
+            r = simulate(
+                load,
+                cars=n,
+                policy=policy,
+                floors=floors,
+                travel_s=constants.travel_seconds_per_floor,
+                depart_s=constants.depart_seconds,
+            )
+            click.echo(
+                f"cars:{n} {policy:<5} mean:{r['mean_s']:7.1f}s "
+                f"p50:{r['p50_s']:7.1f}s p90:{r['p90_s']:7.1f}s "
+                f"max:{r['max_s']:7.1f}s floors:{r['floors_travelled']}"
+            )
+    return 0
+
+
+@main.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False), required=False)
+@click.option("--defaults", is_flag=True, help="Print the built-in cabin as JSON.")
+def config(path, defaults):
+    """Check a cabin configuration file (default: LIFTAWAY_CONFIG)."""
+    import json
+
+    from liftaway import config as cabin_config
+
+    if defaults:
+        click.echo(json.dumps(cabin_config.defaults(), indent=2))
+        return 0
+    path = path or os.environ.get(cabin_config.CONFIG_ENV)
+    try:
+        cabin = cabin_config.load(path)
+    except (OSError, cabin_config.ConfigError) as e:
+        click.echo(f"Invalid: {e}", err=True)
+        sys.exit(1)
+    click.echo(
+        f"{path or 'Built-in cabin'}: {cabin.floors} floors, "
+        f"{len(cabin.buttons) - cabin.floors} other buttons, "
+        f"{len(cabin.outputs)} outputs, {len(cabin.channels)} audio channels"
+    )
+    for b in cabin.buttons:
+        click.echo(f"  pin {b.pin:>2} {b.name:<10} debounce {b.debounce}ms")
+    return 0
+
+
+@main.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--button", default=None, help="Only presses of this button.")
+def trace(path, button):
+    """Show per-press timelines from a LIFTAWAY_TRACE file."""
+    from liftaway.trace import format_timeline, load, timelines
+
+    for timeline in timelines(load(path)):
+        if button is None or timeline["button"] == button:
+            for line in format_timeline(timeline):
+                click.echo(line)
     return 0
 
 
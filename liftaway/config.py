@@ -0,0 +1,496 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway cabin configuration.
+
+A cabin is its floors (button pin, button LED and audio for each), its
+other buttons (pin, debounce time and audio), the GPIO outputs, the ceiling
+light's LED channels and the audio channel names. It's read from the JSON
+file named by LIFTAWAY_CONFIG, or built from liftaway.constants when that
+isn't set, validated, and compiled once into a Cabin: tuples indexed by
+floor, pin or channel number, so the button and LED paths never look
+anything up by name. `liftaway config --defaults` prints the built-in
+cabin as a starting point. With LIFTAWAY_WATCH set the controller picks up
+changes to the file without a restart (see Controller.reload()).
+
+Example (abridged)::
+
+    {
+      "floors": [
+        {"pin": 22, "led": 0, "audio": [{"filename": "train.wav"}]},
+        {"pin": 4, "led": 1, "audio": [{"filename": "rocket.wav"}]}
+      ],
+      "floor_debounce": 20,
+      "buttons": {
+        "cancel": {"pin": 27, "debounce": 10},
+        "squeaker": {"pin": 26, "debounce": 10,
+                     "audio": [{"filename": "squeak2.wav",
+                                "audio_channel": "squeaker"}]}
+      },
+      "outputs": {"cancel_call": 10, "direction_up": 14, "direction_dn": 15},
+      "ceiling_leds": {"red": 14, "green": 13, "blue": 15},
+      "channels": ["default", "movement", "squeaker"],
+      "gestures": [
+        {"gesture": "hold", "buttons": ["cancel"], "ms": 3000,
+         "action": "clear"},
+        {"gesture": "double", "buttons": ["squeaker"], "action": "no_press"}
+      ]
+    }
+
+Gestures (liftaway.gestures) are a button held for ms, pressed twice in
+quick succession, or a chord of buttons pressed together (within ms), bound
+to one of GESTURE_ACTIONS.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import liftaway.constants as constants
+
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ENV = "LIFTAWAY_CONFIG"
+
+# Highest BCM GPIO pin on the Pi header
+MAX_PIN = 27
+
+# PCA9685 PWM (LED) channels
+PWM_CHANNELS = 16
+
+# Buttons other than floors, by the controller action they run
+ACTIONS = ("cancel", "emergency", "voicemail", "no_press", "squeaker")
+
+# GPIO outputs; the controller can't do without the first three
+REQUIRED_OUTPUTS = ("cancel_call", "direction_up", "direction_dn")
+OUTPUTS = REQUIRED_OUTPUTS + ("door_close", "door_open", "emergency_call", "nothing")
+
+CEILING_COLOURS = ("red", "green", "blue")
+
+# Gestures (see liftaway.gestures), and the actions they can be bound to:
+# any button's (but a floor's), or clearing everything and toggling
+# maintenance mode (see Controller.clear() and Controller.maintenance())
+GESTURES = ("hold", "double", "chord")
+GESTURE_ACTIONS = ACTIONS + ("clear", "maintenance")
+
+# Longest debounce time (ms) a button may have
+MAX_DEBOUNCE_MS = 1000
+
+# Sound() keyword arguments an audio entry may have, with their types
+AUDIO_KEYS = {
+    "filename": str,
+    "volume": (int, float),
+    "audio_channel": str,
+    "loops": int,
+    "maxtime": int,
+    "fade_ms": int,
+}
+
+# Button: name is "floor:N" or the action; arg is the floor number (or 0)
+Button = NamedTuple(
+    "Button",
+    [
+        ("name", str),
+        ("action", str),
+        ("arg", int),
+        ("pin", int),
+        ("debounce", int),  # ms; see liftaway.debounce
+    ],
+)
+
+# Gesture: kind (one of GESTURES) of buttons (names; pins by the same
+# index), bound to action; ms is a hold's length or a chord's window
+Gesture = NamedTuple(
+    "Gesture",
+    [
+        ("kind", str),
+        ("buttons", Tuple[str, ...]),
+        ("pins", Tuple[int, ...]),
+        ("ms", int),
+        ("action", str),
+    ],
+)
+
+Cabin = NamedTuple(
+    "Cabin",
+    [
+        ("floors", int),
+        ("floor_pins", Tuple[int, ...]),  # by floor
+        ("floor_leds", Tuple[int, ...]),  # PWM channel by floor
+        ("floor_audio", Tuple[Tuple[Dict, ...], ...]),  # by floor
+        ("buttons", Tuple[Button, ...]),  # floors first, in floor order
+        ("button_audio", Dict[str, Tuple[Dict, ...]]),  # by action
+        ("outputs", Dict[str, int]),  # output name -> pin
+        ("output_labels", Tuple[str, ...]),  # by pin ("" if not an output)
+        ("ceiling_leds", Dict[str, int]),  # colour -> PWM channel
+        ("channels", Tuple[str, ...]),  # audio channel names by number
+        ("gestures", Tuple[Gesture, ...]),
+    ],
+)
+
+
+class ConfigError(ValueError):
+    """Invalid cabin configuration (every problem found, one per line)."""
+
+
+def defaults() -> Dict:
+    """Return the built-in cabin (from liftaway.constants), as configuration."""
+    floors = sorted(constants.floor_to_gpio_mapping)
+    button_audio = {
+        "cancel": (),
+        "emergency": constants.emergency_button_audio,
+        "voicemail": constants.voicemail_button_audio,
+        "no_press": constants.no_press_button_audio,
+        "squeaker": constants.squeaker_button_audio,
+    }
+    buttons = {}
+    for action, pin in constants.flavor_to_gpio_mapping.items():
+        buttons[action] = {
+            "pin": pin,
+            "debounce": constants.button_debounce_ms[action],
+        }
+        if button_audio[action]:
+            buttons[action]["audio"] = [dict(a) for a in button_audio[action]]
+    return {
+        "floors": [
+            {
+                "pin": constants.floor_to_gpio_mapping[floor],
+                "led": constants.floor_to_led_mapping[floor],
+                "audio": [dict(a) for a in constants.floor_audio[floor]],
+            }
+            for floor in floors
+        ],
+        "floor_debounce": constants.button_debounce_ms["floor"],
+        "buttons": buttons,
+        "outputs": dict(constants.control_outputs),
+        "ceiling_leds": dict(constants.ceiling_leds),
+        "channels": list(constants.audio_channel_names),
+        "gestures": [dict(g) for g in constants.gesture_bindings],
+    }
+
+
+def _check_keys(where: str, value, required, optional, errors: List[str]) -> bool:
+    """Check value is an object with the required keys and no strangers."""
+    if not isinstance(value, dict):
+        errors.append(f"{where}: expected an object")
+        return False
+    for key in required:
+        if key not in value:
+            errors.append(f"{where}: missing {key!r}")
+    for key in value:
+        if key not in required and key not in optional:
+            errors.append(f"{where}: unknown key {key!r}")
+    return all(key in value for key in required)
+
+
+def _check_int(where: str, value, low: int, high: int, errors: List[str]) -> bool:
+    """Check value is an int in [low, high]."""
+    if isinstance(value, bool) or not isinstance(value, int):
+        errors.append(f"{where}: expected an integer, got {value!r}")
+        return False
+    if not low <= value <= high:
+        errors.append(f"{where}: {value} not in {low}..{high}")
+        return False
+    return True
+
+
+def _check_audio(where: str, audio, channels, errors: List[str]) -> None:
+    """Check a list of Sound() keyword arguments."""
+    if not isinstance(audio, list) or not audio:
+        errors.append(f"{where}: expected a list of one or more sounds")
+        return
+    for i, sound in enumerate(audio):
+        at = f"{where}[{i}]"
+        if not _check_keys(at, sound, ("filename",), AUDIO_KEYS, errors):
+            continue
+        for key, value in sound.items():
+            if key in AUDIO_KEYS and not isinstance(value, AUDIO_KEYS[key]):
+                errors.append(f"{at}.{key}: unexpected {value!r}")
+        volume = sound.get("volume", 1.0)
+        if isinstance(volume, (int, float)) and not 0 <= volume <= 1:
+            errors.append(f"{at}.volume: {volume} not in 0..1")
+        channel = sound.get("audio_channel", "default")
+        if channel not in channels:
+            errors.append(f"{at}.audio_channel: no channel {channel!r}")
+
+
+def _claim(
+    table: Dict[int, str], what: str, value: int, where: str, errors: List[str]
+) -> None:
+    """Record where uses value (a pin or LED channel), unless it's taken."""
+    if value in table:
+        errors.append(f"{where}: {what} {value} already used by {table[value]}")
+    table[value] = where
+
+
+def _check_channels(channels, errors: List[str]) -> List[str]:
+    """Check the audio channel names; returns them ([] if unusable)."""
+    if (
+        not isinstance(channels, list)
+        or not all(isinstance(c, str) for c in channels)
+        or len(set(channels)) != len(channels)
+    ):
+        errors.append("channels: expected a list of distinct names")
+        return []
+    for spec in constants.in_between_audio.values():
+        channel = spec.get("audio_channel", "default")
+        if channels and channel not in channels:
+            errors.append(f"channels: missing {channel!r} (in_between_audio)")
+    return channels
+
+
+def _check_floors(
+    floors, channels, pins: Dict[int, str], leds: Dict[int, str], errors: List[str]
+) -> List:
+    """Check the floors, claiming their pins and LEDs; returns them."""
+    if not isinstance(floors, list) or not floors:
+        errors.append("floors: expected a list of one or more floors")
+        return []
+    if len(floors) > PWM_CHANNELS:
+        errors.append(f"floors: more than {PWM_CHANNELS}")
+    for i, floor in enumerate(floors):
+        where = f"floors[{i}]"
+        if not _check_keys(where, floor, ("pin", "led", "audio"), (), errors):
+            continue
+        if _check_int(f"{where}.pin", floor["pin"], 0, MAX_PIN, errors):
+            _claim(pins, "pin", floor["pin"], where, errors)
+        if _check_int(f"{where}.led", floor["led"], 0, PWM_CHANNELS - 1, errors):
+            _claim(leds, "LED channel", floor["led"], where, errors)
+        _check_audio(f"{where}.audio", floor["audio"], channels, errors)
+    return floors
+
+
+def _check_button(
+    action: str, button, channels, pins: Dict[int, str], errors: List[str]
+) -> None:
+    """Check one (non-floor) button, claiming its pin."""
+    where = f"buttons.{action}"
+    if action not in ACTIONS:
+        errors.append(f"{where}: unknown button; one of {ACTIONS}")
+        return
+    # Cancel has no audio; every other button plays something
+    plays = action != "cancel"
+    required = ("pin", "audio") if plays else ("pin",)
+    if not _check_keys(where, button, required, ("debounce",), errors):
+        return
+    if _check_int(f"{where}.pin", button["pin"], 0, MAX_PIN, errors):
+        _claim(pins, "pin", button["pin"], where, errors)
+    if "debounce" in button:
+        debounce = button["debounce"]
+        _check_int(f"{where}.debounce", debounce, 0, MAX_DEBOUNCE_MS, errors)
+    if plays:
+        _check_audio(f"{where}.audio", button["audio"], channels, errors)
+
+
+def _check_outputs(outputs, pins: Dict[int, str], errors: List[str]) -> None:
+    """Check the GPIO outputs, claiming their pins."""
+    if not isinstance(outputs, dict):
+        errors.append("outputs: expected an object")
+        return
+    for name in REQUIRED_OUTPUTS:
+        if name not in outputs:
+            errors.append(f"outputs: missing {name!r}")
+    for name, pin in outputs.items():
+        where = f"outputs.{name}"
+        if name not in OUTPUTS:
+            errors.append(f"{where}: unknown output; one of {OUTPUTS}")
+        elif _check_int(where, pin, 0, MAX_PIN, errors):
+            _claim(pins, "pin", pin, where, errors)
+
+
+def _check_ceiling(ceiling, leds: Dict[int, str], errors: List[str]) -> None:
+    """Check the ceiling light's LED channels, claiming them."""
+    if not _check_keys("ceiling_leds", ceiling, (), CEILING_COLOURS, errors):
+        return
+    for colour, channel in ceiling.items():
+        where = f"ceiling_leds.{colour}"
+        if colour in CEILING_COLOURS and _check_int(
+            where, channel, 0, PWM_CHANNELS - 1, errors
+        ):
+            _claim(leds, "LED channel", channel, where, errors)
+
+
+def validate(raw: Dict) -> None:
+    """Raise ConfigError listing everything wrong with raw configuration."""
+    errors = []  # type: List[str]
+    top = ("floors", "buttons", "outputs", "channels")
+    optional = ("floor_debounce", "ceiling_leds", "gestures")
+    if not _check_keys("config", raw, top, optional, errors):
+        raise ConfigError("\n".join(errors))
+
+    channels = _check_channels(raw["channels"], errors)
+    # Who has each pin and LED channel, so none is used twice
+    pins = {}  # type: Dict[int, str]
+    leds = {}  # type: Dict[int, str]
+    floors = _check_floors(raw["floors"], channels, pins, leds, errors)
+    if "floor_debounce" in raw:
+        _check_int("floor_debounce", raw["floor_debounce"], 0, MAX_DEBOUNCE_MS, errors)
+    buttons = raw["buttons"]
+    if isinstance(buttons, dict):
+        for action, button in buttons.items():
+            _check_button(action, button, channels, pins, errors)
+    else:
+        errors.append("buttons: expected an object")
+    _check_outputs(raw["outputs"], pins, errors)
+    _check_ceiling(raw.get("ceiling_leds", {}), leds, errors)
+
+    names = [f"floor:{i}" for i in range(len(floors))]
+    names += list(buttons) if isinstance(buttons, dict) else []
+    if "gestures" in raw:
+        gestures = raw["gestures"]
+        if isinstance(gestures, list):
+            for i, gesture in enumerate(gestures):
+                _check_gesture(f"gestures[{i}]", gesture, names, errors)
+        else:
+            errors.append("gestures: expected a list")
+
+    if errors:
+        raise ConfigError("\n".join(errors))
+
+
+def _check_gesture(where: str, gesture, names: List[str], errors: List[str]) -> None:
+    """Check a gesture binding against the cabin's button names."""
+    required = ("gesture", "buttons", "action")
+    if not _check_keys(where, gesture, required, ("ms",), errors):
+        return
+    kind = gesture["gesture"]
+    if kind not in GESTURES:
+        errors.append(f"{where}.gesture: {kind!r} not one of {GESTURES}")
+    action = gesture["action"]
+    if action not in GESTURE_ACTIONS:
+        errors.append(f"{where}.action: {action!r} not one of {GESTURE_ACTIONS}")
+    buttons = gesture["buttons"]
+    chord = kind == "chord"
+    if (
+        not isinstance(buttons, list)
+        or not all(isinstance(b, str) for b in buttons)
+        or len(set(buttons)) != len(buttons)
+        or (len(buttons) < 2 if chord else len(buttons) != 1)
+    ):
+        expected = "two or more buttons" if chord else "one button"
+        errors.append(f"{where}.buttons: expected a list of {expected}")
+    else:
+        for name in buttons:
+            if name not in names:
+                errors.append(f"{where}.buttons: no button {name!r}")
+    if "ms" in gesture:
+        if kind == "double":
+            errors.append(f"{where}.ms: not used by a double (see button_double_ms)")
+        else:
+            _check_int(f"{where}.ms", gesture["ms"], 1, 60000, errors)
+
+
+def _gestures(raw: Dict, pins: Dict[str, int]) -> Tuple[Gesture, ...]:
+    """Compile gesture bindings (the defaults its buttons allow if none)."""
+    bindings = raw.get("gestures")
+    if bindings is None:
+        bindings = [
+            g
+            for g in constants.gesture_bindings
+            if all(name in pins for name in g["buttons"])
+        ]
+    gestures = []
+    for g in bindings:
+        default = (
+            constants.button_hold_ms
+            if g["gesture"] == "hold"
+            else constants.gesture_chord_ms
+        )
+        gestures.append(
+            Gesture(
+                kind=g["gesture"],
+                buttons=tuple(g["buttons"]),
+                pins=tuple(pins[name] for name in g["buttons"]),
+                ms=g.get("ms", default),
+                action=g["action"],
+            )
+        )
+    return tuple(gestures)
+
+
+def compile_cabin(raw: Dict) -> Cabin:
+    """Validate raw configuration and compile it into a Cabin."""
+    validate(raw)
+    floors = raw["floors"]
+    floor_debounce = raw.get("floor_debounce", constants.button_debounce_ms["floor"])
+    buttons = [
+        Button(f"floor:{i}", "floor", i, floor["pin"], floor_debounce)
+        for i, floor in enumerate(floors)
+    ]
+    button_audio = {}  # type: Dict[str, Tuple[Dict, ...]]
+    for action in ACTIONS:
+        button = raw["buttons"].get(action)
+        if button is None:
+            continue
+        default = constants.button_debounce_ms[action]
+        debounce = button.get("debounce", default)
+        buttons.append(Button(action, action, 0, button["pin"], debounce))
+        button_audio[action] = tuple(dict(a) for a in button.get("audio", ()))
+    output_labels = [""] * (MAX_PIN + 1)
+    for name, pin in raw["outputs"].items():
+        output_labels[pin] = name
+    return Cabin(
+        floors=len(floors),
+        floor_pins=tuple(f["pin"] for f in floors),
+        floor_leds=tuple(f["led"] for f in floors),
+        floor_audio=tuple(tuple(dict(a) for a in f["audio"]) for f in floors),
+        buttons=tuple(buttons),
+        button_audio=button_audio,
+        outputs=dict(raw["outputs"]),
+        output_labels=tuple(output_labels),
+        ceiling_leds=dict(raw.get("ceiling_leds", {})),
+        channels=tuple(raw["channels"]),
+        gestures=_gestures(raw, {b.name: b.pin for b in buttons}),
+    )
+
+
+def load(path: str = None) -> Cabin:
+    """Compile the cabin in the JSON file at path (the defaults if None)."""
+    if path is None:
+        return compile_cabin(defaults())
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except ValueError as e:
+        raise ConfigError(f"{path}: {e}") from None
+    try:
+        return compile_cabin(raw)
+    except ConfigError as e:
+        raise ConfigError(f"{path}:\n{e}") from None
+
+
+_cabin: Optional[Cabin] = None
+
+
+def cabin() -> Cabin:
+    """Return this process's cabin, loaded once (LIFTAWAY_CONFIG or defaults)."""
+    global _cabin
+    if _cabin is None:
+        path = os.environ.get(CONFIG_ENV)
+        _cabin = load(path)
+        logger.debug(
+            "Cabin: %s floors, %s buttons (%s)",
+            _cabin.floors,
+            len(_cabin.buttons),
+            path or "built in",
+        )
+    return _cabin
+
+
+def reload() -> Cabin:
+    """
+    Load LIFTAWAY_CONFIG again (it's changed) and make it this process's cabin.
+
+    Raises ConfigError (or OSError), keeping the current cabin, if the file
+    is invalid or changes what only a restart can: the number of floors or
+    the audio channels.
+    """
+    global _cabin
+    new = load(os.environ.get(CONFIG_ENV))
+    current = cabin()
+    if new.floors != current.floors or new.channels != current.channels:
+        raise ConfigError("floors or channels changed; restart to apply")
+    _cabin = new
+    return _cabin
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Liftaway Constants and Definitions."""
+"""
+Liftaway Constants and Definitions.
+
+The cabin layout here (pins, LEDs, buttons, floor audio) is the built-in
+default; a LIFTAWAY_CONFIG file replaces it (see liftaway.config).
+"""
 
 # Floor to RPi GPIO Input Pin Mapping
 floor_to_gpio_mapping = {
@@ -25,6 +30,65 @@ flavor_to_gpio_mapping = {
     "cancel": 27,
 }
 
+# Debounce (ms) per button: how long a press or release must hold before
+# it's believed (see liftaway.debounce); "floor" is every floor button
+button_debounce_ms = {
+    "floor": 20,
+    "cancel": 10,
+    "emergency": 20,
+    "voicemail": 20,
+    "no_press": 20,
+    "squeaker": 10,
+}
+
+# A button held this long (ms) is a hold; pressed again this soon (ms) after
+# being released is a double press
+button_hold_ms = 1500
+button_double_ms = 400
+
+# Gestures (see liftaway.gestures) and what they do; a cabin configuration
+# without "gestures" gets those of these its buttons allow. "ms" is how long
+# a hold is, or how close together a chord's presses must be (default
+# gesture_chord_ms).
+gesture_chord_ms = 150
+gesture_bindings = (
+    {"gesture": "hold", "buttons": ["cancel"], "ms": 3000, "action": "clear"},
+    {
+        "gesture": "chord",
+        "buttons": ["emergency", "floor:0"],
+        "action": "maintenance",
+    },
+)
+
+# Low-power idle (liftaway.idle): after idle_after_s without a button press
+# (0 never), the muzak fades out and the ceiling light dims to
+# idle_ceiling_level of full brightness, both over idle_fade_ms; at level 0
+# the PCA9685 sleeps as well. Waking, the muzak fades back in over
+# idle_wake_fade_ms (the ceiling light comes straight back). With
+# idle_audio_off the audio device is closed while idle too (its thread wakes
+# every mixer buffer even in silence).
+idle_after_s = 10 * 60
+idle_fade_ms = 5000
+idle_ceiling_level = 0.1
+idle_wake_fade_ms = 1000
+idle_audio_off = True
+
+# Floor to PCA9685 (button LED) channel mapping
+floor_to_led_mapping = {floor: floor for floor in floor_to_gpio_mapping}
+
+# PCA9685 channels of the ceiling light
+ceiling_leds = {"green": 13, "red": 14, "blue": 15}
+
+# Audio channel names, in (pygame) channel number order
+audio_channel_names = (
+    "default",
+    "movement",
+    "no_press",
+    "voicemail",
+    "emergency",
+    "squeaker",
+)
+
 # RPi GPIO output pin to led mappings
 control_outputs = {
     "nothing": 7,
@@ -52,6 +116,58 @@ floor_audio = {
     11: ({"filename": "wharf.wav"},),
 }
 
+# Elevator dispatch (liftaway.dispatch): "look" (sweep, turning round at the
+# last stop), "scan" (sweep to the end of the shaft) or "fifo" (press order)
+dispatch_policy = "look"
+
+# Car travel time per floor (seconds); the travel clip loops or is cut to fit
+travel_seconds_per_floor = 1.5
+
+# Pause before the car sets off (seconds), after the doors have closed
+depart_seconds = 1.1
+
+# Mixer format (freq, bits, channels, buffer samples)
+mixer_format = (44100, -16, 2, 3072)
+
+# Byte budget for lazily decoded floor audio; least recently used clips
+# beyond this are evicted (0 is unlimited). ~2.6MB per 15s stereo clip.
+lazy_audio_byte_budget = 16 * 1024 * 1024
+
+# Threads decoding audio at startup (0 is one per CPU)
+startup_decode_workers = 0
+
+# Stream floor audio from disk in chunks rather than decoding whole clips
+stream_floor_audio = True
+
+# Mix every channel in-process with the software mixer (liftaway.mixer; needs
+# numpy) and play the result through one pygame channel
+software_mixer = False
+
+# Software mixer gain trim (dB) per channel; "music" is the muzak
+mixer_gain_db = {"music": 0.0}
+
+# Software mixer sidechain ducking: while trigger is sounding, target is
+# pulled down by depth_db with attack/release envelopes
+mixer_ducking = (
+    {
+        "trigger": "emergency",
+        "target": "music",
+        "depth_db": -18.0,
+        "attack_ms": 40,
+        "release_ms": 800,
+    },
+    {
+        "trigger": "voicemail",
+        "target": "music",
+        "depth_db": -12.0,
+        "attack_ms": 40,
+        "release_ms": 800,
+    },
+)
+
+# Software mixer output limiter (ceiling dBFS, release ms)
+mixer_limiter = (-1.0, 200)
+
 # Audio played in-between floor audio
 in_between_audio = {
     "muzak": {"filename": "muzak.wav", "volume": 0.5},
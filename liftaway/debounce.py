@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway button debouncing (in software, instead of RPi.GPIO's bouncetime).
+
+A fixed bouncetime drops every edge for a while after the first one: a
+real second press inside the window is lost, and a noise spike is taken
+for a press. Here every edge on a button's pin is instead timestamped as it
+arrives and fed to that button's Input, a small state machine:
+
+* Integrating debounce: time spent at the other level counts up, time
+  back at the accepted level counts down, and the other level is accepted
+  once it's held settle_ms more than not. Contact bounce and spikes cancel
+  out (and are counted as rejected edges) while a second press a few tens
+  of milliseconds later still gets through.
+* Press, and release (with how long the button was held).
+* Hold: still pressed hold_ms after the press.
+* Double press: pressed again within double_ms of the last release.
+
+The buttons pull up, so pressed is LOW. Edges are processed, and Events
+delivered, in order on the debouncer's own timer thread (which others, like
+liftaway.gestures, can use through call_later()).
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import liftaway.metrics as metrics
+from liftaway.config import Button, MAX_PIN
+from liftaway.scheduler import Scheduled, Scheduler
+
+
+logger = logging.getLogger(__name__)
+
+PRESS = "press"
+RELEASE = "release"
+HOLD = "hold"
+DOUBLE = "double"
+
+# Event: what happened to the button on pin, when (monotonic; for a press or
+# release, the edge it was accepted from) and how long it had been held
+Event = NamedTuple(
+    "Event",
+    [("pin", int), ("name", str), ("kind", str), ("t", float), ("held", float)],
+)
+
+EDGES = metrics.counter(
+    "liftaway_button_edges_total",
+    "Raw button edges, accepted or rejected (bounce and noise).",
+    ["button", "outcome"],
+)
+
+
+class Input:
+    """One button's debounce state (only touched on the debouncer thread)."""
+
+    def __init__(self, button: Button, hold_ms: int, double_ms: int):
+        """Initialize the button released, with no edges yet."""
+        self.pin = button.pin
+        self.configure(button, hold_ms, double_ms)
+        self.pressed = False  # accepted state
+        self.raw = False  # last level seen
+        self.since = time.monotonic()  # last edge
+        self.integral = 0.0  # seconds more at raw than at pressed
+        self.pending = 0  # edges since the last accepted one
+        self.pressed_at: Optional[float] = None
+        self.released_at: Optional[float] = None
+        self.deadline: Optional[Scheduled] = None
+        self.hold: Optional[Scheduled] = None
+        self.edges = 0
+        self.rejected = 0
+
+    def configure(self, button: Button, hold_ms: int, double_ms: int) -> None:
+        """(Re)apply a button's settings."""
+        self.name = button.name
+        self.settle = button.debounce / 1000
+        self.hold_s = hold_ms / 1000
+        self.double_s = double_ms / 1000
+        self._accepted = EDGES.labels(button.name, "accepted")
+        self._rejected = EDGES.labels(button.name, "rejected")
+
+    def _integrate(self, now: float) -> None:
+        """Account for the time since the last edge."""
+        elapsed = max(now - self.since, 0.0)
+        if self.raw != self.pressed:
+            self.integral += elapsed
+        else:
+            self.integral = max(self.integral - elapsed, 0.0)
+        self.since = max(now, self.since)
+
+    def _reject(self, n: int) -> None:
+        """Count n rejected edges."""
+        if n:
+            self.rejected += n
+            self._rejected.inc(n)
+
+    def edge(self, pressed: bool, t: float) -> bool:
+        """
+        Raw edge at t, now at pressed.
+
+        :returns: a change is pending (call tick() at deadline_at()).
+        """
+        self._integrate(t)
+        self.edges += 1
+        if pressed == self.raw:
+            # Missed the edge in between (it was over by the time we read it)
+            self._reject(1)
+        elif pressed == self.pressed:
+            # Back where we were; the edge(s) since were bounce or noise
+            self._reject(self.pending + 1)
+            self.pending = 0
+        else:
+            self.pending += 1
+        self.raw = pressed
+        return self.raw != self.pressed
+
+    def deadline_at(self) -> float:
+        """When the pending change is accepted, if nothing else happens."""
+        return self.since + self.settle - self.integral
+
+    def tick(self, now: float) -> List[Event]:
+        """Accept the pending change if it's held long enough."""
+        self._integrate(now)
+        if self.raw == self.pressed or self.integral + 1e-6 < self.settle:
+            return []
+        self.integral = 0.0
+        self._reject(self.pending - 1)
+        self.pending = 0
+        self._accepted.inc()
+        self.pressed = self.raw
+        t = self.since
+        if self.pressed:
+            # (A double press is reported just ahead of the press itself)
+            events = []
+            if self.released_at is not None and t - self.released_at <= self.double_s:
+                events.append(Event(self.pin, self.name, DOUBLE, t, 0.0))
+            events.append(Event(self.pin, self.name, PRESS, t, 0.0))
+            self.pressed_at = t
+            return events
+        held = t - (self.pressed_at or t)
+        self.released_at = t
+        return [Event(self.pin, self.name, RELEASE, t, held)]
+
+
+class Debouncer:
+    """Debounces button edges into Events for callback."""
+
+    def __init__(
+        self,
+        callback: Callable[[Event], None],
+        read: Callable[[int], int],
+        hold_ms: int = 1500,
+        double_ms: int = 400,
+        activity: Callable[[], None] = None,
+    ):
+        """
+        Initialize with no buttons; see configure().
+
+        :param callback: called with each Event (on the debouncer thread).
+        :param read: reads a pin's level (GPIO.input).
+        :param hold_ms: a press held this long is a hold.
+        :param double_ms: a press this soon after a release is a double.
+        :param activity: called with every raw edge, undebounced, on the GPIO
+            thread (liftaway.idle wakes the cabin with it); must be quick.
+        """
+        self._callback = callback
+        self._read = read
+        self._hold_ms = hold_ms
+        self._double_ms = double_ms
+        self._activity = activity
+        self._inputs: List[Optional[Input]] = [None] * (MAX_PIN + 1)
+        self._timer = Scheduler(name="debounce")
+
+    def configure(self, buttons: Iterable[Button]) -> None:
+        """Debounce these buttons (keeping state for pins already known)."""
+        self._timer.call_at(0.0, self._configure, tuple(buttons))
+
+    def _configure(self, buttons) -> None:
+        """configure() (debouncer thread)."""
+        inputs: List[Optional[Input]] = [None] * (MAX_PIN + 1)
+        for b in buttons:
+            i = self._inputs[b.pin]
+            if i is None:
+                i = Input(b, self._hold_ms, self._double_ms)
+            else:
+                i.configure(b, self._hold_ms, self._double_ms)
+            inputs[b.pin] = i
+        self._inputs = inputs
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Scheduled:
+        """Run callback(*args) on the debouncer thread in delay seconds."""
+        return self._timer.call_later(delay, callback, *args)
+
+    def edge(self, pin: int) -> None:
+        """GPIO callback (any edge): timestamp it and pass it on."""
+        t = time.monotonic()
+        pressed = not self._read(pin)
+        if self._activity is not None:
+            self._activity()
+        self._timer.call_at(t, self._edge, pin, pressed, t)
+
+    def _edge(self, pin: int, pressed: bool, t: float) -> None:
+        """Take an edge (debouncer thread)."""
+        i = self._inputs[pin]
+        if i is None:
+            return
+        if i.deadline is not None:
+            i.deadline.cancel()
+            i.deadline = None
+        if i.edge(pressed, t):
+            i.deadline = self._timer.call_at(i.deadline_at(), self._tick, i)
+
+    def _tick(self, i: Input) -> None:
+        """Accept a pending change at its deadline (debouncer thread)."""
+        i.deadline = None
+        now = time.monotonic()
+        if bool(not self._read(i.pin)) != i.raw:
+            # The level changed without an edge reaching us
+            self._edge(i.pin, not i.raw, now)
+            return
+        for event in i.tick(now):
+            if event.kind == PRESS:
+                i.hold = self._timer.call_at(event.t + i.hold_s, self._held, i, event)
+            elif event.kind == RELEASE and i.hold is not None:
+                i.hold.cancel()
+                i.hold = None
+            self._deliver(event)
+
+    def _held(self, i: Input, press: Event) -> None:
+        """Still pressed hold_ms after press (debouncer thread)."""
+        i.hold = None
+        if i.pressed and i.pressed_at == press.t:
+            now = time.monotonic()
+            self._deliver(Event(i.pin, i.name, HOLD, now, now - press.t))
+
+    def _deliver(self, event: Event) -> None:
+        """Hand event to the callback."""
+        logger.debug("Button %s: %s (held %.3fs)", event.name, event.kind, event.held)
+        try:
+            self._callback(event)
+        except Exception:
+            logger.exception("Button %s: %s handler failed", event.name, event.kind)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Edges seen and rejected, by button name."""
+        return {
+            i.name: {"edges": i.edges, "rejected": i.rejected}
+            for i in self._inputs
+            if i is not None
+        }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway elevator dispatch.
+
+Tracks where each (virtual) car is and which way it's heading, and orders
+its stops by policy:
+
+* look: carry on in the current direction while there are stops ahead,
+  then turn round at the last of them (the default).
+* scan: as look, but run on to the end of the shaft before turning round.
+* fifo: press order (how the controller used to queue floors).
+
+A floor request goes to the car which would get there soonest (cost()).
+The controller drives a single car; simulate() runs any number of cars
+against a press workload to compare average waits (`liftaway dispatch`).
+"""
+
+import heapq
+import logging
+import math
+import random
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+UP = 1
+IDLE = 0
+DOWN = -1
+
+POLICIES = ("look", "scan", "fifo")
+
+# Leg: travel to floor, floors travelled on the way (including any run to
+# the end of the shaft), heading on arrival
+Leg = NamedTuple("Leg", [("floor", int), ("floors", int), ("direction", int)])
+
+# (seconds from start, floor)
+Press = Tuple[float, int]
+
+
+def _sign(n: int) -> int:
+    """-1, 0 or 1."""
+    return (n > 0) - (n < 0)
+
+
+def plan(
+    floor: int, direction: int, stops: Sequence[int], policy: str, top: int
+) -> List[Leg]:
+    """
+    Legs visiting stops, starting at floor heading direction.
+
+    :param stops: requested floors, in press order.
+    :param top: highest floor (scan turns round at 0 and top).
+    """
+    legs = []  # type: List[Leg]
+    if policy == "fifo":
+        for stop in stops:
+            legs.append(Leg(stop, abs(stop - floor), _sign(stop - floor) or direction))
+            floor = stop
+        return legs
+    if not stops:
+        return legs
+    if direction == IDLE:
+        # Head for the nearest stop (ties go up)
+        nearest = min(stops, key=lambda s: (abs(s - floor), s < floor))
+        direction = _sign(nearest - floor) or UP
+    # Stops this side of floor (in the direction of travel), then the rest
+    # on the way back; nearest first either way
+    by_distance = sorted(stops, key=lambda s: abs(s - floor))
+    ahead = [s for s in by_distance if (s - floor) * direction >= 0]
+    behind = [s for s in by_distance if (s - floor) * direction < 0]
+    at = floor
+    for stop in ahead:
+        legs.append(Leg(stop, abs(stop - at), direction))
+        at = stop
+    if behind:
+        turn = at
+        if policy == "scan":
+            turn = top if direction == UP else 0
+        first = behind[0]
+        legs.append(Leg(first, abs(turn - at) + abs(first - turn), -direction))
+        at = first
+        for stop in behind[1:]:
+            legs.append(Leg(stop, abs(stop - at), -direction))
+            at = stop
+    return legs
+
+
+class Car:
+    """One car: where it is, which way it's heading and its stops."""
+
+    def __init__(self, index: int, floor: int = 0):
+        """Initialize an idle car at floor."""
+        self.index = index
+        self.floor = floor  # last floor reached
+        self.direction = IDLE
+        self.target = None  # type: Optional[int] (travelling to; committed)
+        self.stops = []  # type: List[int] (requested, in press order)
+
+    @property
+    def busy(self) -> bool:
+        """Travelling or has stops to visit."""
+        return self.target is not None or bool(self.stops)
+
+    def __repr__(self):
+        """Show where the car is and where it's going."""
+        return (
+            f"Car({self.index}, floor={self.floor}, direction={self.direction}, "
+            f"target={self.target}, stops={self.stops})"
+        )
+
+
+class Dispatcher:
+    """Assigns floor requests to cars and orders each car's stops."""
+
+    def __init__(
+        self, floors: int, cars: int = 1, policy: str = "look", stop_cost: float = 4.0
+    ):
+        """
+        Initialize idle cars at floor 0.
+
+        :param floors: floors served (0 to floors - 1).
+        :param cars: number of cars.
+        :param policy: one of POLICIES.
+        :param stop_cost: what a stop on the way costs a request, in floors'
+            worth of travel time (for picking a car).
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown dispatch policy {policy!r}; one of {POLICIES}")
+        self.top = floors - 1
+        self.policy = policy
+        self.stop_cost = stop_cost
+        self.cars = [Car(i) for i in range(cars)]
+
+    def route(self, car: Car, stops: Sequence[int] = None) -> List[Leg]:
+        """Legs car will travel, the one it's travelling first."""
+        stops = car.stops if stops is None else stops
+        if car.target is None:
+            return plan(car.floor, car.direction, stops, self.policy, self.top)
+        leg = Leg(car.target, abs(car.target - car.floor), car.direction)
+        return [leg] + plan(car.target, car.direction, stops, self.policy, self.top)
+
+    def cost(self, car: Car, floor: int) -> float:
+        """How long (in floors) before car would reach floor, were it asked."""
+        stops = car.stops if floor in car.stops else car.stops + [floor]
+        total = 0.0
+        for n, leg in enumerate(self.route(car, stops)):
+            total += leg.floors
+            if leg.floor == floor:
+                return total + n * self.stop_cost
+        return math.inf
+
+    def request(self, floor: int) -> Car:
+        """Assign a request for floor to a car (one already stopping there)."""
+        for car in self.cars:
+            if floor == car.target or floor in car.stops:
+                return car
+        car = min(self.cars, key=lambda c: self.cost(c, floor))
+        car.stops.append(floor)
+        return car
+
+    def depart(self, car: Car) -> Optional[Leg]:
+        """Set car off to its next stop (None if it has nowhere to go)."""
+        legs = self.route(car)
+        if not legs:
+            car.direction = IDLE
+            return None
+        leg = legs[0]
+        if car.target is None:
+            car.stops.remove(leg.floor)
+            car.target = leg.floor
+        car.direction = leg.direction
+        return leg
+
+    def arrive(self, car: Car) -> int:
+        """Car has reached its target; returns the floor."""
+        if car.target is not None:
+            car.floor = car.target
+            car.target = None
+        if not car.stops:
+            car.direction = IDLE
+        return car.floor
+
+    def drop(self, car: Car, floor: int) -> None:
+        """Forget a stop (e.g. cancelled); the car stays where it was."""
+        if car.target == floor:
+            car.target = None
+        elif floor in car.stops:
+            car.stops.remove(floor)
+        if not car.busy:
+            car.direction = IDLE
+
+    def clear(self) -> None:
+        """Forget every stop."""
+        for car in self.cars:
+            car.stops.clear()
+            car.target = None
+            car.direction = IDLE
+
+
+def workload(
+    seed: int = 0, presses: int = 200, rate: float = 0.1, floors: int = 12
+) -> List[Press]:
+    """Random presses: Poisson arrivals (rate per second), uniform floors."""
+    rng = random.Random(seed)
+    t = 0.0
+    result = []  # type: List[Press]
+    for _ in range(presses):
+        t += rng.expovariate(rate)
+        result.append((t, rng.randrange(floors)))
+    return result
+
+
+def simulate(
+    presses: Sequence[Press],
+    cars: int = 1,
+    policy: str = "look",
+    floors: int = 12,
+    travel_s: float = 1.5,
+    depart_s: float = 1.1,
+    dwell_s: float = 15.0,
+) -> Dict:
+    """
+    Run presses through a Dispatcher with simulated cars.
+
+    A car takes depart_s plus travel_s a floor to reach a stop (nothing if
+    it's already there) and stays dwell_s. A press waits until a car
+    arrives at its floor.
+
+    :returns: wait statistics (seconds) and floors travelled.
+    """
+    dispatcher = Dispatcher(
+        floors, cars, policy, stop_cost=(depart_s + dwell_s) / travel_s
+    )
+    waiting = defaultdict(list)  # type: Dict[int, List[float]]
+    waits = []  # type: List[float]
+    travelled = 0
+    events = []  # type: List[Tuple[float, int, str]] (time, car, what)
+    state = ["idle"] * cars
+
+    def depart(car: Car, now: float) -> None:
+        nonlocal travelled
+        leg = dispatcher.depart(car)
+        if leg is None:
+            state[car.index] = "idle"
+            return
+        travelled += leg.floors
+        seconds = depart_s + travel_s * leg.floors if leg.floors else 0.0
+        state[car.index] = "travel"
+        heapq.heappush(events, (now + seconds, car.index, "arrive"))
+
+    presses = sorted(presses)
+    i = 0
+    while i < len(presses) or events:
+        if i < len(presses) and (not events or presses[i][0] <= events[0][0]):
+            now, floor = presses[i]
+            i += 1
+            waiting[floor].append(now)
+            car = dispatcher.request(floor)
+            if state[car.index] == "idle":
+                depart(car, now)
+            continue
+        now, index, what = heapq.heappop(events)
+        car = dispatcher.cars[index]
+        if what == "arrive":
+            floor = dispatcher.arrive(car)
+            waits.extend(now - t for t in waiting.pop(floor, ()))
+            state[index] = "dwell"
+            heapq.heappush(events, (now + dwell_s, index, "leave"))
+        else:
+            depart(car, now)
+
+    waits.sort()
+    n = len(waits)
+    return {
+        "policy": policy,
+        "cars": cars,
+        "presses": n,
+        "mean_s": round(sum(waits) / n, 3) if n else 0.0,
+        "p50_s": round(waits[n // 2], 3) if n else 0.0,
+        "p90_s": round(waits[min(n - 1, int(0.9 * n))], 3) if n else 0.0,
+        "max_s": round(waits[-1], 3) if n else 0.0,
+        "floors_travelled": travelled,
+    }
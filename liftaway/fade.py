@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liftaway volume fades/envelopes run on the shared scheduler."""
+
+import logging
+import math
+import time
+from concurrent.futures import Future
+from threading import Lock
+from typing import Callable, Dict, Hashable, Optional
+
+from liftaway.scheduler import scheduler
+
+
+logger = logging.getLogger(__name__)
+
+# Curves map progress (0..1) to ramp position (0..1)
+Curve = Callable[[float], float]
+
+
+def linear(x: float) -> float:
+    """Straight line."""
+    return x
+
+
+def ease_in(x: float) -> float:
+    """Slow start (quadratic)."""
+    return x * x
+
+
+def ease_out(x: float) -> float:
+    """Slow finish (quadratic)."""
+    return 1 - (1 - x) * (1 - x)
+
+
+def equal_power(x: float) -> float:
+    """Quarter sine; perceptually even fades."""
+    return math.sin(x * math.pi / 2)
+
+
+# Volume update interval (seconds)
+STEP = 0.02
+
+
+class _Ramp:
+    """One volume ramp in flight."""
+
+    def __init__(
+        self,
+        set_volume: Callable[[float], None],
+        start: float,
+        end: float,
+        duration: float,
+        curve: Curve,
+    ):
+        """Initialize a ramp from start to end over duration seconds."""
+        self.set_volume = set_volume
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.curve = curve
+        self.began = time.monotonic()
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+        self.handle = None
+
+
+class Fader:
+    """
+    Volume ramps for any number of targets, without blocking the caller.
+
+    Each ramp steps its target's volume every STEP seconds on the scheduler
+    thread. Targets are identified by a key (e.g. "music", "channel:0");
+    starting a ramp on a key cancels the one already running there.
+    """
+
+    def __init__(self):
+        """Initialize with no ramps running."""
+        self._lock = Lock()
+        self._ramps: Dict[Hashable, _Ramp] = {}
+
+    def ramp(
+        self,
+        key: Hashable,
+        set_volume: Callable[[float], None],
+        start: float,
+        end: float,
+        duration_ms: int,
+        curve: Curve = linear,
+    ) -> Future:
+        """
+        Ramp a volume from start to end over duration_ms.
+
+        Returns a Future resolving to True when the ramp completes, or False
+        if it was cancelled (or replaced by another ramp on the same key).
+        """
+        ramp = _Ramp(set_volume, start, end, max(duration_ms, 0) / 1000, curve)
+        with self._lock:
+            replaced = self._cancel(key)
+            self._ramps[key] = ramp
+        _resolve(replaced, False)
+        set_volume(start)
+        ramp.handle = scheduler.call_later(STEP, self._step, key, ramp)
+        return ramp.future
+
+    def cancel(self, key: Hashable) -> None:
+        """Stop the ramp on key (its volume stays where it got to)."""
+        with self._lock:
+            cancelled = self._cancel(key)
+        _resolve(cancelled, False)
+
+    def _cancel(self, key: Hashable) -> Optional[Future]:
+        """
+        Cancel with the lock held; return the ramp's Future.
+
+        It's to be resolved once the lock is released (its callbacks may
+        well start another).
+        """
+        ramp = self._ramps.pop(key, None)
+        if ramp is None:
+            return None
+        if ramp.handle is not None:
+            ramp.handle.cancel()
+        return ramp.future
+
+    def _step(self, key: Hashable, ramp: _Ramp) -> None:
+        """Advance a ramp (scheduler thread)."""
+        with self._lock:
+            if self._ramps.get(key) is not ramp:
+                return
+            elapsed = time.monotonic() - ramp.began
+            x = min(elapsed / ramp.duration, 1.0) if ramp.duration else 1.0
+            ramp.set_volume(ramp.start + (ramp.end - ramp.start) * ramp.curve(x))
+            if x < 1.0:
+                ramp.handle = scheduler.call_later(STEP, self._step, key, ramp)
+                return
+            del self._ramps[key]
+        _resolve(ramp.future, True)
+
+    def active(self, key: Hashable) -> bool:
+        """Is a ramp running on key."""
+        return key in self._ramps
+
+
+def _resolve(future: Optional[Future], result: bool) -> None:
+    """Resolve a ramp's Future (if any, and not already)."""
+    if future is not None and not future.done():
+        future.set_result(result)
+
+
+fader = Fader()
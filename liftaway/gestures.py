@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway button gestures: hold, double press and chord.
+
+A Recognizer sits between the debouncer (liftaway.debounce) and the
+controller. Presses pass straight through to it, apart from:
+
+* hold: a button still pressed ms after it went down. Its press has
+  already run by then.
+* double: a button pressed again within button_double_ms of being released.
+  Runs instead of that second press.
+* chord: every one of its buttons pressed within ms of each other. Nothing
+  else runs for those presses. Each of a chord's buttons has its press held
+  back for ms in case the rest follow, then run as usual (straight away if
+  it's released first). So recognition never takes longer than ms, and it
+  only slows down the chord's own buttons.
+
+Bindings come from the cabin configuration (Cabin.gestures). Everything
+runs on the debouncer's thread, timed with its timer, so there's no
+polling and no extra thread.
+"""
+
+import logging
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import liftaway.metrics as metrics
+from liftaway.config import Gesture, MAX_PIN
+from liftaway.debounce import DOUBLE, Event, PRESS, RELEASE
+from liftaway.scheduler import Scheduled
+from liftaway.trace import emit as trace, Kind
+
+
+logger = logging.getLogger(__name__)
+
+HOLD = "hold"
+CHORD = "chord"
+
+GESTURES = metrics.counter(
+    "liftaway_gestures_total", "Recognized gestures.", ["gesture", "action"]
+)
+
+
+class Recognizer:
+    """Turns debounced button Events into presses and gestures."""
+
+    def __init__(
+        self,
+        gestures: Iterable[Gesture],
+        press: Callable[[int], None],
+        run: Callable[[Gesture, int], None],
+        later: Callable[..., Scheduled],
+    ):
+        """
+        Initialize with no buttons down.
+
+        :param press: runs a plain press of the button on a pin.
+        :param run: runs a recognized gesture (and the pin which finished it).
+        :param later: schedules a call on the debouncer thread
+            (Debouncer.call_later).
+        """
+        self._press = press
+        self._run = run
+        self._later = later
+        # By pin: when pressed (None if up), held back press, pending holds
+        pins = range(MAX_PIN + 1)
+        self._pressed: List[Optional[float]] = [None] * len(pins)
+        self._deferred: List[Optional[Scheduled]] = [None] * len(pins)
+        self._holding: List[List[Scheduled]] = [[] for _ in pins]
+        self._doubled = None  # pin whose next press was a double
+        self._bind(tuple(gestures))
+
+    def configure(self, gestures: Iterable[Gesture]) -> None:
+        """Use these bindings from now on."""
+        self._later(0.0, self._bind, tuple(gestures))
+
+    def _bind(self, gestures) -> None:
+        """Index bindings by pin (debouncer thread)."""
+        holds: List[List[Gesture]] = [[] for _ in range(MAX_PIN + 1)]
+        doubles: List[Optional[Gesture]] = [None] * (MAX_PIN + 1)
+        chords: List[Gesture] = []
+        window = [0.0] * (MAX_PIN + 1)  # seconds a press is held back
+        for g in gestures:
+            if g.kind == HOLD:
+                holds[g.pins[0]].append(g)
+            elif g.kind == DOUBLE:
+                doubles[g.pins[0]] = g
+            elif g.kind == CHORD:
+                chords.append(g)
+                for pin in g.pins:
+                    window[pin] = max(window[pin], g.ms / 1000)
+        self._holds: List[Tuple[Gesture, ...]] = [tuple(h) for h in holds]
+        self._doubles = doubles
+        self._chords = chords
+        self._window = window
+
+    def event(self, event: Event) -> None:
+        """Take a debounced button Event (debouncer thread)."""
+        pin = event.pin
+        if event.kind == DOUBLE:
+            gesture = self._doubles[pin]
+            if gesture is not None:
+                self._doubled = pin
+                self._fire(gesture, pin)
+        elif event.kind == PRESS:
+            self._pressed[pin] = event.t
+            now = time.monotonic()
+            for gesture in self._holds[pin]:
+                delay = max(event.t + gesture.ms / 1000 - now, 0.0)
+                handle = self._later(delay, self._held, gesture, pin, event.t)
+                self._holding[pin].append(handle)
+            if self._doubled == pin:
+                self._doubled = None
+            elif not self._chord(pin):
+                window = self._window[pin]
+                if window:
+                    delay = max(event.t + window - now, 0.0)
+                    self._deferred[pin] = self._later(delay, self._flush, pin)
+                else:
+                    self._press(pin)
+        elif event.kind == RELEASE:
+            self._pressed[pin] = None
+            holding, self._holding[pin] = self._holding[pin], []
+            for handle in holding:
+                handle.cancel()
+            deferred, self._deferred[pin] = self._deferred[pin], None
+            if deferred is not None:
+                deferred.cancel()
+                self._press(pin)
+
+    def _chord(self, pin: int) -> bool:
+        """Complete a chord with pin's press, if there's one to complete."""
+        for gesture in self._chords:
+            if pin not in gesture.pins:
+                continue
+            if any(self._pressed[p] is None for p in gesture.pins):
+                continue
+            times = [self._pressed[p] for p in gesture.pins]
+            if max(times) - min(times) > gesture.ms / 1000:
+                continue
+            for p in gesture.pins:
+                deferred, self._deferred[p] = self._deferred[p], None
+                if deferred is not None:
+                    deferred.cancel()
+            self._fire(gesture, pin)
+            return True
+        return False
+
+    def _flush(self, pin: int) -> None:
+        """No chord came of a held back press; run it."""
+        deferred, self._deferred[pin] = self._deferred[pin], None
+        if deferred is not None:
+            self._press(pin)
+
+    def _held(self, gesture: Gesture, pin: int, pressed_at: float) -> None:
+        """Fire a hold whose time is up, if that press is still down."""
+        if self._pressed[pin] == pressed_at:
+            self._fire(gesture, pin)
+
+    def _fire(self, gesture: Gesture, pin: int) -> None:
+        """Run a recognized gesture."""
+        logger.info(
+            "Gesture: %s %s -> %s",
+            gesture.kind,
+            "+".join(gesture.buttons),
+            gesture.action,
+        )
+        trace(Kind.GESTURE, pin, gesture.action)
+        GESTURES.labels(gesture.kind, gesture.action).inc()
+        self._run(gesture, pin)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway hardware backend selection.
+
+LIFTAWAY_BACKEND=pi (default) uses RPi.GPIO, the PCA9685 over I2C and the
+pygame mixer; LIFTAWAY_BACKEND=sim uses liftaway.simulated for all three.
+LIFTAWAY_MIXER=pygame|sim overrides just the mixer (e.g. simulated buttons
+with real audio on a laptop).
+"""
+
+import os
+
+
+BACKEND = os.environ.get("LIFTAWAY_BACKEND", "pi")
+MIXER = os.environ.get("LIFTAWAY_MIXER", "sim" if BACKEND == "sim" else "pygame")
+
+if BACKEND == "sim":
+    from liftaway.simulated import GPIO, I2C, PCA9685, SCL, SDA  # noqa: F401
+else:
+    import RPi.GPIO as GPIO  # noqa: F401
+    from adafruit_pca9685 import PCA9685  # noqa: F401
+    from board import SCL, SDA  # noqa: F401
+    from busio import I2C  # noqa: F401
+
+if MIXER == "sim":
+    from liftaway.simulated import pygame  # noqa: F401
+else:
+    import pygame  # noqa: F401
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway low-power idle mode.
+
+With nobody about, there's no call for the cabin to keep itself lit up and
+playing muzak. After idle_after_s (see constants; LIFTAWAY_IDLE_S
+overrides it) with no button touched and nothing queued or running, the
+controller is told to go idle (it fades the muzak out and dims the ceiling
+light). The first raw button edge, before any debouncing, wakes it again
+well inside WAKE_BOUND_S. The press itself is then handled as usual, once
+the wake is done (see wait()): its sound needs the audio device back open.
+
+Nothing here polls. The idle deadline is a single scheduler timer, which
+re-arms itself for the rest of the time if there's been a press since it
+was set, and there's no timer at all while idle. CPU wakeups (voluntary
+context switches, every thread's) are counted per mode; see stats().
+"""
+
+import logging
+import resource
+import time
+from functools import partial
+from threading import Event, Lock
+from typing import Callable, Dict, Optional
+
+import liftaway.metrics as metrics
+from liftaway.scheduler import Scheduled, scheduler
+
+
+logger = logging.getLogger(__name__)
+
+IDLE_ENV = "LIFTAWAY_IDLE_S"
+
+ACTIVE = "active"
+IDLE = "idle"
+MODES = (ACTIVE, IDLE)
+
+# The cabin should be back up within this of the first button edge
+WAKE_BOUND_S = 0.1
+
+IDLE_MODE = metrics.gauge("liftaway_idle", "1 while the cabin is idle (low power).")
+WAKE_LATENCY = metrics.histogram(
+    "liftaway_idle_wake_seconds", "First button edge to the cabin being back up."
+)
+WAKEUPS = metrics.gauge(
+    "liftaway_cpu_wakeups_per_minute",
+    "CPU wakeups (voluntary context switches) per minute, by mode.",
+    ["mode"],
+)
+
+
+def wakeups() -> int:
+    """CPU wakeups so far: voluntary context switches (all our threads')."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw
+
+
+class Idle:
+    """Idle state machine; see the module docstring."""
+
+    def __init__(
+        self,
+        enter: Callable[[], None],
+        leave: Callable[[], None],
+        busy: Callable[[], bool],
+        after_s: float,
+    ):
+        """
+        Initialize as active; call start() to start counting down.
+
+        :param enter: goes idle (scheduler thread).
+        :param leave: comes back from idle (scheduler thread); must be quick.
+        :param busy: is there something queued or running (then we stay up).
+        :param after_s: seconds without a button edge before going idle (0
+            never goes idle).
+        """
+        self._enter = enter
+        self._leave = leave
+        self._busy = busy
+        self.after_s = after_s
+        self._lock = Lock()
+        self.mode = ACTIVE
+        self._last = time.monotonic()  # last button edge
+        self._waking = None  # the edge waking us (monotonic), if we're waking
+        self._awake = Event()  # clear while waking
+        self._awake.set()
+        self._timer: Optional[Scheduled] = None
+        # Mode change (monotonic, wakeups()) and totals by mode since
+        self._since = (time.monotonic(), wakeups())
+        self._seconds = dict.fromkeys(MODES, 0.0)
+        self._wakeups = dict.fromkeys(MODES, 0)
+        IDLE_MODE.set_function(lambda: float(self.mode == IDLE))
+        for mode in MODES:
+            WAKEUPS.labels(mode).set_function(partial(self.per_minute, mode))
+
+    def start(self) -> None:
+        """Go idle after_s from now (unless there's a press meanwhile)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self.after_s > 0:
+                self._timer = scheduler.call_later(self.after_s, self._check)
+
+    def activity(self) -> None:
+        """Note a button edge (any thread): wake up, or put off going idle."""
+        now = time.monotonic()
+        with self._lock:
+            self._last = now
+            if self.mode != IDLE or self._waking is not None:
+                return
+            self._waking = now
+            self._awake.clear()
+        # Ahead of anything else due on the scheduler (e.g. a dimming step)
+        scheduler.call_at(0.0, self._wake)
+
+    def wait(self) -> None:
+        """Block until any wake under way is done (press handlers call this)."""
+        self._awake.wait()
+
+    def _check(self) -> None:
+        """Go idle, unless pressed or busy since (the idle deadline; scheduler thread)."""
+        with self._lock:
+            if self.mode == IDLE:
+                return
+            quiet = time.monotonic() - self._last
+            if quiet < self.after_s or self._busy():
+                # Pressed since (or still busy); count down again
+                delay = max(self.after_s - quiet, 0.0) or self.after_s
+                self._timer = scheduler.call_later(delay, self._check)
+                return
+            self._timer = None
+            self._switch(IDLE)
+        logger.info("Idle: %.0fs without a press; going idle", quiet)
+        self._enter()
+
+    def _wake(self) -> None:
+        """Come back from idle (scheduler thread)."""
+        try:
+            self._leave()
+        finally:
+            with self._lock:
+                edge, self._waking = self._waking, None
+                self._switch(ACTIVE)
+            self._awake.set()
+        latency = time.monotonic() - edge
+        WAKE_LATENCY.observe(latency)
+        logger.info("Idle: awake %.2fms after a button edge", latency * 1000)
+        if latency > WAKE_BOUND_S:
+            logger.warning("Idle: waking took over %.0fms", WAKE_BOUND_S * 1000)
+        self.start()
+
+    def _switch(self, mode: str) -> None:
+        """Change mode, totting up the one we're leaving (lock held)."""
+        now, count = time.monotonic(), wakeups()
+        since, since_count = self._since
+        self._seconds[self.mode] += now - since
+        self._wakeups[self.mode] += count - since_count
+        self._since = (now, count)
+        self.mode = mode
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Seconds, CPU wakeups and wakeups per minute spent in each mode."""
+        with self._lock:
+            seconds = dict(self._seconds)
+            counts = dict(self._wakeups)
+            since, since_count = self._since
+            seconds[self.mode] += time.monotonic() - since
+            counts[self.mode] += wakeups() - since_count
+        stats = {}
+        for mode in MODES:
+            rate = counts[mode] * 60 / seconds[mode] if seconds[mode] else 0.0
+            stats[mode] = {
+                "seconds": round(seconds[mode], 3),
+                "wakeups": counts[mode],
+                "per_minute": round(rate, 1),
+            }
+        return stats
+
+    def per_minute(self, mode: str) -> float:
+        """CPU wakeups per minute in mode (so far)."""
+        return self.stats()[mode]["per_minute"]
@@ -2,187 +2,583 @@
 # -*- coding: utf-8 -*-
 """Liftaway main business logic."""
 
+import contextlib
 import logging
+import os
+import queue
 import random
 import sys
 import time
-from collections import deque
+from collections import Counter, deque
+from concurrent.futures import Future
 from functools import partial
-from threading import Lock
-from typing import Callable, NamedTuple
+from logging.handlers import QueueHandler, QueueListener
+from threading import Condition, Event, Lock
+from typing import Callable, List, Optional, Set, Tuple, Union
 
+import liftaway.config as config
 import liftaway.constants as constants
+import liftaway.debounce as debounce
 import liftaway.low_level as low_level
-import RPi.GPIO as GPIO
+import liftaway.metrics as metrics
 from liftaway.actions import Flavour, Floor, Movement
-from liftaway.audio import init as audio_init, Music
+from liftaway.assets import cache as asset_cache
+from liftaway.audio import (
+    all_done,
+    audio_channels,
+    init as audio_init,
+    Music,
+    resume as audio_resume,
+    silence,
+    suspend as audio_suspend,
+)
+from liftaway.bundle import referenced_assets
+from liftaway.config import Button, Cabin, cabin, Gesture, MAX_PIN
+from liftaway.dispatch import Dispatcher
+from liftaway.fade import fader
+from liftaway.gestures import Recognizer
+from liftaway.hardware import GPIO
+from liftaway.idle import IDLE, Idle, IDLE_ENV
+from liftaway.scheduler import scheduler
+from liftaway.shared_assets import shared_assets
+from liftaway.startup import Startup
+from liftaway.state import load as state_load, Snapshot, Snapshotter, STATE_ENV
+from liftaway.trace import emit as trace, Kind, start as trace_start, stop as trace_stop
+from liftaway.util import data_resource_filename
+from liftaway.watch import Watcher
 
 
 logger = logging.getLogger(__name__)
 
-GPIOInput = NamedTuple(
-    "GPIOInput",
-    [("gpio", int), ("bouncetime", int), ("callback", Callable[[int], None])],
+# How long the cancel LED stays lit once a cancel has been handled
+CANCEL_LED_S = 0.3
+
+# How long a floor button lights up when pressed in maintenance mode
+LAMP_TEST_S = 1.0
+
+# Going idle, how soon to try closing the audio device again if it's busy
+AUDIO_OFF_RETRY_S = 0.5
+
+# Reloaded audio: (name, Floor or Flavour, new audio, futures it's ready after)
+Staged = Tuple[str, Union[Floor, Flavour], Tuple, List[Future]]
+
+PRESSES = metrics.counter("liftaway_presses_total", "Button presses.", ["button"])
+FLOOR_REQUESTS = metrics.counter(
+    "liftaway_floor_requests_total",
+    "Floor presses by outcome (queued, or dropped as already queued).",
+    ["floor", "outcome"],
+)
+QUEUE_DEPTH = metrics.gauge(
+    "liftaway_queue_depth", "Movements and Floors waiting to run."
+)
+FLOOR_WAIT = metrics.histogram(
+    "liftaway_floor_wait_seconds",
+    "Floor press to arriving at that floor (after its Movement).",
+    buckets=(0.1, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+FLOORS_READY = metrics.gauge(
+    "liftaway_floors_ready", "Floors whose clips have all been decoded."
+)
+CANCEL_LATENCY = metrics.histogram(
+    "liftaway_cancel_seconds", "Cancel press to the cancel taking effect."
 )
-GPIOOutput = NamedTuple("GPIOOutput", [("gpio", int), ("label", str)])
 
 
 class Controller:
     """Main Controller (Singleton)."""
 
     def __init__(self):
-        """Initializer."""
-        audio_init()
-        self.movement = Movement()
-        self.muzak = Music(**constants.in_between_audio.get("muzak"))
-        self.muzak.play()
-        floor_count = 12
-        self.floors = [Floor(i, muzak=self.muzak) for i in range(floor_count)]
+        """
+        Initialize the cabin from its configuration.
+
+        Floors are visited in dispatch order (constants.dispatch_policy;
+        see liftaway.dispatch) rather than press order: the queue is rebuilt
+        as a Movement/Floor pair per stop whenever a floor is pressed. There
+        is one cabin, so the Dispatcher has a single car (self.car); more
+        cars are only ever simulated (`liftaway dispatch`).
+
+        Floors, buttons and LEDs come from the cabin configuration (see
+        liftaway.config). Buttons are debounced in software and act when
+        pressed (see liftaway.debounce); holds, double presses and chords
+        can be bound to actions too (see liftaway.gestures).
+
+        Brings up GPIO and the LEDs first, then the mixer and the muzak.
+        Clips decode in the background from there on; a floor pressed
+        before its clips have landed is queued as usual and waits for them
+        when it runs. self.ready resolves once every clip is decoded.
+
+        With LIFTAWAY_STATE set, the floor queue and LEDs are restored from
+        (and then kept in) that snapshot file; see liftaway.state.
+
+        With LIFTAWAY_WATCH set, changed clips and cabin configuration are
+        picked up without a restart; see reload().
+
+        Left alone long enough, the cabin goes idle to save power (muzak off,
+        ceiling light dimmed) until a button is next touched; see
+        liftaway.idle.
+        """
+        self.startup = Startup()
+        self.cabin = cabin()
+        self.floors = []  # type: List[Floor]
         self.action = None
+        self._cancel = None  # token for the running action; see interrupt()
+        self._cancelled_at = None
         self.lock = Lock()
+        self.wakeup = Condition(self.lock)
+        self._notified_at = None
         self.queue = deque()
-        self._emergency = Flavour(
-            sounds=constants.emergency_button_audio, self_interruptable=False
-        )
-        self._voicemail = Flavour(
-            sounds=constants.voicemail_button_audio, self_interruptable=False
-        )
-        self._no_press = Flavour(
-            sounds=constants.no_press_button_audio, self_interruptable=True
+        self._pending = 0  # bitset of queued floor numbers
+        # By floor: when it was queued, and its request counters
+        self._queued_at = [None] * self.cabin.floors  # type: List[Optional[float]]
+        self._floor_queued = [
+            FLOOR_REQUESTS.labels(i, "queued") for i in range(self.cabin.floors)
+        ]
+        self._floor_duplicate = [
+            FLOOR_REQUESTS.labels(i, "duplicate") for i in range(self.cabin.floors)
+        ]
+        QUEUE_DEPTH.set_function(lambda: len(self.queue))
+        # Press/queue outcomes (e.g. "floor_duplicate"); read by liftaway.bench
+        self.counters = Counter()
+        self.running = False
+        self.paused = False
+        self.in_maintenance = False
+        # Presses wait on this until there's something to handle them
+        self._started = Event()
+        self._watcher = None  # type: Optional[Watcher]
+        self.idle = Idle(
+            enter=self._sleep,
+            leave=self._wake,
+            busy=lambda: self.action is not None or bool(self.queue),
+            after_s=float(os.environ.get(IDLE_ENV, constants.idle_after_s)),
         )
-        self._squeaker = Flavour(
-            sounds=constants.squeaker_button_audio, self_interruptable=True
+        state_path = os.environ.get(STATE_ENV)
+        snapshot = state_load(state_path) if state_path else None
+        self._snapshots = Snapshotter(state_path, self._state) if state_path else None
+        with self.startup.phase("gpio"):
+            self.gpio_init()
+        with self.startup.phase("leds"):
+            low_level.init(leds=snapshot.leds if snapshot else None)
+        with self.startup.phase("mixer"):
+            audio_init()
+        with self.startup.phase("muzak"):
+            self.muzak = Music(**constants.in_between_audio.get("muzak"))
+            self.muzak.play()
+        with self.startup.phase("actions"):
+            self.movement = Movement()
+            self.floors = [
+                Floor(i, muzak=self.muzak, sounds=audio)
+                for i, audio in enumerate(self.cabin.floor_audio)
+            ]
+            # One car: the cabin we're in (the configuration has no cars)
+            self.dispatch = Dispatcher(
+                self.cabin.floors, policy=constants.dispatch_policy
+            )
+            self.car = self.dispatch.cars[0]
+            # (No sounds, and never run, if the cabin hasn't got the button)
+            audio = self.cabin.button_audio
+            self._emergency = Flavour(
+                sounds=audio.get("emergency", ()), self_interruptable=False
+            )
+            self._voicemail = Flavour(
+                sounds=audio.get("voicemail", ()), self_interruptable=False
+            )
+            self._no_press = Flavour(
+                sounds=audio.get("no_press", ()), self_interruptable=True
+            )
+            self._squeaker = Flavour(
+                sounds=audio.get("squeaker", ()), self_interruptable=True
+            )
+        if snapshot is not None:
+            self._restore(snapshot)
+        self._started.set()
+        self.startup.mark("started")
+        self.idle.start()
+        FLOORS_READY.set_function(lambda: sum(f.ready.done() for f in self.floors))
+        for floor in self.floors:
+            floor.ready.add_done_callback(partial(self._floor_ready, floor))
+        actions = [self.movement, self._emergency, self._voicemail, self._no_press]
+        actions += [self._squeaker] + self.floors
+        self.ready = all_done([a.ready for a in actions])
+        self.ready.add_done_callback(self._ready)
+
+    def _restore(self, snapshot: Snapshot) -> None:
+        """Re-queue the floors a previous run had still to visit."""
+        for floor_number in snapshot.floors:
+            if floor_number < len(self.floors):
+                self._push_floor(self.floors[floor_number])
+        logger.info("Restored queued floors %s", snapshot.floors)
+
+    def _state(self) -> Snapshot:
+        """Snapshot of the floors still to visit (running one first) and LEDs."""
+        with self.lock:
+            floors = [a.floor_number for a in self.queue if isinstance(a, Floor)]
+            if isinstance(self.action, Floor) and not self.paused:
+                floors.insert(0, self.action.floor_number)
+        return Snapshot(
+            floors=floors, leds=low_level.frame.snapshot(), saved_at=time.time()
         )
-        self.gpio_init()
-        low_level.init()
-        self.running = False
+
+    def _snapshot(self) -> None:
+        """Queue or LEDs have changed; update the state snapshot (if any)."""
+        if self._snapshots is not None:
+            self._snapshots.request()
+
+    def _floor_ready(self, floor: Floor, _: Future) -> None:
+        """Note that a floor's clips have all been decoded."""
+        logger.debug("Floor(%s) ready", floor.floor_number)
+
+    def _ready(self, _: Future) -> None:
+        """Every clip has been decoded."""
+        self.startup.mark("ready")
+        for line in self.startup.report():
+            logger.info("Startup: %s", line)
+        logger.info("Audio assets: %s", asset_cache.stats())
 
     def gpio_init(self) -> None:
-        """Initialize GPIO."""
+        """Initialize GPIO (pins from the cabin configuration)."""
         GPIO.setmode(GPIO.BCM)
         GPIO.cleanup()
-
-        # Setup GPIO Inputs
-        gpio_inputs = [
-            GPIOInput(gpio=v, bouncetime=1000, callback=partial(self.floor, k))
-            for k, v in constants.floor_to_gpio_mapping.items()
-        ]
-        gpio_inputs.append(
-            GPIOInput(
-                gpio=constants.flavor_to_gpio_mapping.get("cancel"),
-                bouncetime=1000,
-                callback=partial(self.cancel, 0),
-            )
-        )
-        gpio_inputs.append(
-            GPIOInput(
-                gpio=constants.flavor_to_gpio_mapping.get("emergency"),
-                bouncetime=1000,
-                callback=partial(self.emergency, 0),
-            )
-        )
-        gpio_inputs.append(
-            GPIOInput(
-                gpio=constants.flavor_to_gpio_mapping.get("no_press"),
-                bouncetime=400,
-                callback=partial(self.no_press, 0),
-            )
+        self._handlers = self._button_handlers(self.cabin)
+        self.debouncer = debounce.Debouncer(
+            self._on_button,
+            read=GPIO.input,
+            hold_ms=constants.button_hold_ms,
+            double_ms=constants.button_double_ms,
+            activity=self.idle.activity,
         )
-        gpio_inputs.append(
-            GPIOInput(
-                gpio=constants.flavor_to_gpio_mapping.get("squeaker"),
-                bouncetime=400,
-                callback=partial(self.squeaker, 0),
-            )
-        )
-        gpio_inputs.append(
-            GPIOInput(
-                gpio=constants.flavor_to_gpio_mapping.get("voicemail"),
-                bouncetime=1000,
-                callback=partial(self.voicemail, 0),
-            )
+        self.debouncer.configure(self.cabin.buttons)
+        self.gestures = Recognizer(
+            self.cabin.gestures,
+            press=self._press,
+            run=self._gesture,
+            later=self.debouncer.call_later,
         )
-        gpio_inputs = tuple(gpio_inputs)
-
-        for g in gpio_inputs:
-            logger.debug(f"Set GPIO_PIN({g.gpio}) as GPIO.IN with PUD_UP")
-            GPIO.setup(g.gpio, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.add_event_detect(
-                gpio=g.gpio,
-                edge=GPIO.RISING,
-                callback=g.callback,
-                bouncetime=g.bouncetime,
-            )
+
+        # Setup GPIO Inputs
+        for b in self.cabin.buttons:
+            self._setup_button(b)
 
         # Setup GPIO Outputs
-        gpio_outputs = tuple(  # noqa
-            [GPIOOutput(gpio=v, label=k) for k, v in constants.control_outputs.items()]
+        for label, pin in self.cabin.outputs.items():
+            logger.debug("Set GPIO_PIN(%s) as GPIO.OUT (%s)", pin, label)
+            GPIO.setup(pin, GPIO.OUT)
+
+    def _button_handlers(self, cabin: Cabin) -> List[Optional[Callable]]:
+        """Traced handler by pin for cabin's buttons; see _on_button()."""
+        actions = {
+            "floor": self.floor,
+            "cancel": self.cancel,
+            "emergency": self.emergency,
+            "voicemail": self.voicemail,
+            "no_press": self.no_press,
+            "squeaker": self.squeaker,
+        }
+        handlers = [None] * (MAX_PIN + 1)  # type: List[Optional[Callable]]
+        for b in cabin.buttons:
+            handler = partial(actions[b.action], b.arg)
+            handlers[b.pin] = self._traced(b.name, handler)
+        return handlers
+
+    def _setup_button(self, b: Button) -> None:
+        """Set a button's pin up as an input feeding the debouncer."""
+        logger.debug("Set GPIO_PIN(%s) as GPIO.IN with PUD_UP", b.pin)
+        GPIO.setup(b.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        # Every edge; the debouncer does the filtering (no bouncetime)
+        GPIO.add_event_detect(gpio=b.pin, edge=GPIO.BOTH, callback=self.debouncer.edge)
+
+    def _on_button(self, event: debounce.Event) -> None:
+        """Debounced button event; see liftaway.gestures."""
+        self.gestures.event(event)
+
+    def _press(self, gpio: int) -> None:
+        """Run the handler for a press of the button on pin gpio."""
+        handler = self._handlers[gpio]
+        if handler is not None:  # (None if the button's just been removed)
+            handler(gpio)
+
+    def _gesture(self, gesture: Gesture, gpio: int) -> None:
+        """Run the action a gesture is bound to."""
+        self._started.wait()
+        self.idle.wait()
+        if gesture.action == "clear":
+            self.clear()
+        elif gesture.action == "maintenance":
+            self.maintenance()
+        else:
+            getattr(self, gesture.action)(0, gpio)
+
+    def _traced(
+        self, name: str, handler: Callable[[int], None]
+    ) -> Callable[[int], None]:
+        """Press handler which traces and counts the press then runs handler."""
+        presses = PRESSES.labels(name)
+
+        def callback(gpio: int) -> None:
+            trace(Kind.PRESS, gpio, name)
+            presses.inc()
+            # Pressed during startup, or while waking from idle; hold on
+            # until we can handle it
+            self._started.wait()
+            self.idle.wait()
+            handler(gpio)
+
+        return callback
+
+    def watch(self) -> Watcher:
+        """Reload changed clips and cabin configuration as they change."""
+        self._watcher = Watcher(self._watched(), self.reload)
+        self._watcher.start()
+        return self._watcher
+
+    def _watched(self) -> List[str]:
+        """Return the cabin configuration file (if any) and every clip it plays."""
+        paths = [data_resource_filename(name) for name in referenced_assets()]
+        if os.environ.get(config.CONFIG_ENV):
+            paths.append(os.environ[config.CONFIG_ENV])
+        return paths
+
+    def reload(self, changed: Set[str]) -> None:
+        """
+        Pick up changed files (absolute paths; see watch()).
+
+        Only clips whose files changed, and floors and buttons whose
+        configuration did, are decoded again. That happens here, on the
+        watcher's thread, and each is swapped in once ready: Flavours
+        straight away, Floors as they next run, so nothing playing is cut
+        short. A cabin configuration which is invalid, or needs a restart,
+        is refused and the current one kept.
+        """
+        # (Decoding needs the mixer, even if we're idle)
+        self._resume_audio()
+        old = self.cabin
+        new = self._reload_cabin(changed)
+        filenames = {
+            name
+            for name in referenced_assets(new)
+            if os.path.abspath(data_resource_filename(name)) in changed
+        }
+        futures = self._reload_clips(filenames)
+        staged = self._stage(old, new, filenames)
+        for _, _, _, loading in staged:
+            futures += loading
+        all_done(futures).result()
+
+        for future in futures:
+            if future.exception() is not None:
+                logger.error("Reload: %s", future.exception())
+        for name, target, audios, loading in staged:
+            if any(f.exception() is not None for f in loading):
+                logger.error("Reload: keeping %s's audio", name)
+            else:
+                target.replace_sounds(audios)
+        if new is not old:
+            self._remap(old, new)
+            self.cabin = new
+            if self._watcher is not None:
+                self._watcher.watch(self._watched())
+        logger.info(
+            "Reload: %s clip(s), %s floor/button audio change(s)%s",
+            len(filenames),
+            len(staged),
+            ", new cabin" if new is not old else "",
         )
 
-        for g in gpio_outputs:
-            logger.debug(f"Set GPIO_PIN({g.gpio}) as GPIO.OUT")
-            GPIO.setup(g.gpio, GPIO.OUT)
+    def _reload_cabin(self, changed: Set[str]) -> Cabin:
+        """Return the reloaded cabin if its file changed (and is usable)."""
+        path = os.environ.get(config.CONFIG_ENV)
+        if path and os.path.abspath(path) in changed:
+            try:
+                return config.reload()
+            except (OSError, config.ConfigError) as e:
+                logger.error("Reload: keeping the current cabin; %s", e)
+        return self.cabin
+
+    def _reload_clips(self, filenames: Set[str]) -> List[Future]:
+        """Forget changed clips and decode again those always loaded."""
+        registry = shared_assets()
+        for name in filenames:
+            asset_cache.invalidate(name)
+            if registry is not None:
+                registry.discard(name)
+        if constants.in_between_audio["muzak"]["filename"] in filenames:
+            logger.warning("Reload: the muzak changes on restart")
+        futures = self.movement.reload(filenames)
+        for floor in self.floors:
+            futures += floor.reload(filenames)
+        return futures
+
+    def _stage(self, old: Cabin, new: Cabin, filenames: Set[str]) -> List[Staged]:
+        """Return new audio for the floors and buttons whose audio changed."""
+        staged = []
+        audio = zip(self.floors, old.floor_audio, new.floor_audio)
+        for floor, was, sounds in audio:
+            if sounds != was or any(s["filename"] in filenames for s in sounds):
+                audios = floor.build_sounds(sounds)
+                loading = [a.prefetch() for a in audios if a._filename in filenames]
+                staged.append((f"floor:{floor.floor_number}", floor, audios, loading))
+        flavours = {
+            "emergency": self._emergency,
+            "voicemail": self._voicemail,
+            "no_press": self._no_press,
+            "squeaker": self._squeaker,
+        }
+        for action, flavour in flavours.items():
+            sounds = new.button_audio.get(action, ())
+            was = old.button_audio.get(action, ())
+            if sounds != was or any(s["filename"] in filenames for s in sounds):
+                audios = flavour.build_sounds(sounds)
+                staged.append((action, flavour, audios, [a.loaded for a in audios]))
+        return staged
+
+    def _remap(self, old: Cabin, new: Cabin) -> None:
+        """Move buttons, outputs and LEDs from where old had them to new."""
+        before = {b.pin: b for b in old.buttons}
+        after = {b.pin: b for b in new.buttons}
+        # Swapping the handlers moves a button kept on the same pin; pins
+        # which stop or start being buttons have edge detection redone
+        self._handlers = self._button_handlers(new)
+        self.debouncer.configure(new.buttons)
+        self.gestures.configure(new.gestures)
+        for pin in before:
+            if pin not in after:
+                GPIO.remove_event_detect(pin)
+        for label, pin in new.outputs.items():
+            if old.output_labels[pin] != label:
+                logger.debug("Set GPIO_PIN(%s) as GPIO.OUT (%s)", pin, label)
+                GPIO.setup(pin, GPIO.OUT)
+        low_level.configure(new)
+        for pin, b in after.items():
+            if pin not in before:
+                self._setup_button(b)
+
+    def _pop_action(self, wait: bool = False) -> bool:
+        """
+        Pop Action (Movement or Floor) from Queue.
 
-    def _pop_action(self) -> bool:
-        """Pop Action (Movement or Floor) from Queue."""
-        self.lock.acquire(blocking=True)
-        try:
-            self.action = self.queue.popleft()
-        except IndexError:
-            self.action = None
-        self.lock.release()
+        :param wait: sleep until something is queued or we're interrupted.
+        """
+        with self.wakeup:
+            if wait:
+                self.wakeup.wait_for(
+                    lambda: self.queue or self.paused or not self.running
+                )
+                if self._notified_at is not None:
+                    latency = (time.monotonic() - self._notified_at) * 1000
+                    logger.debug("Runner woke %.2fms after notify", latency)
+                    self._notified_at = None
+                if self.paused:
+                    # Leave the queue to the interrupted drain
+                    self.action = None
+                    return False
+            try:
+                self.action = self.queue.popleft()
+            except IndexError:
+                self.action = None
+            if isinstance(self.action, Floor):
+                self._pending &= ~(1 << self.action.floor_number)
+                if self.paused:
+                    self.dispatch.drop(self.car, self.action.floor_number)
+                else:
+                    self.dispatch.arrive(self.car)
+                trace(Kind.DEQUEUE, self.action.floor_number, value=self.paused)
+                queued_at = self._queued_at[self.action.floor_number]
+                self._queued_at[self.action.floor_number] = None
+                if queued_at is not None and not self.paused:
+                    FLOOR_WAIT.observe(time.monotonic() - queued_at)
+            elif self.action:
+                if not self.paused:
+                    self.movement.leg = self.dispatch.depart(self.car)
+                trace(Kind.DEQUEUE, -1, value=self.paused)
+            self._cancel = Future() if self.action else None
+        if self.action:
+            self._snapshot()
         return bool(self.action)
 
     def _push_floor(self, floor) -> bool:
-        """Push requested Floor onto Queue."""
-        if not self.lock.acquire(blocking=False):
-            # TODO(tkalus) Buzzer sound?
-            logger.debug("Could not get floor lock")
-            return False
-        # We have the mutex
-        # Don't care if the floor is self.action, just re-queue
-        if floor in self.queue:
-            logger.debug("Floor already in queue")
-            # TODO(tkalus) Blink floor light?
-            self.lock.release()
-            return False
-        self.queue.append(self.movement)
-        floor.activate()
-        self.queue.append(floor)
-        self.lock.release()
+        """
+        Push requested Floor onto Queue.
+
+        Never drops a press: the lock is only ever held briefly (by us or
+        _pop_action) so we block for it rather than giving up. Pending floors
+        are tracked in a bitset for O(1) duplicate detection, which also
+        bounds the queue to a Movement/Floor pair per floor.
+        """
+        bit = 1 << floor.floor_number
+        with self.wakeup:
+            # Don't care if the floor is self.action, just re-queue
+            if self._pending & bit:
+                logger.debug("Floor already in queue")
+                # TODO(tkalus) Blink floor light?
+                self.counters["floor_duplicate"] += 1
+                self._floor_duplicate[floor.floor_number].inc()
+                trace(Kind.ENQUEUE, floor.floor_number, value=0)
+                return False
+            self._pending |= bit
+            trace(Kind.ENQUEUE, floor.floor_number, value=1)
+            self.dispatch.request(floor.floor_number)
+            floor.activate()
+            self._requeue()
+            self.counters["floor_queued"] += 1
+            self._floor_queued[floor.floor_number].inc()
+            self._queued_at[floor.floor_number] = time.monotonic()
+            self._notified_at = time.monotonic()
+            self.wakeup.notify()
+        self._snapshot()
         return True
 
+    def _requeue(self) -> None:
+        """Rebuild the queue in dispatch order (lock held)."""
+        self.queue.clear()
+        for leg in self.dispatch.route(self.car):
+            if leg.floor != self.car.target:
+                # (The Movement to the target is already under way)
+                self.queue.append(self.movement)
+            self.queue.append(self.floors[leg.floor])
+
     def floor(self, requested_floor: int, gpio: int) -> None:
         """Run Handler for Floor GPIO."""
-        logger.debug(f"floor_gpio({gpio})")
+        logger.debug("floor_gpio(%s)", gpio)
+        self.counters["floor"] += 1
         if requested_floor >= len(self.floors):
-            logger.error(f"requested_floor({requested_floor}) out of range")
+            logger.error("requested_floor(%s) out of range", requested_floor)
+            return
+        if self.in_maintenance:
+            # Lamp test rather than calling the car
+            self.counters["floor_lamp_test"] += 1
+            low_level.floor_button_led(requested_floor, on=True)
+            scheduler.call_later(
+                LAMP_TEST_S, low_level.floor_button_led, requested_floor, False
+            )
             return
         floor = self.floors[requested_floor]
         if not self._push_floor(floor):
-            logger.error(f"Could not queue floor({requested_floor})")
+            logger.info("Floor(%s) already queued", requested_floor)
 
     def voicemail(self, _: int, gpio: int) -> None:
         """Run Call for Help Routine."""
-        logger.debug(f"voicemail({gpio})")
+        logger.debug("voicemail(%s)", gpio)
+        self.counters["voicemail"] += 1
         self._voicemail.run()
         pass
 
     def squeaker(self, _: int, gpio: int) -> None:
         """Run Squeaker Routine."""
-        logger.debug(f"squeaker({gpio})")
+        logger.debug("squeaker(%s)", gpio)
+        self.counters["squeaker"] += 1
         self._squeaker.run()
         pass
 
     def emergency(self, _: int, gpio: int) -> None:
         """Run Emergency/Remain Calm Routine."""
-        logger.debug(f"emergency({gpio})")
+        logger.debug("emergency(%s)", gpio)
+        self.counters["emergency"] += 1
         self._emergency.run()
         pass
 
     def no_press(self, _: int, gpio: int) -> None:
         """Run Don't Press This Button Routine."""
-        logger.debug(f"no_press({gpio})")
+        logger.debug("no_press(%s)", gpio)
+        self.counters["no_press"] += 1
         self._no_press.run()
         pass
 
@@ -192,45 +588,179 @@ class Controller:
 
         Dequeue's all selected motions and floors without playing them.
         """
-        logger.debug(f"cancel({gpio})")
+        logger.debug("cancel(%s)", gpio)
+        self.counters["cancel"] += 1
+        self._cancelled_at = time.monotonic()
         low_level.cancel_call_led(on=True)
         self.interrupt()
 
+    def clear(self) -> None:
+        """
+        Clear everything (cancel held down).
+
+        That's the queue, whatever's playing (flavours too) and maintenance
+        mode.
+        """
+        logger.info("Clear")
+        self.counters["clear"] += 1
+        self.interrupt()
+        for channel_num in audio_channels.values():
+            silence(channel_num)
+        self.maintenance(on=False)
+
+    def maintenance(self, on: Optional[bool] = None) -> None:
+        """
+        Enter or leave (toggle, if on is None) maintenance mode.
+
+        In maintenance mode the ceiling light shows the service colour and
+        floor buttons only light up (a lamp test) rather than calling the
+        car; the other buttons work as usual (an audio test).
+        """
+        on = not self.in_maintenance if on is None else on
+        if on == self.in_maintenance:
+            return
+        self.in_maintenance = on
+        logger.info("Maintenance mode %s", "on" if on else "off")
+        self.counters["maintenance"] += 1
+        if on:
+            self.interrupt()
+        low_level.ceiling_light(service=on)
+
+    def _ceiling(self, level: float) -> None:
+        """Ceiling light at level (0 to 1) of its usual brightness."""
+        low_level.ceiling_light(service=self.in_maintenance, level=level)
+
+    def _sleep(self) -> None:
+        """Go idle (see liftaway.idle): fade out the muzak and the ceiling."""
+        fade_ms = constants.idle_fade_ms
+        self.muzak.fadeout(fade_ms).add_done_callback(self._muzak_faded)
+        level = constants.idle_ceiling_level
+        dimmed = fader.ramp("ceiling", self._ceiling, 1.0, level, fade_ms)
+        if level <= 0:
+            dimmed.add_done_callback(self._ceiling_faded)
+
+    def _muzak_faded(self, faded: Future) -> None:
+        """Have the muzak stopped, now it has faded out going idle."""
+        if faded.result():
+            # (Not on whichever thread finished the fade; the software mixer
+            # does so mid-render)
+            scheduler.call_later(0.0, self._quieten)
+
+    def _quieten(self) -> None:
+        """Idle and faded out: stop the muzak, then close the audio device."""
+        if self.idle.mode != IDLE:
+            return
+        self.muzak.stop()
+        if constants.idle_audio_off and not audio_suspend():
+            # Still draining (e.g. the software mixer's last blocks)
+            scheduler.call_later(AUDIO_OFF_RETRY_S, self._quieten)
+
+    def _ceiling_faded(self, faded: Future) -> None:
+        """Sleep the PCA9685, now the ceiling light has faded right out going idle."""
+        if faded.result() and self.idle.mode == IDLE:
+            low_level.sleep(True)
+
+    def _wake(self) -> None:
+        """Back from idle: ceiling light straight back on, muzak fading in."""
+        fader.cancel("ceiling")
+        low_level.sleep(False)
+        self._ceiling(1.0)
+        self._resume_audio()
+        if self.muzak.play():
+            self.muzak.zero()
+        self.muzak.fadein(constants.idle_wake_fade_ms)
+
+    def _resume_audio(self) -> None:
+        """Reopen the audio device if idle closed it."""
+        if audio_resume():
+            self.muzak.load()
+
     def run(self) -> None:
         """Run Controller."""
         self.running = True
         self.paused = False
         while self.running:
-            while not self.paused:
-                if self._pop_action():
-                    self.action.run()
-                else:
-                    time.sleep(0.1)
-                self.muzak.play() or self.muzak.fadein()
+            while self.running and not self.paused:
+                if self._pop_action(wait=True):
+                    self.action.run(cancelled=self._cancel)
+                    with self.wakeup:
+                        self.action = None
+                        self._cancel = None
+                    self._snapshot()
+                if not self.queue:
+                    # Going idle; bring the muzak back before we sleep
+                    self.muzak.play() or self.muzak.fadein()
             self.muzak.play() or self.muzak.fadein()
             while self._pop_action():
                 self.action.run(interrupted=True)
+            self.action = None
+            low_level.flush()
             low_level.direction_led(on=False)
-            low_level.cancel_call_led(on=False)
+            self._snapshot()
+            scheduler.call_later(CANCEL_LED_S, low_level.cancel_call_led, False)
+            if self._cancelled_at is not None:
+                latency = time.monotonic() - self._cancelled_at
+                CANCEL_LATENCY.observe(latency)
+                logger.info("Cancel took effect %.2fms after press", latency * 1000)
+                self._cancelled_at = None
             self.paused = False
 
+    def stop(self) -> None:
+        """Stop the Controller run loop."""
+        with self.wakeup:
+            self.running = False
+            self.wakeup.notify()
+
     def interrupt(self) -> None:
-        """Interrupt! (Call Cancel)."""
-        self.paused = True
-        if self.action:
-            self.action.interrupt()
+        """
+        Interrupt! (Call Cancel).
+
+        Resolves the running action's cancel token, which wakes it from
+        whatever it's waiting on, and has it silence itself straight away.
+        """
+        trace(Kind.INTERRUPT)
+        with self.wakeup:
+            self.paused = True
+            self._notified_at = time.monotonic()
+            self.wakeup.notify()
+            action = self.action
+            if self._cancel is not None and not self._cancel.done():
+                self._cancel.set_result(True)
+        if action:
+            action.interrupt()
 
 
 def main():
+    # Log records are timestamped and written by a listener thread, so the
+    # GPIO and audio threads never block on stdout
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
     logging.basicConfig(
-        level=logging.DEBUG,
-        stream=sys.stdout,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=os.environ.get("LIFTAWAY_LOG_LEVEL", "DEBUG").upper(),
+        handlers=[queue_handler],
     )
+    if os.environ.get("LIFTAWAY_TRACE"):
+        trace_start(os.environ["LIFTAWAY_TRACE"])
+    if os.environ.get("LIFTAWAY_METRICS_PORT"):
+        metrics.serve(int(os.environ["LIFTAWAY_METRICS_PORT"]))
+    if os.environ.get("LIFTAWAY_CONTROLLER", "thread") == "async":
+        from liftaway.async_controller import AsyncController
+
+        controller = AsyncController()
+    else:
+        controller = Controller()
+    watcher = controller.watch() if os.environ.get("LIFTAWAY_WATCH") else None
 
     # Debug -- Auto-queue two floors on startup
     if False:
-        floors = list(range(len(constants.floor_audio)))
+        floors = list(range(controller.cabin.floors))
         for _ in range(2):
             f = random.choice(floors)  # noqa
             floors.remove(f)
@@ -240,13 +770,19 @@ def main():
         controller.run()
     except KeyboardInterrupt:
         print("KeyboardInterrupt has been caught.")
+        if os.environ.get(STATE_ENV):
+            # Deliberate stop; don't resume this queue next time
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.environ[STATE_ENV])
         low_level.all_lights_off()
-        for i in constants.control_outputs.values():
+        for i in controller.cabin.outputs.values():
             GPIO.output(i, GPIO.LOW)
         GPIO.cleanup()
-
-
-controller = Controller()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        trace_stop()
+        listener.stop()
 
 
 if __name__ == "__main__":
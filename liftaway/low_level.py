@@ -2,38 +2,214 @@
 # -*- coding: utf-8 -*-
 """Liftaway Low-Level (GPIO and PCA) module."""
 
-import random
+import struct
+import time
+from threading import Lock
+from typing import Dict, List, Sequence
 
-import busio
-import RPi.GPIO as GPIO
-from adafruit_pca9685 import PCA9685
-from board import SCL, SDA
-from liftaway.constants import control_outputs
+from liftaway.config import Cabin, cabin, PWM_CHANNELS
+from liftaway.hardware import GPIO, I2C, PCA9685, SCL, SDA
+from liftaway.trace import emit as trace, Kind
 
 
-i2c_bus = busio.I2C(SCL, SDA)
-pca = PCA9685(i2c_bus)
+# PCA9685 registers
+MODE1 = 0x00
+MODE1_AI = 0x20  # register auto-increment
+MODE1_SLEEP = 0x10  # oscillator off (every output off)
+MODE1_RESTART = 0x80
+OSCILLATOR_START_S = 0.0005  # after leaving sleep
+LED0_ON_L = 0x06
 
+# Pins, channels and trace labels, from the cabin configuration (see
+# configure())
+_outputs: Dict[str, int] = {}
+_output_pins: List[int] = []
+_labels: Sequence[str] = ()  # by GPIO pin
+_floor_leds: Sequence[int] = ()  # PWM channel by floor
+_floor_labels: List[str] = []
+CANCEL_CALL = None
+DIRECTION_UP = None
+DIRECTION_DN = None
+DOOR_CLOSE = None
+DOOR_OPEN = None
 
-def init():
-    """Initialize LEDs."""
+# Overhead/Ceiling Light
+CEILING_GREEN = None
+CEILING_RED = None
+CEILING_BLUE = None
+
+# Ceiling light (red, green, blue) duty cycles, normally and in maintenance
+# mode
+CEILING_NORMAL = (0xFFFF, 0x4000, 0)
+CEILING_SERVICE = (0, 0, 0xFFFF)
+
+
+class LEDFrame:
+    """
+    Frame buffer over the PCA9685's 16 PWM channels.
+
+    set() only records the new duty cycle and marks the channel dirty;
+    flush() writes every dirty channel in one auto-increment burst (a single
+    I2C transaction spanning the lowest to highest dirty channel).
+    """
+
+    def __init__(self, pca):
+        """Initialize the buffer (every channel off) over pca's channels."""
+        self._pca = pca
+        self._lock = Lock()
+        self._duty = [0] * PWM_CHANNELS
+        self._dirty = 0  # bitmask of channels to write
+        self.writes = 0  # I2C transactions issued
+
+    def get(self, channel: int) -> int:
+        """Return the (buffered) 16-bit duty cycle of channel."""
+        return self._duty[channel]
+
+    def set(self, channel: int, duty: int) -> None:
+        """Buffer a 16-bit duty cycle for channel."""
+        with self._lock:
+            if self._duty[channel] != duty:
+                self._duty[channel] = duty
+                self._dirty |= 1 << channel
+
+    def snapshot(self) -> List[int]:
+        """Return a copy of every channel's (buffered) duty cycle."""
+        with self._lock:
+            return list(self._duty)
+
+    def clear(self) -> None:
+        """Buffer every channel off."""
+        with self._lock:
+            for channel, duty in enumerate(self._duty):
+                if duty:
+                    self._duty[channel] = 0
+                    self._dirty |= 1 << channel
+
+    def invalidate(self) -> None:
+        """Mark every channel dirty (e.g. chip state unknown)."""
+        with self._lock:
+            self._dirty = (1 << PWM_CHANNELS) - 1
+
+    @staticmethod
+    def _regs(duty: int) -> bytes:
+        """LEDn_ON/OFF register bytes (same encoding as adafruit_pca9685)."""
+        if duty == 0xFFFF:
+            return struct.pack("<HH", 0x1000, 0)
+        return struct.pack("<HH", 0, (duty + 1) >> 4)
+
+    def flush(self) -> None:
+        """Write dirty channels in one I2C burst."""
+        with self._lock:
+            if not self._dirty:
+                return
+            lo = (self._dirty & -self._dirty).bit_length() - 1
+            hi = self._dirty.bit_length() - 1
+            buf = bytearray([LED0_ON_L + 4 * lo])
+            for channel in range(lo, hi + 1):
+                buf += self._regs(self._duty[channel])
+            with self._pca.i2c_device as i2c:
+                i2c.write(buf)
+            self._dirty = 0
+            self.writes += 1
+
+
+# Opened by init() rather than at import so importing doesn't need the bus
+i2c_bus = None
+pca = None
+frame = None
+
+
+def configure(cabin: Cabin) -> None:
+    """
+    Take pins and LED channels from cabin.
+
+    Called at import; call again with a reloaded cabin (same floors) to
+    move things. Lit LEDs move to their new channels and outputs no longer
+    used are switched off.
+    """
+    global _outputs, _output_pins, _labels, _floor_leds, _floor_labels
+    global CANCEL_CALL, DIRECTION_UP, DIRECTION_DN, DOOR_CLOSE, DOOR_OPEN
+    global CEILING_GREEN, CEILING_RED, CEILING_BLUE
+    if frame is not None:
+        moves = list(zip(_floor_leds, cabin.floor_leds))
+        moves += [
+            (old, cabin.ceiling_leds.get(colour))
+            for colour, old in (
+                ("green", CEILING_GREEN),
+                ("red", CEILING_RED),
+                ("blue", CEILING_BLUE),
+            )
+        ]
+        duty = frame.snapshot()
+        for old, new in moves:
+            if old is not None and old != new:
+                frame.set(old, 0)
+        for old, new in moves:
+            if old is not None and new is not None and old != new:
+                frame.set(new, duty[old])
+        frame.flush()
+        unused = set(_output_pins) - set(cabin.outputs.values())
+        if unused:
+            GPIO.output(sorted(unused), GPIO.LOW)
+    _outputs = dict(cabin.outputs)
+    _output_pins = list(_outputs.values())
+    _labels = cabin.output_labels
+    _floor_leds = cabin.floor_leds
+    _floor_labels = [f"floor:{i}" for i in range(cabin.floors)]
+    CANCEL_CALL = _outputs["cancel_call"]
+    DIRECTION_UP = _outputs["direction_up"]
+    DIRECTION_DN = _outputs["direction_dn"]
+    DOOR_CLOSE = _outputs.get("door_close")
+    DOOR_OPEN = _outputs.get("door_open")
+    CEILING_GREEN = cabin.ceiling_leds.get("green")
+    CEILING_RED = cabin.ceiling_leds.get("red")
+    CEILING_BLUE = cabin.ceiling_leds.get("blue")
+
+
+configure(cabin())
+
+
+def init(leds: Sequence[int] = None):
+    """
+    Initialize LEDs.
+
+    :param leds: duty cycles to put back (from LEDFrame.snapshot(); e.g. on
+        a warm restart) rather than starting with everything off.
+    """
+    global i2c_bus, pca, frame
+    if pca is None:
+        i2c_bus = I2C(SCL, SDA)
+        pca = PCA9685(i2c_bus)
+        frame = LEDFrame(pca)
     pca.frequency = 60
-    # Turn all lights off
-    all_lights_off()
+    # Burst writes rely on register auto-increment
+    with pca.i2c_device as i2c:
+        mode1 = bytearray(1)
+        i2c.write_then_readinto(bytes([MODE1]), mode1)
+        i2c.write(bytes([MODE1, mode1[0] | MODE1_AI]))
+    # Turn all lights off (or back as they were), then the ceiling light on
+    # (one burst)
+    if leds is None:
+        all_lights_off(flush=False)
+    else:
+        for channel, duty in enumerate(leds[:PWM_CHANNELS]):
+            frame.set(channel, duty)
+        GPIO.output(_output_pins, GPIO.LOW)
 
-    # Init Overhead/Ceiling Light
-    green = pca.channels[13]
-    red = pca.channels[14]
-    blue = pca.channels[15]
+    ceiling_light(flush=False)
+    # Force a full write; the chip may not match our (zeroed) buffer
+    frame.invalidate()
+    frame.flush()
 
-    # TODO: make this changable
-    red.duty_cycle = 0xFFFF
-    green.duty_cycle = 0x4000
-    blue.duty_cycle = 0x0000
+
+def flush():
+    """Write any buffered LED changes."""
+    frame.flush()
 
 
 def gpio_output(gpio: int, high: bool = True):
     """Set a GPIO Output High or Low."""
+    trace(Kind.LED, gpio, _labels[gpio], high)
     if high:
         GPIO.output(gpio, GPIO.HIGH)
     else:
@@ -42,43 +218,88 @@ def gpio_output(gpio: int, high: bool = True):
 
 def cancel_call_led(on: bool = True):
     """Turn on/off the cancel call LED."""
-    gpio_output(control_outputs.get("cancel_call"), on)
+    gpio_output(CANCEL_CALL, on)
 
 
-def direction_led(on: bool = True):
-    """Turn on/off the direction lights; pick a rando direction..."""
+def direction_led(on: bool = True, up: bool = True):
+    """Turn on/off the direction lights (up, or down if not up)."""
     if on:
-        if random.choice((True, False)):  # noqa
-            gpio_output(control_outputs.get("direction_up"), on)
-        else:
-            gpio_output(control_outputs.get("direction_dn"), on)
+        gpio_output(DIRECTION_UP, up)
+        gpio_output(DIRECTION_DN, not up)
     else:
         # on == False -> Off
-        gpio_output(control_outputs.get("direction_up"), on)
-        gpio_output(control_outputs.get("direction_dn"), on)
+        gpio_output(DIRECTION_UP, on)
+        gpio_output(DIRECTION_DN, on)
 
 
 def door_close_led(on: bool = True):
     """Turn on/off the door close LED."""
-    gpio_output(control_outputs.get("door_close"), on)
+    if DOOR_CLOSE is not None:
+        gpio_output(DOOR_CLOSE, on)
 
 
 def door_open_led(on: bool = True):
     """Turn on/off the door open LED."""
-    gpio_output(control_outputs.get("door_open"), on)
+    if DOOR_OPEN is not None:
+        gpio_output(DOOR_OPEN, on)
 
 
-def floor_button_led(floor, on: bool = True):
-    """Turn on/off floor LED."""
-    if on:
-        pca.channels[floor].duty_cycle = 0xFFFF
-    else:
-        pca.channels[floor].duty_cycle = 0
+def floor_button_led(floor, on: bool = True, flush: bool = True):
+    """
+    Turn on/off floor LED.
+
+    :param flush: write now; pass False to batch with other changes and
+        call flush() once.
+    """
+    trace(Kind.LED, floor, _floor_labels[floor], on)
+    frame.set(_floor_leds[floor], 0xFFFF if on else 0)
+    if flush:
+        frame.flush()
+
+
+def ceiling_light(service: bool = False, level: float = 1.0, flush: bool = True):
+    """
+    Ceiling light on (in the service colour for maintenance mode).
+
+    :param level: brightness, 0 (off) to 1 (full); see liftaway.idle.
+    """
+    colour = CEILING_SERVICE if service else CEILING_NORMAL
+    level = min(max(level, 0.0), 1.0)
+    for channel, duty in zip((CEILING_RED, CEILING_GREEN, CEILING_BLUE), colour):
+        if channel is not None:
+            frame.set(channel, int(duty * level))
+    if flush:
+        frame.flush()
+
+
+def sleep(on: bool = True):
+    """
+    Put the PCA9685 to sleep, or wake it up again.
+
+    Asleep, its oscillator is off, so every channel is dark and the chip
+    idles. LED changes while asleep are still written, and show on waking.
+    """
+    trace(Kind.LED, -1, "sleep", on)
+    with pca.i2c_device as i2c:
+        mode1 = bytearray(1)
+        i2c.write_then_readinto(bytes([MODE1]), mode1)
+        restart = mode1[0] & MODE1_RESTART
+        # (Writing RESTART as 0 leaves it be)
+        mode1 = mode1[0] & ~MODE1_RESTART
+        if on:
+            i2c.write(bytes([MODE1, mode1 | MODE1_SLEEP]))
+            return
+        i2c.write(bytes([MODE1, mode1 & ~MODE1_SLEEP]))
+        if restart:
+            # Once the oscillator is up, resume the PWM channels as they were
+            time.sleep(OSCILLATOR_START_S)
+            i2c.write(bytes([MODE1, (mode1 & ~MODE1_SLEEP) | MODE1_RESTART]))
 
 
-def all_lights_off():
-    """Turn all Lights/LEDS off."""
-    for i in range(0, 15):
-        pca.channels[i].duty_cycle = 0
-    for i in control_outputs.values():
-        gpio_output(i, False)
+def all_lights_off(flush: bool = True):
+    """Turn all Lights/LEDS off (one I2C burst and one GPIO call)."""
+    trace(Kind.LED, -1, "all", 0)
+    frame.clear()
+    if flush:
+        frame.flush()
+    GPIO.output(_output_pins, GPIO.LOW)
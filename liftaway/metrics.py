@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway metrics (Prometheus text exposition).
+
+A tiny in-process registry of counters, gauges and histograms. Metrics are
+declared at module level next to the code that updates them; labelled
+children should be looked up once (labels()) and kept, so an update is a
+lock and an add. serve() exposes the registry at /metrics on a local HTTP
+port (see LIFTAWAY_METRICS_PORT in lift_main).
+"""
+
+import logging
+import math
+from bisect import bisect_left
+from threading import Lock, Thread
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format(value: float) -> str:
+    """Sample value in exposition format."""
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Value:
+    """One counter or gauge sample."""
+
+    __slots__ = ("_lock", "value", "function")
+
+    def __init__(self):
+        """Initialize the sample at zero."""
+        self._lock = Lock()
+        self.value = 0.0
+        self.function: Callable[[], float] = None
+
+    def inc(self, amount: float = 1) -> None:
+        """Add amount."""
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        """Subtract amount (gauges)."""
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Set the value (gauges)."""
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function() at scrape time (gauges)."""
+        self.function = function
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        """Exposition lines."""
+        value = self.function() if self.function is not None else self.value
+        return [f"{name}{labels} {_format(value)}"]
+
+
+class _Histogram:
+    """One histogram sample."""
+
+    __slots__ = ("_lock", "_buckets", "_counts", "_sum")
+
+    def __init__(self, buckets: Sequence[float]):
+        """Initialize an empty histogram over buckets (upper bounds)."""
+        self._lock = Lock()
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        i = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        """Exposition lines (cumulative buckets)."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        inner = labels[1:-1] + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (math.inf,), counts):
+            cumulative += count
+            le = _format(bound)
+            lines.append(f'{name}_bucket{{{inner}le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels} {_format(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Metric:
+    """A named metric, optionally split by labels."""
+
+    def __init__(
+        self,
+        kind: str,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """Initialize a metric of kind ("counter", "gauge" or "histogram")."""
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._buckets = buckets
+        self._lock = Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new(self):
+        """Return a new child sample."""
+        if self.kind == "histogram":
+            return _Histogram(self._buckets)
+        return _Value()
+
+    def labels(self, *values):
+        """Child for these label values (keep it; lookups take a lock)."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new()
+        return child
+
+    def inc(self, amount: float = 1) -> None:
+        """Add amount (unlabelled counters/gauges)."""
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        """Subtract amount (unlabelled gauges)."""
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        """Set the value (unlabelled gauges)."""
+        self._default.set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function() at scrape time (unlabelled gauges)."""
+        self._default.set_function(function)
+
+    def observe(self, value: float) -> None:
+        """Record a value (unlabelled histograms)."""
+        self._default.observe(value)
+
+    def expose(self) -> List[str]:
+        """Exposition lines."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            labels = ",".join(
+                f'{k}="{v}"' for k, v in zip(self.labelnames, values)
+            )
+            lines.extend(child.samples(self.name, f"{{{labels}}}" if labels else ""))
+        return lines
+
+
+class Registry:
+    """All the metrics to expose."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add metric (or return the one already registered by that name)."""
+        return self._metrics.setdefault(metric.name, metric)
+
+    def expose(self) -> str:
+        """Return the registry in Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+    """Register a counter."""
+    return registry.register(Metric("counter", name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Metric:
+    """Register a gauge."""
+    return registry.register(Metric("gauge", name, help, labelnames))
+
+
+def histogram(
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Metric:
+    """Register a histogram."""
+    return registry.register(Metric("histogram", name, help, labelnames, buckets))
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics on a daemon thread; returns the HTTPServer."""
+    # Only imported when enabled; http.server is slow to import at startup
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        """GET /metrics."""
+
+        def do_GET(self):
+            """Serve the registry."""
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Quieter than the default stderr access log."""
+            logger.debug("metrics: " + format, *args)
+
+    server = HTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Metrics on http://%s:%s/metrics", host, server.server_port)
+    return server
@@ -0,0 +1,566 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway software mixer (optional; needs numpy).
+
+Every named channel in liftaway.audio.audio_channels, plus the muzak, is
+mixed in-process as float32 NumPy blocks and the result is played through a
+single pygame channel, fed a block at a time from its end events (the same
+way StreamingSound is fed). Per block the engine applies:
+
+* per-sample volume envelopes (set_volume glides across a block, ramp()
+  follows a fade curve), so fades no longer step every 20ms
+* per-channel gain trim (constants.mixer_gain_db)
+* sidechain ducking: while a trigger channel is playing a target channel
+  is pulled down with attack/release envelopes (constants.mixer_ducking)
+* a peak limiter on the sum (constants.mixer_limiter)
+
+MixChannel and MixMusic mimic the parts of pygame.mixer.Channel and
+pygame.mixer.music that liftaway.audio uses, so Sound and Music work
+unchanged on top of them. Channel state runs up to two blocks ahead of what
+is audible; end events are posted on the scheduler when the sound actually
+ends.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import Future
+from threading import RLock
+from typing import Callable, Dict, List, Tuple
+from weakref import WeakKeyDictionary
+
+from liftaway.fade import Curve, linear
+from liftaway.hardware import pygame
+from liftaway.scheduler import scheduler
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+logger = logging.getLogger(__name__)
+
+# Channel number of the muzak inside the mixer (as in the simulator log)
+MUSIC_CHANNEL = -1
+
+# Envelope curves are evaluated every KNOT_FRAMES and interpolated between
+KNOT_FRAMES = 256
+
+# Limiter attack (frames): gain reduction is reached this far into a block
+LIMITER_ATTACK_FRAMES = 64
+
+# decoded pygame Sound -> int16 samples (see share() and _pcm())
+_pcm_cache = WeakKeyDictionary()
+
+
+def available() -> bool:
+    """Is numpy installed."""
+    return np is not None
+
+
+def db_to_gain(db: float) -> float:
+    """Decibels to a linear gain."""
+    return 10 ** (db / 20)
+
+
+def share(sound: pygame.mixer.Sound, pcm: memoryview) -> None:
+    """
+    Render sound from pcm (e.g. shared memory) rather than a copy of it.
+
+    pcm must hold exactly the Sound's samples, in the mixer's format.
+    """
+    if np is not None:
+        _pcm_cache[sound] = np.frombuffer(pcm, dtype=np.int16)
+
+
+def _pcm(sound: pygame.mixer.Sound, channels: int):
+    """Return a Sound's samples as an int16 (frames, channels) array (cached)."""
+    pcm = _pcm_cache.get(sound)
+    if pcm is None:
+        pcm = np.frombuffer(sound.get_raw(), dtype=np.int16)
+    if pcm.ndim == 1:
+        pcm = pcm.reshape(-1, channels)
+        _pcm_cache[sound] = pcm
+    return pcm
+
+
+class _Envelope:
+    """A gain moving from start to end over a number of frames."""
+
+    def __init__(
+        self, start: float, end: float, frames: int, curve: Curve = linear
+    ):
+        """Initialize a gain ramp from start to end over frames."""
+        self.start = start
+        self.end = end
+        self.frames = max(frames, 0)
+        self.curve = curve
+        self.pos = 0
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+
+    @property
+    def done(self) -> bool:
+        """Has the envelope reached its end."""
+        return self.pos >= self.frames
+
+    def _at(self, pos: float) -> float:
+        """Gain pos frames in."""
+        if pos >= self.frames:
+            return self.end
+        return self.start + (self.end - self.start) * self.curve(pos / self.frames)
+
+    def render(self, n: int):
+        """Per-sample gains for the next n frames."""
+        knots = np.linspace(self.pos, self.pos + n, n // KNOT_FRAMES + 2)
+        values = [self._at(k) for k in knots]
+        gains = np.interp(np.arange(self.pos + 1, self.pos + n + 1), knots, values)
+        self.pos += n
+        return gains.astype(np.float32)
+
+    def cancel(self) -> None:
+        """Superseded; resolve False."""
+        if not self.future.done():
+            self.future.set_result(False)
+
+    def finish(self) -> None:
+        """Completed; resolve True."""
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _Voice:
+    """A Sound playing on a MixChannel."""
+
+    __slots__ = ("sound", "pcm", "pos", "loops", "budget")
+
+    def __init__(self, sound: pygame.mixer.Sound, pcm, loops: int, budget: int):
+        """Initialize a voice at the start of sound."""
+        self.sound = sound
+        self.pcm = pcm
+        self.pos = 0
+        self.loops = loops
+        self.budget = budget  # frames left before maxtime (None is unlimited)
+
+
+class MixChannel:
+    """pygame.mixer.Channel stand-in mixed by the Engine."""
+
+    def __init__(self, engine: "Engine", id: int, name: str, gain_db: float = 0.0):
+        """Initialize an idle channel of engine."""
+        self.engine = engine
+        self.id = id
+        self.name = name
+        self.trim = db_to_gain(gain_db)
+        self._voice = None
+        self._queued = None
+        self._endevent = 0
+        self._volume = 1.0
+        self._applied = 1.0  # volume at the end of the last block
+        self._ramp = None
+        self._fade = None
+        self._halt_after_fade = False
+        self.duck = 1.0
+
+    def _start(self, sound: pygame.mixer.Sound, loops: int = 0, maxtime: int = -1):
+        """Start sound (engine lock held)."""
+        budget = None
+        if maxtime and maxtime > 0:
+            budget = maxtime * self.engine.rate // 1000
+        pcm = _pcm(sound, self.engine.channels)
+        self._voice = _Voice(sound, pcm, loops, budget)
+        self._fade = None
+        self._halt_after_fade = False
+
+    def _halt(self, offset: int = None) -> None:
+        """Sound finished or halted: post end event, start the queue."""
+        self._voice = None
+        self._fade = None
+        self._halt_after_fade = False
+        if self._endevent:
+            self.engine._post(self._endevent, offset)
+        if self._queued is not None:
+            voice, self._queued = self._queued, None
+            self._start(voice)
+
+    def play(
+        self,
+        sound: pygame.mixer.Sound,
+        loops: int = 0,
+        maxtime: int = -1,
+        fade_ms: int = 0,
+    ) -> None:
+        """Play sound, halting whatever was playing."""
+        with self.engine.lock:
+            self._queued = None
+            if self._voice is not None:
+                self._halt()
+            self._start(sound, loops, maxtime)
+            if fade_ms:
+                self._fade = _Envelope(0.0, 1.0, self.engine.frames(fade_ms))
+            self.engine._kick()
+
+    def queue(self, sound: pygame.mixer.Sound) -> None:
+        """Queue sound behind the current one (or play it if idle)."""
+        with self.engine.lock:
+            if self._voice is None:
+                self._start(sound)
+            else:
+                self._queued = sound
+            self.engine._kick()
+
+    def stop(self) -> None:
+        """Halt playback."""
+        with self.engine.lock:
+            if self._voice is not None:
+                self._halt()
+
+    def fadeout(self, ms: int) -> None:
+        """Fade to silence over ms, then halt."""
+        with self.engine.lock:
+            if self._voice is None:
+                return
+            current = self._fade._at(self._fade.pos) if self._fade else 1.0
+            self._voice.loops = 0
+            self._fade = _Envelope(current, 0.0, self.engine.frames(ms))
+            self._halt_after_fade = True
+
+    def get_busy(self) -> bool:
+        """Is something playing."""
+        return self._voice is not None
+
+    def get_sound(self) -> pygame.mixer.Sound:
+        """Playing sound."""
+        voice = self._voice
+        return voice.sound if voice is not None else None
+
+    def get_queue(self) -> pygame.mixer.Sound:
+        """Queued sound."""
+        return self._queued
+
+    def set_endevent(self, type: int = 0) -> None:
+        """Event type to post when a sound ends."""
+        self._endevent = type
+
+    def set_volume(self, volume: float, right: float = None) -> None:
+        """Set channel volume (glides there over one block)."""
+        with self.engine.lock:
+            if self._ramp is not None:
+                self._ramp.cancel()
+                self._ramp = None
+            self._volume = volume
+
+    def get_volume(self) -> float:
+        """Channel volume (where a ramp has got to)."""
+        ramp = self._ramp
+        if ramp is not None:
+            return ramp._at(ramp.pos)
+        return self._volume
+
+    def ramp(self, volume: float, duration_ms: int, curve: Curve = linear) -> Future:
+        """
+        Ramp the channel volume sample accurately.
+
+        :returns: Future resolving to True when the ramp completes, or False
+            if it was superseded.
+        """
+        with self.engine.lock:
+            start = self.get_volume()
+            if self._ramp is not None:
+                self._ramp.cancel()
+                self._ramp = None
+            ramp = _Envelope(start, volume, self.engine.frames(duration_ms), curve)
+            if self._voice is None:
+                # Nothing to hear; jump straight there
+                self._volume = self._applied = volume
+                ramp.finish()
+            else:
+                self._ramp = ramp
+            return ramp.future
+
+    def _render(self, n: int):
+        """Next n frames (float32, pre-duck), or None if silent."""
+        if self._voice is None:
+            if self._ramp is not None:
+                self._volume = self._ramp.end
+                self._ramp.finish()
+                self._ramp = None
+            self._applied = self._volume
+            return None
+        out = np.zeros((n, self.engine.channels), dtype=np.float32)
+        filled = 0
+        while filled < n and self._voice is not None:
+            voice = self._voice
+            take = min(n - filled, len(voice.pcm) - voice.pos)
+            if voice.budget is not None:
+                take = min(take, voice.budget)
+                voice.budget -= take
+            if take > 0:
+                scale = voice.sound.get_volume() / 32768
+                out[filled : filled + take] = voice.pcm[voice.pos : voice.pos + take]
+                out[filled : filled + take] *= scale
+                voice.pos += take
+                filled += take
+            if voice.budget == 0:
+                self._halt(filled)
+            elif voice.pos >= len(voice.pcm):
+                if voice.loops and len(voice.pcm):
+                    voice.loops -= 1 if voice.loops > 0 else 0
+                    voice.pos = 0
+                else:
+                    self._halt(filled)
+
+        if self._ramp is not None:
+            gains = self._ramp.render(n)
+            if self._ramp.done:
+                self._volume = self._ramp.end
+                self._ramp.finish()
+                self._ramp = None
+        else:
+            gains = np.linspace(self._applied, self._volume, n + 1, dtype=np.float32)[1:]
+        self._applied = float(gains[-1])
+        if self._fade is not None:
+            gains = gains * self._fade.render(n)
+            if self._fade.done:
+                self._fade = None
+                if self._halt_after_fade and self._voice is not None:
+                    self._halt(n)
+        out *= (gains * self.trim)[:, None]
+        return out
+
+
+class MixMusic:
+    """pygame.mixer.music stand-in (the muzak, decoded into memory)."""
+
+    def __init__(self, channel: MixChannel):
+        """Initialize the muzak on channel (nothing loaded)."""
+        self.channel = channel
+        self._sound = None
+
+    def load(self, filename: str) -> None:
+        """Load (decode) a track."""
+        self._sound = pygame.mixer.Sound(filename)
+
+    def play(self, loops: int = 0, start: float = 0.0, fade_ms: int = 0) -> None:
+        """Play."""
+        if self._sound is None:
+            raise pygame.error("music not loaded")
+        self.channel.play(self._sound, loops=loops, fade_ms=fade_ms)
+
+    def stop(self) -> None:
+        """Stop."""
+        self.channel.stop()
+
+    def fadeout(self, ms: int) -> None:
+        """Fade out, then stop."""
+        self.channel.fadeout(ms)
+
+    def get_busy(self) -> bool:
+        """Is music playing."""
+        return self.channel.get_busy()
+
+    def set_volume(self, volume: float) -> None:
+        """Set volume."""
+        self.channel.set_volume(volume)
+
+    def get_volume(self) -> float:
+        """Volume."""
+        return self.channel.get_volume()
+
+    def ramp(self, volume: float, duration_ms: int, curve: Curve = linear) -> Future:
+        """Ramp volume sample accurately (see MixChannel.ramp)."""
+        return self.channel.ramp(volume, duration_ms, curve)
+
+
+class Engine:
+    """
+    Mixes MixChannels into one pygame output channel.
+
+    Two blocks are kept on the output channel (playing and queued); each
+    output end event renders the next. When every channel is idle the
+    engine stops rendering and the output drains; the next play restarts it.
+    """
+
+    def __init__(
+        self,
+        output: int,
+        names: Dict[str, int],
+        block_frames: int,
+        gain_db: Dict[str, float] = None,
+        ducking: Tuple[Dict, ...] = (),
+        limiter: Tuple[float, int] = (-1.0, 200),
+        on_start: Callable[[], None] = None,
+    ):
+        """
+        Initialize the engine; the pygame mixer must already be initialized.
+
+        :param output: pygame channel number to play the mix on.
+        :param names: channel name -> number ("music" is added).
+        :param block_frames: frames per output block.
+        :param gain_db: channel name -> gain trim (dB).
+        :param ducking: sidechain rules; dicts of trigger, target, depth_db,
+            attack_ms and release_ms.
+        :param limiter: (ceiling dBFS, release ms).
+        :param on_start: called (lock held) when rendering (re)starts.
+        """
+        if np is None:
+            raise RuntimeError("the software mixer needs numpy")
+        self.rate, size, self.channels = pygame.mixer.get_init()
+        if size != -16:
+            raise ValueError(f"software mixer needs 16-bit output, not {size}")
+        self.block = block_frames
+        self.lock = RLock()
+        gain_db = gain_db or {}
+        names = dict(names, music=MUSIC_CHANNEL)
+        self._by_name = {
+            name: MixChannel(self, n, name, gain_db.get(name, 0.0))
+            for name, n in names.items()
+        }
+        self._by_id = {c.id: c for c in self._by_name.values()}
+        self.music = MixMusic(self._by_name["music"])
+        for rule in ducking:
+            for key in ("trigger", "target"):
+                if rule[key] not in self._by_name:
+                    raise KeyError(f"ducking {key} {rule[key]} is not a channel")
+        self.ducking = tuple(ducking)
+        self.ceiling = db_to_gain(limiter[0])
+        self._release = self._coefficient(limiter[1])
+        self._limit = 1.0
+        self._output = pygame.mixer.Channel(output)
+        self._running = False
+        self._on_start = on_start
+        self._ends_at = 0.0
+        self._events: List[Tuple[int, int]] = []
+        self.blocks = 0
+        self.limited = 0
+
+    @property
+    def running(self) -> bool:
+        """Is the engine rendering (i.e. expecting output end events)."""
+        return self._running
+
+    def channel(self, id: int) -> MixChannel:
+        """Return the MixChannel by number (as pygame.mixer.Channel)."""
+        return self._by_id[id]
+
+    def frames(self, ms: int) -> int:
+        """Milliseconds to frames."""
+        return max(int(ms), 0) * self.rate // 1000
+
+    def _coefficient(self, ms: float) -> float:
+        """One-pole smoothing coefficient per block for a time constant."""
+        if ms <= 0:
+            return 1.0
+        return 1.0 - math.exp(-self.block * 1000 / (self.rate * ms))
+
+    def _post(self, event_type: int, offset: int = None) -> None:
+        """Post a channel end event (offset frames into the block rendering)."""
+        if offset is None:
+            pygame.event.post(pygame.event.Event(event_type))
+        else:
+            self._events.append((offset, event_type))
+
+    def _kick(self) -> None:
+        """(Re)start the output if it has drained (lock held)."""
+        if not self._running:
+            self._running = True
+            if self._on_start is not None:
+                self._on_start()
+            self._top_up()
+
+    def _top_up(self) -> None:
+        """Keep a block playing and one queued (lock held)."""
+        now = time.monotonic()
+        if not self._output.get_busy():
+            self._ends_at = now
+            self._output.play(self._block(now))
+        if self._output.get_queue() is None:
+            self._output.queue(self._block(max(now, self._ends_at)))
+
+    def _feed(self) -> None:
+        """Output end event; render the next block (or let it drain)."""
+        with self.lock:
+            if not self._running or self._output.get_queue() is not None:
+                return
+            if not any(c.get_busy() for c in self._by_id.values()):
+                self._running = False
+                return
+            self._top_up()
+
+    def _duck(self, blocks: Dict[str, object], n: int) -> None:
+        """Apply sidechain ducking to the rendered blocks."""
+        targets: Dict[str, Tuple[float, float, float]] = {}
+        for rule in self.ducking:
+            trigger = self._by_name[rule["trigger"]]
+            depth = db_to_gain(rule["depth_db"])
+            wanted = depth if trigger.name in blocks else 1.0
+            name = rule["target"]
+            current = targets.get(name)
+            if current is None or wanted < current[0]:
+                targets[name] = (
+                    wanted,
+                    self._coefficient(rule["attack_ms"]),
+                    self._coefficient(rule["release_ms"]),
+                )
+        for name, (wanted, attack, release) in targets.items():
+            channel = self._by_name[name]
+            before = channel.duck
+            coefficient = attack if wanted < before else release
+            channel.duck = before + (wanted - before) * coefficient
+            block = blocks.get(name)
+            if block is not None:
+                ramp = np.linspace(before, channel.duck, n + 1, dtype=np.float32)[1:]
+                block *= ramp[:, None]
+
+    def _limiter(self, mix, n: int) -> None:
+        """Peak limit the mix to the ceiling (in place)."""
+        peak = float(np.abs(mix).max()) if n else 0.0
+        wanted = min(1.0, self.ceiling / peak) if peak else 1.0
+        before = self._limit
+        if wanted < before:
+            # Attack: reach the reduction within a few ms
+            self._limit = wanted
+            gains = np.full(n, wanted, dtype=np.float32)
+            attack = min(LIMITER_ATTACK_FRAMES, n)
+            gains[:attack] = np.linspace(before, wanted, attack, dtype=np.float32)
+            self.limited += 1
+        else:
+            self._limit = before + (wanted - before) * self._release
+            gains = np.linspace(before, self._limit, n + 1, dtype=np.float32)[1:]
+        mix *= gains[:, None]
+        np.clip(mix, -1.0, 32767 / 32768, out=mix)
+
+    def _block(self, start: float) -> pygame.mixer.Sound:
+        """Render the block which will start playing at start (lock held)."""
+        n = self.block
+        self._events = []
+        blocks = {}
+        for channel in self._by_id.values():
+            block = channel._render(n)
+            if block is not None:
+                blocks[channel.name] = block
+        self._duck(blocks, n)
+        mix = np.zeros((n, self.channels), dtype=np.float32)
+        for block in blocks.values():
+            mix += block
+        self._limiter(mix, n)
+        pcm = (mix * 32768).astype(np.int16)
+        # Post end events when the audio actually ends
+        now = time.monotonic()
+        for offset, event_type in self._events:
+            when = start + offset / self.rate
+            scheduler.call_later(
+                max(when - now, 0.0),
+                pygame.event.post,
+                pygame.event.Event(event_type),
+            )
+        self._events = []
+        self._ends_at = start + n / self.rate
+        self.blocks += 1
+        return pygame.mixer.Sound(buffer=pcm.tobytes())
+
+    def stats(self) -> Dict[str, int]:
+        """Blocks rendered and blocks which hit the limiter."""
+        return {"blocks": self.blocks, "limited": self.limited}
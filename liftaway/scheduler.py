@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liftaway timer scheduler (one background thread for all timed work)."""
+
+import heapq
+import itertools
+import logging
+import time
+from threading import Condition, Thread
+from typing import Callable, List
+
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduled:
+    """Handle for a scheduled call."""
+
+    __slots__ = ("when", "callback", "args", "cancelled")
+
+    def __init__(self, when: float, callback: Callable, args: tuple):
+        """Initialize a pending call of callback(*args) at when."""
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Don't run (if it hasn't already)."""
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Runs callbacks at monotonic deadlines on a single daemon thread.
+
+    The thread sleeps on a condition until the next deadline (or forever
+    when nothing is scheduled), so an idle scheduler never wakes the CPU.
+    Callbacks run on the scheduler thread and must be quick.
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        """Initialize the scheduler (its thread starts with the first call)."""
+        self._name = name
+        self._cv = Condition()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._thread = None
+
+    def call_at(self, when: float, callback: Callable, *args) -> Scheduled:
+        """Run callback(*args) at time.monotonic() == when."""
+        handle = Scheduled(when, callback, args)
+        with self._cv:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (when, next(self._seq), handle))
+            if self._heap[0][2] is handle:
+                self._cv.notify()
+        return handle
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Scheduled:
+        """Run callback(*args) in delay seconds."""
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def _run(self) -> None:
+        """Scheduler thread."""
+        while True:
+            with self._cv:
+                while True:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cv.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cv.wait(delay)
+                _, _, handle = heapq.heappop(self._heap)
+            try:
+                handle.callback(*handle.args)
+            except Exception:
+                logger.exception("Scheduled %s failed", handle.callback)
+
+
+scheduler = Scheduler()
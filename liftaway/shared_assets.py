@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway shared PCM asset registry.
+
+Maps each asset (a filename, as in liftaway.constants) to a segment of
+mixer-format PCM that every process can map without a copy of its own:
+
+* a region of the asset bundle (liftaway.bundle); the bundle is a file
+  mapping, so every process mapping it shares the same page cache pages.
+* without a bundle, a POSIX shared memory block per asset
+  (multiprocessing.shared_memory). The supervisor converts and publishes
+  these once; workers attach by the index block's name (LIFTAWAY_SHM).
+
+StreamingSound cuts its chunks straight out of a segment and the software
+mixer renders from them (see mixer.share()), so extra processes add page
+table entries rather than copies of the audio. pygame's own Sound(buffer=)
+always copies into SDL, so a decoded pinned Sound still costs its size once
+per process under the pygame mixer.
+"""
+
+import json
+import logging
+import os
+import struct
+import sys
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import liftaway.constants as constants
+from liftaway.bundle import open_bundle, PEAK_DBFS, prepare, referenced_assets, RMS_DBFS
+from liftaway.util import data_resource_filename
+from liftaway.wavfile import WavInfo
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+logger = logging.getLogger(__name__)
+
+# Name of the index block, for workers to attach to
+SHM_ENV = "LIFTAWAY_SHM"
+
+# Segment: buffer is an mmap/memoryview; info locates the PCM within it
+Segment = NamedTuple("Segment", [("buffer", object), ("info", WavInfo)])
+
+
+def available() -> bool:
+    """Can we publish shared memory segments."""
+    return shared_memory is not None
+
+
+def _attach(name: str):
+    """Attach to an existing shared memory block we don't own."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    block = shared_memory.SharedMemory(name)
+    # Before 3.13 attaching registers the block with this process's
+    # resource tracker, which would unlink it when we exit
+    from multiprocessing import resource_tracker
+
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+class Registry:
+    """Asset name -> shared PCM segment."""
+
+    def __init__(self, segments: Dict[str, Segment], blocks: List = None):
+        """Initialize from segments; blocks are closed by close()."""
+        self._segments = segments
+        self._blocks = blocks or []  # SharedMemory blocks to close
+
+    def __contains__(self, name: str) -> bool:
+        """Is name registered."""
+        return name in self._segments
+
+    def segment(self, name: str) -> Segment:
+        """Return the segment holding name's PCM."""
+        return self._segments[name]
+
+    def view(self, name: str) -> memoryview:
+        """Zero-copy view of name's PCM."""
+        buffer, info = self._segments[name]
+        offset = info.data_offset
+        return memoryview(buffer)[offset : offset + info.data_size]
+
+    def discard(self, name: str) -> None:
+        """Stop serving name (its file has changed); it's decoded from disk."""
+        self._segments.pop(name, None)
+
+    @property
+    def nbytes(self) -> int:
+        """Total PCM bytes registered."""
+        return sum(s.info.data_size for s in self._segments.values())
+
+    @classmethod
+    def from_bundle(cls, bundle) -> "Registry":
+        """Register every asset in the bundle (regions of its one mapping)."""
+        return cls({name: Segment(bundle.map, bundle.info(name)) for name in bundle})
+
+    @classmethod
+    def publish(
+        cls,
+        prefix: str,
+        names: Iterable[str] = None,
+        rms_dbfs: float = RMS_DBFS,
+        peak_dbfs: float = PEAK_DBFS,
+        normalized: bool = True,
+    ) -> "Registry":
+        """
+        Convert assets to mixer format in new shared memory blocks.
+
+        Levels are normalized as in an asset bundle (see bundle.build()), so
+        sounds play as loud with or without one.
+
+        The index block is named prefix; the publisher owns every block and
+        should unlink() them when done.
+        """
+        rate, bits, channels, _ = constants.mixer_format
+        width = abs(bits) // 8
+        segments = {}  # type: Dict[str, Segment]
+        blocks = []
+        index = {}
+        for i, name in enumerate(names or referenced_assets()):
+            path = data_resource_filename(name)
+            if not os.path.exists(path):
+                logger.warning("Shared assets: %s missing; skipped", name)
+                continue
+            pcm = prepare(
+                path, rate, width, channels, rms_dbfs, peak_dbfs, normalized
+            )
+            block = shared_memory.SharedMemory(
+                name=f"{prefix}-{i}", create=True, size=max(len(pcm), 1)
+            )
+            block.buf[: len(pcm)] = pcm
+            blocks.append(block)
+            index[name] = [block.name, len(pcm)]
+            segments[name] = Segment(
+                block.buf, WavInfo(channels, width, rate, 0, len(pcm))
+            )
+        header = json.dumps({"format": [rate, bits, channels], "assets": index})
+        header = header.encode("utf-8")
+        block = shared_memory.SharedMemory(
+            name=prefix, create=True, size=4 + len(header)
+        )
+        block.buf[:4] = struct.pack("<I", len(header))
+        block.buf[4 : 4 + len(header)] = header
+        blocks.append(block)
+        registry = cls(segments, blocks)
+        logger.info(
+            "Shared assets: published %s assets (%s bytes) as %s",
+            len(segments),
+            registry.nbytes,
+            prefix,
+        )
+        return registry
+
+    @classmethod
+    def attach(cls, prefix: str) -> "Registry":
+        """Attach to the blocks published as prefix."""
+        index_block = _attach(prefix)
+        (size,) = struct.unpack_from("<I", index_block.buf, 0)
+        header = json.loads(bytes(index_block.buf[4 : 4 + size]).decode("utf-8"))
+        rate, bits, channels = header["format"]
+        if (rate, bits, channels) != tuple(constants.mixer_format[:3]):
+            raise ValueError(f"{prefix} format {header['format']} != mixer format")
+        width = abs(bits) // 8
+        segments = {}  # type: Dict[str, Segment]
+        blocks = [index_block]
+        for name, (block_name, length) in header["assets"].items():
+            block = _attach(block_name)
+            blocks.append(block)
+            segments[name] = Segment(
+                block.buf, WavInfo(channels, width, rate, 0, length)
+            )
+        return cls(segments, blocks)
+
+    def close(self) -> None:
+        """Unmap our blocks."""
+        for block in self._blocks:
+            block.close()
+
+    def unlink(self) -> None:
+        """Remove the published blocks (publisher only)."""
+        for block in self._blocks:
+            block.unlink()
+
+
+_registry = None
+_registry_checked = False
+
+
+def publish(prefix: str) -> Registry:
+    """
+    Publish every asset in shared memory for this process and its workers.
+
+    Forked workers inherit the mapping; others attach by SHM_ENV.
+    """
+    global _registry, _registry_checked
+    _registry = Registry.publish(prefix)
+    _registry_checked = True
+    os.environ[SHM_ENV] = prefix
+    return _registry
+
+
+def shared_assets() -> Optional[Registry]:
+    """Return this process's registry (None if assets aren't shared)."""
+    global _registry, _registry_checked
+    if not _registry_checked:
+        _registry_checked = True
+        bundle = open_bundle()
+        prefix = os.environ.get(SHM_ENV)
+        if bundle is not None:
+            _registry = Registry.from_bundle(bundle)
+        elif prefix and available():
+            try:
+                _registry = Registry.attach(prefix)
+                logger.info("Shared assets: attached to %s", prefix)
+            except (OSError, ValueError) as e:
+                logger.warning("Shared assets %s unusable: %s", prefix, e)
+    return _registry
@@ -0,0 +1,650 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway simulated hardware (GPIO, PCA9685 and pygame mixer).
+
+Stand-ins for the subset of RPi.GPIO, adafruit_pca9685/busio and
+pygame.mixer that liftaway uses, so the controller runs (and can be tested
+and benchmarked) on any Linux box. Every output change is recorded in
+`log` as a timestamped Record; buttons are pressed with GPIO.press().
+
+Clip lengths come from the WAV headers and are divided by the
+LIFTAWAY_SIM_SPEED environment variable (default 1.0). Fadeouts are not
+(they're part of how long a cancel takes to silence the cabin).
+"""
+
+import logging
+import os
+import queue
+import struct
+import time
+from threading import RLock, Thread, Timer
+from types import SimpleNamespace
+from typing import Callable, Dict, List, NamedTuple
+
+from liftaway.wavfile import read_header
+
+
+logger = logging.getLogger(__name__)
+
+SPEED = float(os.environ.get("LIFTAWAY_SIM_SPEED", "1.0"))
+
+# Length (seconds) given to clips whose file doesn't exist
+MISSING_LENGTH = 5.0
+
+# How long GPIO.press() holds a button down, and contact bounce spacing
+# (seconds; not scaled by SPEED)
+PRESS_S = 0.1
+BOUNCE_S = 0.001
+
+Record = NamedTuple(
+    "Record", [("t", float), ("kind", str), ("key", int), ("value", object)]
+)
+
+log: List[Record] = []
+_log_lock = RLock()
+
+
+def record(kind: str, key: int, value) -> None:
+    """Append a timestamped Record to the log."""
+    with _log_lock:
+        log.append(Record(time.monotonic(), kind, key, value))
+
+
+def records(kind: str = None, since: float = 0.0) -> List[Record]:
+    """Return the log (of a kind) from since onwards."""
+    with _log_lock:
+        return [
+            r for r in log if r.t >= since and (kind is None or r.kind == kind)
+        ]
+
+
+def reset() -> None:
+    """Clear the log."""
+    with _log_lock:
+        del log[:]
+
+
+# ---------------------------------------------------------------------------
+# RPi.GPIO
+
+
+class _GPIO:
+    """RPi.GPIO stand-in."""
+
+    BCM = 11
+    IN = 1
+    OUT = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    LOW = 0
+    HIGH = 1
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        """Initialize with no pins set up."""
+        self._lock = RLock()
+        self._levels: Dict[int, int] = {}
+        self._detect: Dict[int, tuple] = {}
+        self._last_edge: Dict[int, float] = {}
+        # RPi.GPIO runs all event callbacks on one thread, in order; started
+        # with the first event detection (so after liftaway.supervisor forks)
+        self._callbacks = queue.Queue()
+        self._callback_thread = None
+
+    def _callback_loop(self) -> None:
+        """Run edge callbacks."""
+        while True:
+            callback, pin = self._callbacks.get()
+            try:
+                callback(pin)
+            except Exception:
+                logger.exception("GPIO(%s) callback failed", pin)
+
+    def setmode(self, mode: int) -> None:
+        """Pin numbering mode (BCM only)."""
+        pass
+
+    def setwarnings(self, on: bool) -> None:
+        """Warnings (ignored)."""
+        pass
+
+    def cleanup(self) -> None:
+        """Reset all pins."""
+        with self._lock:
+            self._levels.clear()
+            self._detect.clear()
+
+    def setup(self, pin: int, direction: int, pull_up_down: int = None) -> None:
+        """Configure a pin."""
+        with self._lock:
+            if direction == self.IN:
+                self._levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else 0
+            else:
+                self._levels[pin] = self.LOW
+
+    def output(self, pins, level) -> None:
+        """Drive one pin (or a list of pins) high or low."""
+        pins = pins if isinstance(pins, (list, tuple)) else [pins]
+        with self._lock:
+            for pin in pins:
+                self._levels[pin] = int(bool(level))
+                record("gpio", pin, int(bool(level)))
+
+    def input(self, pin: int) -> int:
+        """Read a pin level."""
+        return self._levels.get(pin, self.LOW)
+
+    def add_event_detect(
+        self,
+        gpio: int,
+        edge: int,
+        callback: Callable[[int], None] = None,
+        bouncetime: int = 0,
+    ) -> None:
+        """Call callback(pin) on edges."""
+        with self._lock:
+            self._detect[gpio] = (edge, callback, bouncetime)
+            if self._callback_thread is None:
+                self._callback_thread = Thread(
+                    target=self._callback_loop, name="gpio-callbacks", daemon=True
+                )
+                self._callback_thread.start()
+
+    def remove_event_detect(self, gpio: int) -> None:
+        """Stop edge detection."""
+        with self._lock:
+            self._detect.pop(gpio, None)
+
+    def set_input(self, pin: int, level: int) -> None:
+        """Simulate an input changing level (firing edge callbacks)."""
+        level = int(bool(level))
+        with self._lock:
+            previous = self._levels.get(pin, self.HIGH)
+            self._levels[pin] = level
+            record("input", pin, level)
+            if previous == level or pin not in self._detect:
+                return
+            edge, callback, bouncetime = self._detect[pin]
+            rising = level == self.HIGH
+            if edge == self.RISING and not rising:
+                return
+            if edge == self.FALLING and rising:
+                return
+            now = time.monotonic()
+            if bouncetime and now - self._last_edge.get(pin, -1e9) < bouncetime / 1000:
+                return
+            self._last_edge[pin] = now
+        if callback is not None:
+            self._callbacks.put((callback, pin))
+
+    def press(self, pin: int, hold: float = PRESS_S, bounces: int = 0) -> None:
+        """
+        Simulate a button press, released hold seconds later.
+
+        The release happens in the background.
+
+        :param bounces: contact bounces (BOUNCE_S apart) on the way down and
+            back up.
+        """
+        self._bounce(pin, bounces)
+        self.set_input(pin, self.LOW)
+        Timer(hold, self._release, (pin, bounces)).start()
+
+    def _release(self, pin: int, bounces: int) -> None:
+        """Release a press."""
+        self._bounce(pin, bounces)
+        self.set_input(pin, self.HIGH)
+
+    def _bounce(self, pin: int, bounces: int) -> None:
+        """Chatter between levels."""
+        for _ in range(bounces):
+            self.set_input(pin, not self._levels.get(pin, self.HIGH))
+            time.sleep(BOUNCE_S)
+            self.set_input(pin, not self._levels.get(pin, self.HIGH))
+            time.sleep(BOUNCE_S)
+
+
+GPIO = _GPIO()
+
+
+# ---------------------------------------------------------------------------
+# busio / board / adafruit_pca9685
+
+SCL = 3
+SDA = 2
+
+
+class I2C:
+    """busio.I2C stand-in."""
+
+    def __init__(self, scl: int, sda: int):
+        """Initialize the bus (the pins are only recorded)."""
+        self.scl = scl
+        self.sda = sda
+
+
+class _PWMChannel:
+    """PCA9685 PWM channel."""
+
+    def __init__(self, index: int):
+        """Initialize the channel at duty cycle 0."""
+        self._index = index
+        self._duty_cycle = 0
+
+    @property
+    def duty_cycle(self) -> int:
+        """16-bit duty cycle."""
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value: int) -> None:
+        """Set the 16-bit duty cycle."""
+        self._duty_cycle = value
+        record("led", self._index, value)
+
+
+class _I2CDevice:
+    """adafruit_bus_device I2CDevice stand-in decoding PCA9685 writes."""
+
+    def __init__(self, pca: "PCA9685"):
+        """Initialize the (unlocked) bus to pca."""
+        self._pca = pca
+        self._lock = RLock()
+
+    def __enter__(self) -> "_I2CDevice":
+        """Lock the bus."""
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        """Unlock the bus."""
+        self._lock.release()
+
+    def write(self, buf: bytes) -> None:
+        """Write registers (auto-increment LEDn_ON/OFF bursts are decoded)."""
+        record("i2c", buf[0], len(buf))
+        if buf[0] == 0x00:
+            self._pca.mode1 = buf[1]
+            return
+        if buf[0] < 0x06:
+            return
+        first = (buf[0] - 0x06) // 4
+        for i in range(0, len(buf) - 1, 4):
+            on, off = struct.unpack_from("<HH", buf, 1 + i)
+            duty = 0xFFFF if on & 0x1000 else min(off << 4, 0xFFFF)
+            self._pca.channels[first + i // 4].duty_cycle = duty
+
+    def write_then_readinto(self, out: bytes, into: bytearray) -> None:
+        """Register read."""
+        if out[0] == 0x00:
+            into[0] = self._pca.mode1
+
+
+class PCA9685:
+    """adafruit_pca9685.PCA9685 stand-in."""
+
+    def __init__(self, i2c_bus: I2C, address: int = 0x40):
+        """Initialize the controller with its 16 channels."""
+        self.i2c_bus = i2c_bus
+        self.address = address
+        self.frequency = 200
+        self.mode1 = 0x00
+        self.channels = tuple(_PWMChannel(i) for i in range(16))
+        self.i2c_device = _I2CDevice(self)
+
+
+# ---------------------------------------------------------------------------
+# pygame (mixer and event queue)
+
+
+class error(RuntimeError):  # noqa: N801
+    """pygame.error stand-in."""
+
+
+USEREVENT = 32850
+_mixer_lock = RLock()
+_mixer_init = None
+_events = queue.Queue()
+_allowed = None  # None means everything
+
+
+def _post(event_type: int) -> None:
+    """Post an event unless blocked."""
+    if _allowed is None or event_type in _allowed:
+        _events.put(SimpleNamespace(type=event_type))
+
+
+class _Sound:
+    """pygame.mixer.Sound stand-in; only knows its length."""
+
+    def __init__(self, file: str = None, buffer=None):
+        """Initialize the sound from file or buffer."""
+        freq, size, channels = get_init()
+        self._raw = None
+        if buffer is not None:
+            self._raw = bytes(memoryview(buffer).cast("B"))
+            self._length = len(self._raw) / (freq * channels * abs(size) // 8)
+            self.name = "<buffer>"
+        elif os.path.exists(file):
+            info = read_header(file)
+            frames = info.data_size / (info.channels * info.sample_width)
+            self._length = frames / info.rate
+            self.name = os.path.basename(file)
+        else:
+            logger.warning("Sim: %s missing; %ss of silence", file, MISSING_LENGTH)
+            self._length = MISSING_LENGTH
+            self.name = os.path.basename(file)
+        self._volume = 1.0
+
+    def get_length(self) -> float:
+        """Length in seconds."""
+        return self._length
+
+    def get_raw(self) -> bytes:
+        """Return the samples (silence unless made from a buffer)."""
+        if self._raw is not None:
+            return self._raw
+        freq, size, channels = get_init()
+        return bytes(int(self._length * freq) * channels * (abs(size) // 8))
+
+    def set_volume(self, volume: float) -> None:
+        """Set volume."""
+        self._volume = volume
+
+    def get_volume(self) -> float:
+        """Volume."""
+        return self._volume
+
+    def fadeout(self, ms: int) -> None:
+        """Stop this sound on every channel after ms."""
+        for channel in list(_Channel._channels.values()):
+            if channel.get_sound() is self:
+                channel.fadeout(ms)
+
+    def play(self, loops: int = 0, maxtime: int = 0, fade_ms: int = 0):
+        """Play on the first free channel."""
+        for channel in _Channel._channels.values():
+            if not channel.get_busy():
+                channel.play(self, loops, maxtime, fade_ms)
+                return channel
+        return None
+
+
+class _Channel:
+    """pygame.mixer.Channel stand-in with timer driven playback."""
+
+    _channels: Dict[int, "_Channel"] = {}
+
+    def __new__(cls, id: int):
+        """One shared object per channel number."""
+        with _mixer_lock:
+            if id not in cls._channels:
+                channel = super().__new__(cls)
+                channel._init(id)
+                cls._channels[id] = channel
+            return cls._channels[id]
+
+    def _init(self, id: int) -> None:
+        """Initialize the channel (once per channel number)."""
+        self.id = id
+        self._sound = None
+        self._queue = None
+        self._timer = None
+        self._endevent = 0
+        self._volume = 1.0
+        self._loops = 0
+
+    def _start(self, sound: _Sound, loops: int = 0, maxtime: int = 0) -> None:
+        """Start sound (mixer lock held)."""
+        self._sound = sound
+        self._loops = loops
+        length = sound.get_length()
+        if maxtime and maxtime > 0:
+            # maxtime covers every loop
+            if loops >= 0:
+                length *= loops + 1
+            else:
+                length = maxtime / 1000
+            length = min(length, maxtime / 1000)
+            self._loops = 0
+        record("play", self.id, sound.name)
+        self._arm(length)
+
+    def _arm(self, seconds: float, scaled: bool = True) -> None:
+        """(Re)start the end-of-sound timer (seconds of clip, if scaled)."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if scaled:
+            seconds /= SPEED
+        self._timer = Timer(seconds, self._ended, args=(self._sound,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _ended(self, sound: _Sound) -> None:
+        """Timer fired; the sound finished."""
+        with _mixer_lock:
+            if self._sound is not sound:
+                return
+            if self._loops:
+                self._loops -= 1 if self._loops > 0 else 0
+                self._arm(sound.get_length())
+                return
+            self._halt()
+
+    def _halt(self) -> None:
+        """Sound finished or halted: post end event, start the queue."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        record("end", self.id, self._sound.name if self._sound else None)
+        self._sound = None
+        if self._endevent:
+            _post(self._endevent)
+        if self._queue is not None:
+            sound, self._queue = self._queue, None
+            self._start(sound)
+
+    def play(self, sound: _Sound, loops: int = 0, maxtime: int = 0, fade_ms: int = 0):
+        """Play sound, halting whatever was playing."""
+        with _mixer_lock:
+            self._queue = None
+            if self._sound is not None:
+                self._halt()
+            self._start(sound, loops, maxtime)
+
+    def queue(self, sound: _Sound) -> None:
+        """Queue sound behind the current one (or play it if idle)."""
+        with _mixer_lock:
+            if self._sound is None:
+                self._start(sound)
+            else:
+                self._queue = sound
+
+    def stop(self) -> None:
+        """Halt playback."""
+        with _mixer_lock:
+            if self._sound is not None:
+                self._halt()
+
+    def fadeout(self, ms: int) -> None:
+        """Halt playback after ms."""
+        with _mixer_lock:
+            if self._sound is not None:
+                record("fadeout", self.id, ms)
+                self._loops = 0
+                self._arm(ms / 1000, scaled=False)
+
+    def get_busy(self) -> bool:
+        """Is something playing."""
+        return self._sound is not None
+
+    def get_sound(self) -> _Sound:
+        """Playing sound."""
+        return self._sound
+
+    def get_queue(self) -> _Sound:
+        """Queued sound."""
+        return self._queue
+
+    def set_endevent(self, type: int = 0) -> None:
+        """Event type to post when a sound ends."""
+        self._endevent = type
+
+    def set_volume(self, volume: float, right: float = None) -> None:
+        """Set channel volume."""
+        self._volume = volume
+        record("volume", self.id, volume)
+
+    def get_volume(self) -> float:
+        """Channel volume."""
+        return self._volume
+
+
+class _Music:
+    """pygame.mixer.music stand-in (the muzak channel is recorded as -1)."""
+
+    def __init__(self):
+        """Initialize the stopped muzak channel."""
+        self._file = None
+        self._busy = False
+        self._volume = 1.0
+
+    def load(self, filename: str) -> None:
+        """Load a track."""
+        self._file = os.path.basename(filename)
+
+    def play(self, loops: int = 0, start: float = 0.0, fade_ms: int = 0) -> None:
+        """Play (muzak loops forever so there's no end timer)."""
+        if self._file is None:
+            raise error("music not loaded")
+        self._busy = True
+        record("play", -1, self._file)
+
+    def stop(self) -> None:
+        """Stop."""
+        self._busy = False
+        record("end", -1, self._file)
+
+    def fadeout(self, ms: int) -> None:
+        """Fadeout (immediate stop in the simulation)."""
+        self.stop()
+
+    def get_busy(self) -> bool:
+        """Is music playing."""
+        return self._busy
+
+    def set_volume(self, volume: float) -> None:
+        """Set volume."""
+        self._volume = volume
+        record("volume", -1, volume)
+
+    def get_volume(self) -> float:
+        """Volume."""
+        return self._volume
+
+
+def pre_init(frequency: int = 44100, size: int = -16, channels: int = 2, buffer: int = 512):
+    """Mixer format used by init()."""
+    global _pre_init
+    _pre_init = (frequency, size, channels)
+
+
+_pre_init = (44100, -16, 2)
+
+
+def get_init():
+    """Mixer format (freq, size, channels)."""
+    return _mixer_init or _pre_init
+
+
+def set_num_channels(count: int) -> None:
+    """Allocate channels."""
+    for i in range(count):
+        _Channel(i)
+
+
+def _init():
+    """pygame.init() (and pygame.mixer.init())."""
+    global _mixer_init
+    _mixer_init = _pre_init
+    return (1, 0)
+
+
+def _quit():
+    """pygame.quit()."""
+    global _mixer_init
+    _mixer_init = None
+    _events.put(None)
+
+
+def _mixer_quit():
+    """pygame.mixer.quit(): everything stops; end events and music are lost."""
+    global _mixer_init
+    with _mixer_lock:
+        for channel in _Channel._channels.values():
+            channel._endevent = 0
+            channel._queue = None
+            if channel._sound is not None:
+                channel._halt()
+        if pygame.mixer.music.get_busy():
+            pygame.mixer.music.stop()
+        pygame.mixer.music._file = None
+        _mixer_init = None
+
+
+def _wait():
+    """pygame.event.wait()."""
+    event = _events.get()
+    if event is None:
+        raise error("video system not initialized")
+    return event
+
+
+def _post_event(event) -> None:
+    """pygame.event.post()."""
+    _post(event.type)
+
+
+def _set_blocked(types) -> None:
+    """pygame.event.set_blocked (None blocks everything)."""
+    global _allowed
+    if types is None:
+        _allowed = set()
+
+
+def _set_allowed(types) -> None:
+    """pygame.event.set_allowed."""
+    global _allowed
+    if types is None:
+        _allowed = None
+    else:
+        _allowed = (_allowed or set()) | set(types)
+
+
+pygame = SimpleNamespace(
+    USEREVENT=USEREVENT,
+    error=error,
+    init=_init,
+    quit=_quit,
+    display=SimpleNamespace(init=lambda: None),
+    mixer=SimpleNamespace(
+        init=_init,
+        quit=_mixer_quit,
+        Sound=_Sound,
+        Channel=_Channel,
+        music=_Music(),
+        pre_init=pre_init,
+        get_init=get_init,
+        set_num_channels=set_num_channels,
+    ),
+    event=SimpleNamespace(
+        Event=lambda type: SimpleNamespace(type=type),
+        post=_post_event,
+        wait=_wait,
+        set_blocked=_set_blocked,
+        set_allowed=_set_allowed,
+    ),
+)
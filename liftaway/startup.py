@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liftaway startup phase timing."""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import liftaway.metrics as metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Set by liftaway.supervisor: time.monotonic() when the last worker died
+RESTARTED_ENV = "LIFTAWAY_RESTARTED_AT"
+
+STARTUP_SECONDS = metrics.gauge(
+    "liftaway_startup_seconds", "Startup phase durations.", ["phase"]
+)
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process was started (None if /proc isn't there)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is 22nd
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+
+
+class Startup:
+    """
+    Startup timeline.
+
+    phase() times a step run in line; mark() records a milestone reached in
+    the background (e.g. the last clip decoded), timed from the start.
+    """
+
+    def __init__(self):
+        """Initialize the timings, starting now."""
+        self.began = time.monotonic()
+        # Interpreter start and imports (or just the fork, for a worker
+        # forked by liftaway.supervisor), before we got going
+        self.before = process_age()
+        restarted_at = os.environ.get(RESTARTED_ENV)
+        self.restarted_at = float(restarted_at) if restarted_at else None
+        self.phases: List[Tuple[str, float]] = []
+        self.marks: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the with block as phase name."""
+        began = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - began
+            self.phases.append((name, seconds))
+            STARTUP_SECONDS.labels(name).set(seconds)
+
+    def mark(self, name: str) -> None:
+        """Record reaching milestone name."""
+        seconds = time.monotonic() - self.began
+        self.marks.append((name, seconds))
+        STARTUP_SECONDS.labels(name).set(seconds)
+        logger.info("Startup: %s after %.3fs", name, seconds)
+
+    def report(self) -> List[str]:
+        """Phase breakdown, one line per phase/milestone."""
+        lines = []
+        if self.restarted_at is not None:
+            seconds = self.began - self.restarted_at
+            lines.append(f"{'restart':<16} {seconds * 1000:8.1f}ms (last worker died)")
+        if self.before is not None:
+            lines.append(f"{'python+imports':<16} {self.before * 1000:8.1f}ms")
+        for name, seconds in self.phases:
+            lines.append(f"{name:<16} {seconds * 1000:8.1f}ms")
+        for name, seconds in self.marks:
+            lines.append(f"{name:<16} {seconds * 1000:8.1f}ms (from start)")
+        return lines
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway controller state snapshots (for warm restarts).
+
+While LIFTAWAY_STATE names a file, the controller keeps it up to date
+with the floors still to be visited and the LED frame. A controller
+starting up (e.g. restarted by liftaway.supervisor) picks them back up,
+unless the snapshot is older than MAX_AGE.
+"""
+
+import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Callable, List, NamedTuple, Optional
+
+from liftaway.scheduler import scheduler
+
+
+logger = logging.getLogger(__name__)
+
+STATE_ENV = "LIFTAWAY_STATE"
+
+# Ignore snapshots older than this (seconds); nobody's waiting any more
+MAX_AGE = 30.0
+
+Snapshot = NamedTuple(
+    "Snapshot", [("floors", List[int]), ("leds", List[int]), ("saved_at", float)]
+)
+
+
+def save(path: str, snapshot: Snapshot) -> None:
+    """Write snapshot to path atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot._asdict(), f)
+    os.replace(tmp, path)
+
+
+def load(path: str, max_age: float = MAX_AGE) -> Optional[Snapshot]:
+    """Snapshot from path (None if there isn't a usable, recent one)."""
+    try:
+        with open(path) as f:
+            snapshot = Snapshot(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning("Ignoring state snapshot %s: %s", path, e)
+        return None
+    age = time.time() - snapshot.saved_at
+    if age > max_age:
+        logger.info("Ignoring state snapshot %s (%.0fs old)", path, age)
+        return None
+    return snapshot
+
+
+class Snapshotter:
+    """
+    Keeps a snapshot file up to date off the hot path.
+
+    request() only schedules a write on the scheduler thread; any number of
+    requests before it runs are coalesced into one write of the state
+    collect() returns then.
+    """
+
+    def __init__(self, path: str, collect: Callable[[], Snapshot]):
+        """Initialize the writer; collect() returns the state to write."""
+        self.path = path
+        self._collect = collect
+        self._lock = Lock()
+        self._scheduled = False
+        self.writes = 0
+
+    def request(self) -> None:
+        """State has changed; write it soon."""
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        scheduler.call_later(0, self._write)
+
+    def _write(self) -> None:
+        """Write the current state (scheduler thread)."""
+        with self._lock:
+            self._scheduled = False
+        try:
+            save(self.path, self._collect())
+            self.writes += 1
+        except OSError as e:
+            logger.warning("Couldn't save state snapshot %s: %s", self.path, e)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway supervisor (replaces the scripts/keep_alive restart loop).
+
+The supervisor does the slow, stateless part of starting up once: the
+interpreter, every import (pygame alone is a few hundred milliseconds on
+the Pi) and sharing the decoded assets (the asset bundle's mapping or,
+without one, shared memory it publishes; see liftaway.shared_assets). It
+then forks the controller as a worker process and, whenever the worker
+dies, forks a fresh one straight away. A new worker inherits all of that,
+so it only has to bring up the hardware and mixer and take its clips from
+the shared PCM. It then picks the floor queue and LEDs back up
+from the snapshot the last worker kept (liftaway.state).
+
+A worker that keeps dying straight after starting is restarted with a
+growing delay (up to MAX_RESTART_DELAY) rather than in a tight loop.
+"""
+
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from liftaway.startup import RESTARTED_ENV
+from liftaway.state import STATE_ENV
+
+
+logger = logging.getLogger(__name__)
+
+# A worker which lived at least this long (seconds) is considered healthy
+MIN_UPTIME = 10.0
+
+# Restart delay after a worker that died young (doubles each time)
+FIRST_RESTART_DELAY = 0.1
+MAX_RESTART_DELAY = 3.0
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "liftaway-state.json")
+
+
+class Supervisor:
+    """Forks and re-forks the controller worker."""
+
+    def __init__(self, state_path: str = DEFAULT_STATE_PATH):
+        """Initialize with no worker forked yet."""
+        self.state_path = state_path
+        self.worker = None  # pid
+        self.restarts = 0
+        self._stopping = False
+        self._delay = 0.0
+        self._published = None  # shared_assets.Registry we own
+
+    def _warm(self) -> None:
+        """Import everything and share the assets, once, in the parent."""
+        from liftaway import lift_main  # noqa: F401 (pygame and friends)
+        from liftaway import shared_assets
+
+        registry = shared_assets.shared_assets()
+        if registry is None and shared_assets.available():
+            # No bundle; convert once into shared memory for every worker
+            registry = self._published = shared_assets.publish(
+                f"liftaway-{os.getpid()}"
+            )
+        if registry is not None:
+            logger.info("Supervisor: %s bytes of shared PCM", registry.nbytes)
+
+    def _fork(self) -> int:
+        """Start a worker; returns its pid."""
+        pid = os.fork()
+        if pid:
+            return pid
+        # Worker
+        code = 1
+        try:
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Let lift_main.main() set logging up its own way
+            for handler in list(logging.root.handlers):
+                logging.root.removeHandler(handler)
+            from liftaway.lift_main import main
+
+            main()
+            code = 0
+        except SystemExit as e:
+            # As the interpreter would exit (None is success; a message, 1)
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                logging.error("Worker exited: %s", e.code)
+        except KeyboardInterrupt:
+            code = 128 + signal.SIGINT
+        except Exception:
+            logging.exception("Worker failed")
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+    def _signal(self, signum, _) -> None:
+        """SIGINT/SIGTERM: stop the worker, then ourselves."""
+        self._stopping = True
+        if self.worker is not None:
+            # SIGINT is what the worker's cleanup (lights off, GPIO) handles
+            os.kill(self.worker, signal.SIGINT)
+
+    def run(self) -> int:
+        """Supervise until stopped."""
+        os.environ[STATE_ENV] = self.state_path
+        self._warm()
+        signal.signal(signal.SIGINT, self._signal)
+        signal.signal(signal.SIGTERM, self._signal)
+        try:
+            self._supervise()
+        finally:
+            if self._published is not None:
+                self._published.unlink()
+        logger.info("Supervisor: stopped after %s restart(s)", self.restarts)
+        return 0
+
+    def _supervise(self) -> None:
+        """Fork workers until stopped."""
+        while not self._stopping:
+            started = time.monotonic()
+            self.worker = self._fork()
+            logger.info("Supervisor: worker %s started", self.worker)
+            _, status = os.waitpid(self.worker, 0)
+            died = time.monotonic()
+            self.worker = None
+            if self._stopping:
+                break
+            uptime = died - started
+            logger.warning(
+                "Supervisor: worker exited (status %s) after %.1fs", status, uptime
+            )
+            if uptime >= MIN_UPTIME:
+                self._delay = 0.0
+            else:
+                self._delay = min(
+                    max(self._delay * 2, FIRST_RESTART_DELAY), MAX_RESTART_DELAY
+                )
+            if self._delay:
+                logger.info("Supervisor: restarting in %.1fs", self._delay)
+                time.sleep(self._delay)
+            os.environ[RESTARTED_ENV] = repr(died)
+            self.restarts += 1
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=sys.stdout,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    state_path = os.environ.get(STATE_ENV, DEFAULT_STATE_PATH)
+    sys.exit(Supervisor(state_path).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway event tracing.
+
+Typed events (button press, floor enqueue/dequeue, clip play/end, LED
+change, interrupt) are recorded with monotonic timestamps into a
+preallocated ring buffer. Recording an event is a handful of array stores:
+no formatting, no allocation and no I/O. Strings (button and clip names)
+are interned to small integers once.
+
+A drain thread (see start()) periodically writes new events to a JSONL
+file; if the hot path laps the drain, the overwritten events are counted as
+dropped. load() and timelines() read a trace back and rebuild what happened
+after each press (see ``liftaway-tools trace``).
+"""
+
+import itertools
+import json
+import logging
+import time
+from array import array
+from collections import defaultdict
+from enum import IntEnum
+from threading import Event, Lock, Thread
+from typing import Dict, List
+
+
+logger = logging.getLogger(__name__)
+
+# Ring buffer size (events); ~21 bytes each
+DEFAULT_CAPACITY = 1 << 16
+
+# How often the drain thread writes (seconds)
+DRAIN_INTERVAL = 0.5
+
+
+class Kind(IntEnum):
+    """Trace event types."""
+
+    PRESS = 1  # key: GPIO pin, name: button
+    ENQUEUE = 2  # key: floor, value: 1 queued / 0 already queued
+    DEQUEUE = 3  # key: floor (-1 for a Movement), value: 1 if interrupted
+    PLAY = 4  # key: channel, name: clip, value: 1 if queued
+    END = 5  # key: channel
+    LED = 6  # name: LED, value: on/off
+    INTERRUPT = 7
+    GESTURE = 8  # key: GPIO pin (of the last button), name: action
+
+
+class Tracer:
+    """Preallocated ring buffer of trace events."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        """Initialize an empty buffer of capacity events."""
+        self.capacity = capacity
+        self._t = array("d", bytes(8 * capacity))
+        self._kind = array("B", bytes(capacity))
+        self._key = array("i", bytes(4 * capacity))
+        self._name = array("H", bytes(2 * capacity))
+        self._value = array("i", bytes(4 * capacity))
+        # Sequence number of the event in each slot, written last, so a
+        # reader can tell a finished slot from one still being written
+        self._seq = array("q", [-1]) * capacity
+        self._next = itertools.count()
+        self._names = [""]  # type: List[str]
+        self._ids = {"": 0}  # type: Dict[str, int]
+        self._names_lock = Lock()
+        self._drained = 0
+        self.dropped = 0
+
+    def intern(self, name: str) -> int:
+        """Small integer id for a string (0 is no name)."""
+        id = self._ids.get(name)
+        if id is None:
+            with self._names_lock:
+                id = self._ids.get(name)
+                if id is None:
+                    id = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = id
+        return id
+
+    def emit(self, kind: Kind, key: int = 0, name: str = "", value: int = 0) -> None:
+        """Record an event (any thread)."""
+        seq = next(self._next)
+        slot = seq % self.capacity
+        self._t[slot] = time.monotonic()
+        self._kind[slot] = kind
+        self._key[slot] = key
+        self._name[slot] = self.intern(name) if name else 0
+        self._value[slot] = value
+        self._seq[slot] = seq
+
+    def drain(self) -> List[Dict]:
+        """Events recorded since the last drain, oldest first."""
+        out = []
+        seq = self._drained
+        while True:
+            slot = seq % self.capacity
+            found = self._seq[slot]
+            if found < seq:
+                # Not written yet (or still being written)
+                break
+            if found > seq:
+                # Lapped; skip to the oldest event still in the buffer
+                self.dropped += found - seq
+                seq = found
+                continue
+            event = {
+                "t": self._t[slot],
+                "kind": Kind(self._kind[slot]).name.lower(),
+                "key": self._key[slot],
+                "value": self._value[slot],
+            }
+            name = self._name[slot]
+            if name:
+                event["name"] = self._names[name]
+            if self._seq[slot] != seq:
+                # Overwritten while we read it
+                continue
+            out.append(event)
+            seq += 1
+        self._drained = seq
+        return out
+
+
+tracer = Tracer()
+emit = tracer.emit
+
+_stop = Event()
+_thread = None
+
+
+def _drain_loop(path: str) -> None:
+    """Drain thread: append new events to path every DRAIN_INTERVAL."""
+    with open(path, "a") as f:
+        header = {"kind": "start", "epoch": time.time() - time.monotonic()}
+        f.write(json.dumps(header) + "\n")
+        while True:
+            stopping = _stop.wait(DRAIN_INTERVAL)
+            dropped = tracer.dropped
+            for event in tracer.drain():
+                f.write(json.dumps(event) + "\n")
+            if tracer.dropped != dropped:
+                f.write(json.dumps({"kind": "dropped", "n": tracer.dropped}) + "\n")
+            f.flush()
+            if stopping:
+                return
+
+
+def start(path: str) -> None:
+    """Start draining the trace to a JSONL file."""
+    global _thread
+    if _thread is None:
+        logger.info("Tracing to %s", path)
+        _thread = Thread(target=_drain_loop, args=(path,), name="trace", daemon=True)
+        _thread.start()
+
+
+def stop() -> None:
+    """Flush the trace and stop the drain thread."""
+    global _thread
+    if _thread is not None:
+        _stop.set()
+        _thread.join()
+        _thread = None
+        _stop.clear()
+
+
+def load(path: str) -> List[Dict]:
+    """Events from a JSONL trace."""
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return [e for e in events if "t" in e]
+
+
+def _following(events: List[Dict], i: int) -> List[Dict]:
+    """Clips started, LED changes and interrupts in the second after events[i]."""
+    found = []
+    for later in events[i + 1:]:
+        if later["t"] - events[i]["t"] > 1.0:
+            break
+        if later["kind"] in ("play", "led", "interrupt"):
+            found.append(later)
+    return found
+
+
+class _FloorTrack:
+    """Hands one floor's events to the timeline of the press that queued it."""
+
+    def __init__(self, floor: int, presses: List[Dict]):
+        """
+        Initialize with nothing queued.
+
+        :param presses: timelines of the floor's button presses, in order.
+        """
+        self.floor = floor
+        self.presses = presses
+        self.active = None  # timeline of the press which queued the floor
+        self.running = False
+        self.movement = None  # events since the latest Movement was dequeued
+
+    def feed(self, e: Dict) -> None:
+        """Take the next event of the trace."""
+        kind = e["kind"]
+        if kind == "enqueue" and e["key"] == self.floor:
+            self._enqueue(e)
+        elif self.active is None:
+            return
+        elif kind == "led" and e.get("name") == f"floor:{self.floor}":
+            self.active["events"].append(e)
+        elif kind == "dequeue":
+            self._dequeue(e)
+        elif kind == "interrupt":
+            self.active["events"].append(e)
+            if self.running:
+                self._done()
+        elif kind in ("play", "end"):
+            if self.running:
+                self.active["events"].append(e)
+            elif self.movement is not None:
+                self.movement.append(e)
+
+    def _enqueue(self, e: Dict) -> None:
+        """Follow the latest press of the floor button (if it queued us)."""
+        if e["value"] or self.active is None:
+            earlier = [t for t in self.presses if t["t"] <= e["t"]]
+            self.active = earlier[-1] if earlier else None
+        if self.active is not None:
+            self.active["events"].append(e)
+
+    def _dequeue(self, e: Dict) -> None:
+        """Note the Movement ahead of the floor, and the floor itself."""
+        if self.running:
+            self._done()
+        elif e["key"] == -1:
+            self.movement = [e]
+        elif e["key"] == self.floor:
+            self.active["events"].extend(self.movement or [])
+            self.active["events"].append(e)
+            self.movement = None
+            self.running = not e["value"]
+            if e["value"]:
+                self.active = None
+        else:
+            self.movement = None
+
+    def _done(self) -> None:
+        """Stop following; the floor has finished (or been interrupted)."""
+        self.running = False
+        self.active = None
+
+
+def timelines(events: List[Dict]) -> List[Dict]:
+    """
+    Return per-press timelines.
+
+    A floor press follows its floor: enqueue, LED, the dequeue of the
+    Movement ahead of it and of the floor itself, and every clip played or
+    ended from then until the next dequeue (or interrupt). Other presses get
+    the clips started, LED changes and interrupts in the following second.
+    """
+    by_floor = defaultdict(list)  # type: Dict[int, List[Dict]]
+    result = []
+    for i, e in enumerate(events):
+        if e["kind"] != "press":
+            continue
+        name = e.get("name", "")
+        timeline = {"t": e["t"], "button": name, "events": []}
+        result.append(timeline)
+        if name.startswith("floor:"):
+            by_floor[int(name[6:])].append(timeline)
+        else:
+            timeline["events"].extend(_following(events, i))
+    tracks = [_FloorTrack(floor, presses) for floor, presses in by_floor.items()]
+    for e in events:
+        for track in tracks:
+            track.feed(e)
+    for timeline in result:
+        timeline["events"].sort(key=lambda e: e["t"])
+    return result
+
+
+def format_timeline(timeline: Dict) -> List[str]:
+    """Human readable lines for one press timeline."""
+    lines = [f"{timeline['t']:.3f} press {timeline['button']}"]
+    for e in timeline["events"]:
+        offset = (e["t"] - timeline["t"]) * 1000
+        detail = e.get("name", "")
+        if e["kind"] in ("enqueue", "dequeue", "play", "end"):
+            detail = f"{e['key']} {detail}".strip()
+        if e["kind"] in ("led", "enqueue", "dequeue"):
+            detail = f"{detail} ({e['value']})"
+        lines.append(f"  {offset:+10.2f}ms {e['kind']:<9} {detail}")
+    return lines
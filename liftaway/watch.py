@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Liftaway file watcher (for hot reload; see LIFTAWAY_WATCH in lift_main).
+
+Watches a set of files and calls back, on its own thread, with the ones
+that have changed. Uses inotify (through ctypes; nothing to install) on
+the files' directories, so files replaced by rename (as editors and
+rsync do) are caught as well as ones rewritten in place. Elsewhere it
+falls back to polling modification times. With inotify the thread sleeps
+until something changes (or stop() wakes it), so it never polls.
+
+Changes are batched: the callback runs once things have been quiet for
+SETTLE_S, with every file changed meanwhile.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Quiet period before a batch of changes is handed over (seconds)
+SETTLE_S = 0.25
+
+# Modification time polling interval without inotify (seconds)
+POLL_S = 1.0
+
+# inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (then the name)
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+except (OSError, AttributeError):  # Not Linux
+    _libc = None
+
+
+def available() -> bool:
+    """Return True if we can use inotify (otherwise we poll)."""
+    return _libc is not None
+
+
+class Watcher:
+    """Calls callback(changed paths) when watched files change."""
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        callback: Callable[[Set[str]], None],
+        settle: float = SETTLE_S,
+    ):
+        """Initialize watching paths; callbacks begin once start() is called."""
+        self._callback = callback
+        self._settle = settle
+        self._lock = Lock()
+        self._paths: Set[str] = set()
+        self._dirs: Dict[int, str] = {}  # inotify wd -> directory
+        self._mtimes: Dict[str, Tuple[float, int]] = {}
+        self._fd = None
+        self._wake = None  # (read, write) pipe; stop() wakes a blocked select
+        self._stop = Event()
+        self._thread = None
+        if available():
+            self._fd = _libc.inotify_init1(IN_CLOEXEC)
+            if self._fd < 0:
+                e = ctypes.get_errno()
+                logger.warning("inotify unavailable (%s); polling", os.strerror(e))
+                self._fd = None
+            else:
+                self._wake = os.pipe()
+        self.watch(paths)
+
+    def watch(self, paths: Iterable[str]) -> None:
+        """Watch these files (instead of the ones watched before)."""
+        paths = {os.path.abspath(p) for p in paths}
+        with self._lock:
+            self._paths = paths
+            self._mtimes = {p: self._stat(p) for p in paths}
+            if self._fd is None:
+                return
+            watched = set(self._dirs.values())
+            for directory in {os.path.dirname(p) for p in paths} - watched:
+                wd = _libc.inotify_add_watch(
+                    self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+                )
+                if wd < 0:
+                    e = ctypes.get_errno()
+                    logger.warning("Can't watch %s: %s", directory, os.strerror(e))
+                else:
+                    self._dirs[wd] = directory
+
+    @staticmethod
+    def _stat(path: str) -> Tuple[float, int]:
+        """(mtime, size) of path ((0, -1) if it's not there)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (0.0, -1)
+        return (st.st_mtime, st.st_size)
+
+    def _poll(self) -> Set[str]:
+        """Files whose modification time or size changed."""
+        changed = set()
+        with self._lock:
+            for path in self._paths:
+                stat = self._stat(path)
+                if stat != self._mtimes.get(path):
+                    self._mtimes[path] = stat
+                    changed.add(path)
+        return changed
+
+    def _read(self) -> Set[str]:
+        """Watched files named by the pending inotify events."""
+        data = os.read(self._fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        with self._lock:
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Lost track; fall back to checking everything
+                    changed.update(self._paths)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is not None:
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self._paths:
+                        changed.add(path)
+        return changed
+
+    def _wait(self, timeout: Optional[float]) -> Set[str]:
+        """Return the changes within timeout (None: until there are some, or stop())."""
+        if self._fd is None:
+            if self._stop.wait(timeout):
+                return set()
+            return self._poll()
+        ready, _, _ = select.select([self._fd, self._wake[0]], [], [], timeout)
+        return self._read() if self._fd in ready else set()
+
+    def _loop(self) -> None:
+        """Collect changes; hand each batch over once they settle."""
+        interval = POLL_S if self._fd is None else None
+        while not self._stop.is_set():
+            changed = self._wait(interval)
+            if not changed:
+                continue
+            while not self._stop.is_set():
+                more = self._wait(self._settle)
+                if not more:
+                    break
+                changed |= more
+            logger.info("Changed: %s", ", ".join(sorted(changed)))
+            try:
+                self._callback(changed)
+            except Exception:
+                logger.exception("Reload failed")
+
+    def start(self) -> None:
+        """Start watching (on a daemon thread)."""
+        logger.info(
+            "Watching %s files (%s)",
+            len(self._paths),
+            "inotify" if self._fd is not None else "polling",
+        )
+        self._thread = Thread(target=self._loop, name="watch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching."""
+        self._stop.set()
+        if self._wake is not None:
+            os.write(self._wake[1], b"\0")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._wake is not None:
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = None
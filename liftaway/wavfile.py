@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Liftaway minimal RIFF/WAVE header parsing."""
+
+import struct
+from typing import NamedTuple
+
+
+WavInfo = NamedTuple(
+    "WavInfo",
+    [
+        ("channels", int),
+        ("sample_width", int),
+        ("rate", int),
+        ("data_offset", int),
+        ("data_size", int),
+    ],
+)
+
+
+def _unpack(f, layout: str, path: str, what: str) -> tuple:
+    """Read and unpack the next struct of layout; ValueError if it's cut short."""
+    size = struct.calcsize(layout)
+    data = f.read(size)
+    if len(data) < size:
+        raise ValueError(f"{path} is truncated ({what})")
+    return struct.unpack(layout, data)
+
+
+def read_header(path: str) -> WavInfo:
+    """
+    Locate the fmt and data chunks of a PCM WAV file.
+
+    Raises ValueError if the file isn't uncompressed PCM WAV (or is cut
+    short before its data chunk).
+    """
+    fmt = None
+    with open(path, "rb") as f:
+        riff, _, wave = _unpack(f, "<4sI4s", path, "RIFF header")
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                if size < 16:
+                    raise ValueError(f"{path} fmt chunk is too short ({size})")
+                fmt = _unpack(f, "<HHIIHH", path, "fmt chunk")
+                f.seek(size - 16 + (size & 1), 1)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path} data chunk precedes fmt chunk")
+                audio_format, channels, rate, _, _, bits = fmt
+                if audio_format != 1:
+                    raise ValueError(f"{path} is not PCM ({audio_format})")
+                return WavInfo(
+                    channels=channels,
+                    sample_width=bits // 8,
+                    rate=rate,
+                    data_offset=f.tell(),
+                    data_size=size,
+                )
+            else:
+                f.seek(size + (size & 1), 1)
@@ -13,8 +13,12 @@ function get_script_dir () {
 
 function keep_alive() {
     local PYTHON="${HOME}/.pyenv/versions/liftaway/bin/python3"
+    local REPO="${HOME}/src/github.com/elj/liftaway"
+    # The supervisor restarts crashed controllers itself (warm, with their
+    # queue); this loop only covers the supervisor itself going away. Run
+    # from the checkout so -m finds the package without it being installed.
     while true; do
-        command "${PYTHON}" ${HOME}/src/github.com/elj/liftaway/liftaway/lift_main.py
+        ( cd "${REPO}" && command "${PYTHON}" -m liftaway.supervisor )
         sleep 3 || break;
     done
 }
@@ -15,6 +15,7 @@ requirements = [
     "Click>=7.0",
     "RPi.GPIO>=0.7.0",
     "pygame>=1.9.6",
+    'audioop-lts; python_version>="3.13"',
 ]
 
 setup_requirements = ["pytest-runner"]
@@ -39,15 +40,22 @@ setup(
     ],
     description="Liftaway Project",
     # entry_points={"console_scripts": ["liftaway=liftaway.cli:main"]},
-    entry_points={"console_scripts": ["liftaway=liftaway.lift_main:main"]},
+    entry_points={
+        "console_scripts": [
+            "liftaway=liftaway.lift_main:main",
+            "liftaway-tools=liftaway.cli:main",
+            "liftaway-supervisor=liftaway.supervisor:main",
+        ]
+    },
     install_requires=requirements,
+    extras_require={"softmix": ["numpy"]},
     license="MIT license",
     long_description=readme,
     include_package_data=True,
     keywords="liftaway",
     name="liftaway",
     packages=find_packages(),
-    package_data={"liftaway": ["data/*.wav"]},
+    package_data={"liftaway": ["data/*.wav", "data/*.bundle"]},
     setup_requires=setup_requirements,
     test_suite="tests",
     tests_require=test_requirements,
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+"""Tests run on simulated hardware, in real time."""
+
+import os
+
+
+# Must be set before liftaway.hardware is imported
+os.environ["LIFTAWAY_BACKEND"] = "sim"
+os.environ["LIFTAWAY_SIM_SPEED"] = "1.0"
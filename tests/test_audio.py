@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""Audio on the simulated mixer."""
+
+from threading import Thread
+
+import liftaway.audio as audio
+import pytest
+
+
+@pytest.fixture(scope="module")
+def mixer():
+    """Bring the (simulated) mixer up."""
+    audio.init()
+
+
+def test_streams_take_a_channel_from_each_other(mixer):
+    """Streams started on one channel from two threads don't deadlock."""
+    streams = [audio.StreamingSound("diner_2ch.wav") for _ in range(2)]
+    assert all(s._info is not None for s in streams)
+
+    def play(stream):
+        for _ in range(200):
+            stream.play()
+
+    threads = [Thread(target=play, args=(s,), daemon=True) for s in streams]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    assert not any(t.is_alive() for t in threads)
+    audio.silence(streams[0].channel_num, fade_ms=0).result(timeout=5)
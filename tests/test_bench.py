@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+"""Cancel latency on simulated hardware (see liftaway.bench)."""
+
+import pytest
+
+from liftaway import bench
+
+CANCELS = ("cancel_waiting", "cancel_travel", "cancel_floor")
+
+
+@pytest.fixture(scope="module")
+def cabin():
+    """One Controller (on simulated hardware) for every scenario."""
+    return bench.Bench()
+
+
+@pytest.mark.parametrize("name", CANCELS)
+def test_cancel_within_bound(cabin, name):
+    """Cancel silences the cabin and clears its LEDs within 50ms."""
+    scenario = next(s for s in bench.scenarios() if s.name == name)
+    result = cabin.run(scenario)
+    for metric in ("cancel_to_silence", "cancel_to_dark"):
+        assert result["latency_ms"][metric]["n"] == 1, metric
+    assert bench.check({"results": [result]}) == []
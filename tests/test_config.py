@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""Cabin configuration validation (see liftaway.config)."""
+
+import copy
+import json
+
+import liftaway.config as config
+import pytest
+
+
+def broken(change):
+    """Return the default cabin configuration with change(raw) applied."""
+    raw = copy.deepcopy(config.defaults())
+    change(raw)
+    return raw
+
+
+def first_floor_pin(raw):
+    """Return the first floor's button pin."""
+    return raw["floors"][0]["pin"]
+
+
+CASES = [
+    # change, expected error
+    (lambda raw: raw["floors"][0].update(pin=28), "floors[0].pin: 28 not in 0..27"),
+    (lambda raw: raw["floors"][0].update(pin=-1), "floors[0].pin: -1 not in 0..27"),
+    (
+        lambda raw: raw["floors"][0].update(pin="22"),
+        "floors[0].pin: expected an integer, got '22'",
+    ),
+    (
+        lambda raw: raw["floors"][0].update(pin=True),
+        "floors[0].pin: expected an integer, got True",
+    ),
+    (
+        lambda raw: raw["floors"][1].update(pin=first_floor_pin(raw)),
+        "floors[1]: pin 22 already used by floors[0]",
+    ),
+    (
+        lambda raw: raw["outputs"].update(door_open=first_floor_pin(raw)),
+        "outputs.door_open: pin 22 already used by floors[0]",
+    ),
+    (
+        lambda raw: raw["buttons"]["cancel"].update(pin=first_floor_pin(raw)),
+        "buttons.cancel: pin 22 already used by floors[0]",
+    ),
+    (
+        lambda raw: raw["floors"][1].update(led=raw["floors"][0]["led"]),
+        "floors[1]: LED channel 0 already used by floors[0]",
+    ),
+    (lambda raw: raw.update(lobby=1), "config: unknown key 'lobby'"),
+    (lambda raw: raw["floors"][0].update(colour=1), "floors[0]: unknown key 'colour'"),
+    (
+        lambda raw: raw["buttons"]["cancel"].update(audio=[]),
+        "buttons.cancel: unknown key 'audio'",
+    ),
+    (
+        lambda raw: raw["floors"][0]["audio"][0].update(pitch=2),
+        "floors[0].audio[0]: unknown key 'pitch'",
+    ),
+    (
+        lambda raw: raw["ceiling_leds"].update(pink=3),
+        "ceiling_leds: unknown key 'pink'",
+    ),
+    (lambda raw: raw["buttons"].update(lobby={"pin": 5}), "buttons.lobby: unknown"),
+    (lambda raw: raw["outputs"].update(bell=5), "outputs.bell: unknown output"),
+    (lambda raw: raw["outputs"].pop("cancel_call"), "outputs: missing 'cancel_call'"),
+    (lambda raw: raw.pop("channels"), "config: missing 'channels'"),
+]
+
+
+@pytest.mark.parametrize("change,error", CASES)
+def test_invalid(change, error):
+    """Reject the configuration, saying what's wrong."""
+    with pytest.raises(config.ConfigError) as e:
+        config.validate(broken(change))
+    assert any(line.startswith(error) for line in str(e.value).splitlines())
+
+
+def test_every_problem_is_reported():
+    """List every problem, one per line, not just the first."""
+
+    def change(raw):
+        raw["floors"][0].update(pin=99)
+        raw["floors"][2].update(pin=raw["floors"][1]["pin"], led=99)
+        raw.update(lobby=1)
+
+    with pytest.raises(config.ConfigError) as e:
+        config.validate(broken(change))
+    assert str(e.value).splitlines() == [
+        "config: unknown key 'lobby'",
+        "floors[0].pin: 99 not in 0..27",
+        "floors[2]: pin 4 already used by floors[1]",
+        "floors[2].led: 99 not in 0..15",
+    ]
+
+
+def test_defaults_are_valid():
+    """Accept (and compile) the built-in cabin."""
+    cabin = config.compile_cabin(config.defaults())
+    assert cabin.floors == len(config.defaults()["floors"])
+
+
+def test_load_names_the_file(tmp_path):
+    """Prefix errors in a configuration file with its path."""
+    path = tmp_path / "cabin.json"
+    path.write_text(json.dumps(broken(lambda raw: raw.update(lobby=1))))
+    with pytest.raises(config.ConfigError) as e:
+        config.load(str(path))
+    assert str(e.value) == f"{path}:\nconfig: unknown key 'lobby'"
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Button debouncing against a fake clock (see liftaway.debounce.Input)."""
+
+import pytest
+from liftaway.config import Button
+from liftaway.debounce import DOUBLE, Input, PRESS, RELEASE
+
+SETTLE_MS = 20
+HOLD_MS = 1500
+DOUBLE_MS = 400
+
+
+class Clock:
+    """Drives an Input with edges and ticks at made-up times (seconds)."""
+
+    def __init__(self):
+        """Initialize a released button; time starts at its creation."""
+        button = Button("floor:0", "floor", 0, 22, SETTLE_MS)
+        self.input = Input(button, HOLD_MS, DOUBLE_MS)
+        self.t0 = self.input.since
+
+    def edge(self, t: float, pressed: bool) -> bool:
+        """Feed an edge at t; returns whether a change is pending."""
+        return self.input.edge(pressed, self.t0 + t)
+
+    def deadline(self) -> float:
+        """Return when (since the start) the pending change is due."""
+        return self.input.deadline_at() - self.t0
+
+    def tick(self, t: float):
+        """Return (kind, t, held) of the events accepted by t."""
+        return [
+            (e.kind, round(e.t - self.t0, 6), round(e.held, 6))
+            for e in self.input.tick(self.t0 + t)
+        ]
+
+
+@pytest.fixture
+def clock():
+    """Return a Clock driving a fresh Input."""
+    return Clock()
+
+
+def test_press_after_settle_time(clock):
+    """Accept a clean press once it's held settle_ms, not before."""
+    assert clock.edge(1.0, True)
+    assert clock.deadline() == pytest.approx(1.020)
+    assert clock.tick(1.019) == []
+    assert clock.tick(1.020) == [(PRESS, 1.020, 0.0)]
+    assert clock.input.pressed
+    assert (clock.input.edges, clock.input.rejected) == (1, 0)
+
+
+def test_bounce_is_rejected(clock):
+    """Count contact bounce as rejected edges; accept the press it hides."""
+    clock.edge(1.000, True)
+    clock.edge(1.002, False)
+    clock.edge(1.003, True)
+    clock.edge(1.004, False)
+    clock.edge(1.005, True)
+    # 1ms more down than up in the bounce, so 19ms to go once it stops
+    assert clock.deadline() == pytest.approx(1.024)
+    assert clock.tick(1.023) == []
+    assert clock.tick(1.024) == [(PRESS, 1.024, 0.0)]
+    assert (clock.input.edges, clock.input.rejected) == (5, 4)
+
+
+def test_spike_is_rejected(clock):
+    """Drop a spike shorter than settle_ms without a press."""
+    assert clock.edge(1.000, True)
+    assert not clock.edge(1.005, False)
+    assert clock.tick(1.100) == []
+    assert not clock.input.pressed
+    assert clock.input.rejected == 2
+
+
+def test_missed_edge_is_rejected(clock):
+    """Count an edge to the level we're already at as rejected."""
+    clock.edge(1.000, True)
+    clock.edge(1.001, True)
+    assert clock.tick(1.020) == [(PRESS, 1.020, 0.0)]
+    assert clock.input.rejected == 1
+
+
+def test_release_reports_time_held(clock):
+    """Release (after settle_ms) with how long the button was down."""
+    clock.edge(1.000, True)
+    clock.tick(1.020)
+    assert clock.edge(1.500, False)
+    assert clock.tick(1.510) == []
+    assert clock.tick(1.520) == [(RELEASE, 1.520, 0.5)]
+    assert not clock.input.pressed
+
+
+@pytest.mark.parametrize(
+    "again,expected",
+    [
+        (1.400, [(DOUBLE, 1.420, 0.0), (PRESS, 1.420, 0.0)]),
+        (1.600, [(PRESS, 1.620, 0.0)]),
+    ],
+)
+def test_double_press(clock, again, expected):
+    """Report a double just ahead of a press within double_ms of a release."""
+    clock.edge(1.000, True)
+    clock.tick(1.020)
+    clock.edge(1.100, False)
+    clock.tick(1.120)
+    clock.edge(again, True)
+    assert clock.tick(again + 0.020) == expected
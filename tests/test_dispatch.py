@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""Stop ordering and car assignment (see liftaway.dispatch)."""
+
+import pytest
+from liftaway.dispatch import (
+    Dispatcher,
+    DOWN,
+    IDLE,
+    Leg,
+    plan,
+    POLICIES,
+    simulate,
+    UP,
+    workload,
+)
+
+TOP = 11
+
+PLANS = [
+    # policy, floor, direction, stops (press order), legs
+    ("look", 5, UP, [], []),
+    # Carry on up, then turn round at the last stop
+    (
+        "look",
+        5,
+        UP,
+        [7, 2, 9, 3],
+        [Leg(7, 2, UP), Leg(9, 2, UP), Leg(3, 6, DOWN), Leg(2, 1, DOWN)],
+    ),
+    ("look", 5, DOWN, [8, 3], [Leg(3, 2, DOWN), Leg(8, 5, UP)]),
+    # Idle: head for the nearest stop, ties going up
+    ("look", 5, IDLE, [3, 7], [Leg(7, 2, UP), Leg(3, 4, DOWN)]),
+    ("look", 5, IDLE, [4, 8], [Leg(4, 1, DOWN), Leg(8, 4, UP)]),
+    # Stop where the car already is
+    ("look", 5, UP, [5, 6], [Leg(5, 0, UP), Leg(6, 1, UP)]),
+    # Run on to the end of the shaft before turning round
+    (
+        "scan",
+        5,
+        UP,
+        [7, 2, 9, 3],
+        [Leg(7, 2, UP), Leg(9, 2, UP), Leg(3, 10, DOWN), Leg(2, 1, DOWN)],
+    ),
+    ("scan", 5, DOWN, [3, 8], [Leg(3, 2, DOWN), Leg(8, 11, UP)]),
+    ("scan", 5, UP, [9], [Leg(9, 4, UP)]),
+    # Press order, whichever way that takes the car
+    (
+        "fifo",
+        5,
+        IDLE,
+        [7, 2, 9],
+        [Leg(7, 2, UP), Leg(2, 5, DOWN), Leg(9, 7, UP)],
+    ),
+    ("fifo", 5, DOWN, [5], [Leg(5, 0, DOWN)]),
+]
+
+
+@pytest.mark.parametrize("policy,floor,direction,stops,legs", PLANS)
+def test_plan(policy, floor, direction, stops, legs):
+    """Order stops by policy."""
+    assert plan(floor, direction, stops, policy, TOP) == legs
+
+
+def test_unknown_policy():
+    """Refuse a policy that isn't one of POLICIES."""
+    with pytest.raises(ValueError):
+        Dispatcher(12, policy="elevator-algorithm")
+
+
+def test_car_follows_its_route():
+    """Depart and arrive leg by leg, reversing once the stops ahead run out."""
+    dispatcher = Dispatcher(12)
+    car = dispatcher.cars[0]
+    for floor in (4, 2, 6):
+        dispatcher.request(floor)
+    visited = []
+    while dispatcher.depart(car) is not None:
+        visited.append(dispatcher.arrive(car))
+        if visited == [2]:
+            # Pressed behind the car; it carries on up first
+            dispatcher.request(1)
+    assert visited == [2, 4, 6, 1]
+    assert car.direction == IDLE and not car.busy
+
+
+def test_request_picks_the_cheapest_car():
+    """Give a request to the car which would get there soonest, once."""
+    dispatcher = Dispatcher(12, cars=2)
+    first = dispatcher.request(3)
+    second = dispatcher.request(9)
+    assert (first.index, second.index) == (0, 1)
+    assert dispatcher.request(3) is first
+    assert first.stops == [3] and second.stops == [9]
+
+
+SIMULATIONS = [
+    # cars, presses (seconds, floor), waits (seconds: depart 1.1, travel 1.5
+    # a floor, dwell 15)
+    (1, [(0.0, 3)], {"mean_s": 5.6, "max_s": 5.6, "floors_travelled": 3}),
+    (1, [(0.0, 0)], {"mean_s": 0.0, "max_s": 0.0, "floors_travelled": 0}),
+    (
+        1,
+        [(0.0, 3), (0.0, 9)],
+        {"mean_s": 18.15, "max_s": 30.7, "floors_travelled": 9},
+    ),
+    (
+        2,
+        [(0.0, 3), (0.0, 9)],
+        {"mean_s": 10.1, "max_s": 14.6, "floors_travelled": 12},
+    ),
+]
+
+
+@pytest.mark.parametrize("cars,presses,expected", SIMULATIONS)
+def test_simulate(cars, presses, expected):
+    """Wait for the car (or whichever of the cars is sent)."""
+    result = simulate(presses, cars=cars, depart_s=1.1, travel_s=1.5, dwell_s=15.0)
+    assert result["presses"] == len(presses)
+    assert {k: result[k] for k in expected} == expected
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+def test_more_cars_wait_less(policy):
+    """Cut the average wait with every car added."""
+    load = workload(seed=1, presses=300, rate=0.2)
+    means = [simulate(load, cars=n, policy=policy)["mean_s"] for n in (1, 2, 3)]
+    assert means == sorted(means, reverse=True)
+    assert means[0] > means[2]
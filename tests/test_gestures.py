@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""Hold, double press and chord recognition (see liftaway.gestures)."""
+
+import liftaway.gestures
+import pytest
+from liftaway.config import Gesture
+from liftaway.debounce import DOUBLE, Event, PRESS, RELEASE
+from liftaway.gestures import Recognizer
+from liftaway.scheduler import Scheduled
+
+CANCEL = 27
+SQUEAKER = 26
+
+HOLD = Gesture("hold", ("cancel",), (CANCEL,), 3000, "clear")
+TWICE = Gesture("double", ("squeaker",), (SQUEAKER,), 0, "no_press")
+CHORD = Gesture(
+    "chord", ("cancel", "squeaker"), (CANCEL, SQUEAKER), 200, "maintenance"
+)
+
+
+class Cabin:
+    """A Recognizer, what it ran, and a clock and timer the test drives."""
+
+    def __init__(self, gestures):
+        """Initialize with nothing pressed, at time 0."""
+        self.now = 0.0
+        self.timers = []
+        self.ran = []
+        self.recognizer = Recognizer(
+            gestures,
+            lambda pin: self.ran.append(("press", pin)),
+            lambda gesture, pin: self.ran.append((gesture.action, pin)),
+            self.later,
+        )
+
+    def monotonic(self):
+        """Return the (fake) time; stands in for the time module."""
+        return self.now
+
+    def later(self, delay, callback, *args):
+        """Return a handle for a call advance() makes once it's due."""
+        handle = Scheduled(self.now + delay, callback, args)
+        self.timers.append(handle)
+        return handle
+
+    def advance(self, t):
+        """Move the clock on to t, running the calls due by then in order."""
+        while True:
+            due = [h for h in self.timers if h.when <= t]
+            if not due:
+                break
+            handle = min(due, key=lambda h: h.when)
+            self.timers.remove(handle)
+            self.now = handle.when
+            if not handle.cancelled:
+                handle.callback(*handle.args)
+        self.now = t
+
+    def event(self, kind, pin, t):
+        """Feed a debounced event at t."""
+        self.advance(t)
+        self.recognizer.event(Event(pin, str(pin), kind, t, 0.0))
+
+
+@pytest.fixture
+def make_cabin(monkeypatch):
+    """Return a function making a Cabin for gestures."""
+
+    def make(gestures):
+        cabin = Cabin(gestures)
+        monkeypatch.setattr(liftaway.gestures, "time", cabin)
+        return cabin
+
+    return make
+
+
+def test_unbound_presses_pass_straight_through(make_cabin):
+    """Run a press at once (even a double) when no gesture has its button."""
+    cabin = make_cabin([HOLD])
+    cabin.event(DOUBLE, SQUEAKER, 1.0)
+    cabin.event(PRESS, SQUEAKER, 1.0)
+    assert cabin.ran == [("press", SQUEAKER)]
+    assert not cabin.timers
+
+
+def test_hold(make_cabin):
+    """Run the press at once, then the hold once it's been down long enough."""
+    cabin = make_cabin([HOLD])
+    cabin.event(PRESS, CANCEL, 1.0)
+    assert cabin.ran == [("press", CANCEL)]
+    cabin.advance(3.9)
+    assert cabin.ran == [("press", CANCEL)]
+    cabin.advance(4.0)
+    assert cabin.ran == [("press", CANCEL), ("clear", CANCEL)]
+
+
+def test_hold_released_early(make_cabin):
+    """Drop the hold if the button's let go before its time is up."""
+    cabin = make_cabin([HOLD])
+    cabin.event(PRESS, CANCEL, 1.0)
+    cabin.event(RELEASE, CANCEL, 3.0)
+    cabin.advance(10.0)
+    assert cabin.ran == [("press", CANCEL)]
+
+
+def test_double(make_cabin):
+    """Run the double instead of the second press."""
+    cabin = make_cabin([TWICE])
+    cabin.event(PRESS, SQUEAKER, 1.0)
+    cabin.event(RELEASE, SQUEAKER, 1.1)
+    cabin.event(DOUBLE, SQUEAKER, 1.3)
+    cabin.event(PRESS, SQUEAKER, 1.3)
+    cabin.event(RELEASE, SQUEAKER, 1.4)
+    cabin.event(PRESS, SQUEAKER, 2.0)
+    assert cabin.ran == [
+        ("press", SQUEAKER),
+        ("no_press", SQUEAKER),
+        ("press", SQUEAKER),
+    ]
+
+
+def test_chord(make_cabin):
+    """Run the chord, and neither press, when its buttons go down together."""
+    cabin = make_cabin([CHORD])
+    cabin.event(PRESS, CANCEL, 1.0)
+    assert cabin.ran == []
+    cabin.event(PRESS, SQUEAKER, 1.15)
+    cabin.advance(10.0)
+    assert cabin.ran == [("maintenance", SQUEAKER)]
+
+
+def test_chord_too_slow(make_cabin):
+    """Run each press, held back for the chord's window, if the rest is late."""
+    cabin = make_cabin([CHORD])
+    cabin.event(PRESS, CANCEL, 1.0)
+    cabin.advance(1.199)
+    assert cabin.ran == []
+    cabin.advance(1.2)
+    assert cabin.ran == [("press", CANCEL)]
+    cabin.event(PRESS, SQUEAKER, 1.25)
+    cabin.advance(1.45)
+    assert cabin.ran == [("press", CANCEL), ("press", SQUEAKER)]
+
+
+def test_chord_button_released_early(make_cabin):
+    """Run a held back press straight away when its button is let go."""
+    cabin = make_cabin([CHORD])
+    cabin.event(PRESS, SQUEAKER, 1.0)
+    cabin.event(RELEASE, SQUEAKER, 1.05)
+    assert cabin.ran == [("press", SQUEAKER)]
+    cabin.advance(10.0)
+    assert cabin.ran == [("press", SQUEAKER)]
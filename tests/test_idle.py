@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""Going idle and waking up again (see liftaway.idle)."""
+
+import time
+
+import liftaway.constants as constants
+import pytest
+from liftaway import simulated
+from liftaway.audio import suspended
+from liftaway.bench import button_pin
+from liftaway.idle import ACTIVE, IDLE
+from liftaway.lift_main import Controller
+
+# Longer than the press takes to get through the debouncer
+WAKE_S = 0.2
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition until it's true; return whether it became so."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Return an idle Controller with its audio device closed."""
+    monkeypatch.setattr(constants, "idle_fade_ms", 50)
+    controller = Controller()
+    controller.ready.result(timeout=30)
+    controller.idle.after_s = 0.05
+    controller.idle.start()
+    assert wait_for(lambda: controller.idle.mode == IDLE and suspended())
+    controller.idle.after_s = 0.0  # (stay awake once woken)
+    return controller
+
+
+def test_press_while_idle_plays(controller):
+    """Play the press that wakes the cabin, even if waking is slow."""
+    leave = controller.idle._leave
+    woken = []
+
+    def slow_leave():
+        time.sleep(WAKE_S)
+        leave()
+        woken.append(time.monotonic())
+
+    controller.idle._leave = slow_leave
+    pressed = time.monotonic()
+    simulated.GPIO.press(button_pin("squeaker"))
+    assert wait_for(lambda: controller.counters["squeaker"] == 1)
+    # (key -1 is the muzak, back on as we wake)
+    squeaks = [r for r in simulated.records("play", pressed) if r.key >= 0]
+    assert len(squeaks) == 1
+    # Not into the closed audio device; only once it's open again
+    assert woken and squeaks[0].t >= woken[0]
+    assert controller.idle.mode == ACTIVE
+    assert not suspended()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""Floor queue bookkeeping of the (threaded) Controller."""
+
+import pytest
+from liftaway.actions import Floor
+from liftaway.lift_main import Controller
+
+
+@pytest.fixture
+def controller():
+    """Return a Controller whose runner isn't started (we pop by hand)."""
+    return Controller()
+
+
+def drain(controller):
+    """Pop every action, returning the floors visited and _pending after each."""
+    visited = []
+    while controller._pop_action():
+        if isinstance(controller.action, Floor):
+            visited.append((controller.action.floor_number, controller._pending))
+    return visited
+
+
+def test_push_sets_a_bit_per_floor(controller):
+    """Set one bit per queued floor; refuse a floor that's already pending."""
+    assert controller._push_floor(controller.floors[3])
+    assert controller._push_floor(controller.floors[1])
+    assert not controller._push_floor(controller.floors[3])
+    assert controller._pending == 0b1010
+    assert controller.counters == {"floor_queued": 2, "floor_duplicate": 1}
+
+
+def test_pop_clears_bits_in_dispatch_order(controller):
+    """Clear each floor's bit as it's popped, nearest first going up."""
+    top = controller.cabin.floors - 1
+    for f in (top, 3, 1):
+        controller._push_floor(controller.floors[f])
+    assert drain(controller) == [
+        (1, (1 << top) | 0b1000),
+        (3, 1 << top),
+        (top, 0),
+    ]
+    assert controller._pending == 0 and not controller.queue
+
+
+def test_popped_floor_can_be_pushed_again(controller):
+    """Queue a floor again once it has been popped."""
+    controller._push_floor(controller.floors[2])
+    assert drain(controller) == [(2, 0)]
+    assert controller._push_floor(controller.floors[2])
+    assert controller._pending == 0b100
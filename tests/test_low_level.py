@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""LED frame buffer writes (see liftaway.low_level.LEDFrame)."""
+
+import struct
+
+import liftaway.low_level as low_level
+import pytest
+from liftaway.config import PWM_CHANNELS
+
+DUTIES = (0, 1, 0x0F, 0x10, 0x4000, 0x7FFF, 0xFFFE, 0xFFFF)
+
+
+def channel_regs(duty):
+    """Return LEDn_ON/OFF as adafruit_pca9685's per-channel duty_cycle writes."""
+    if duty == 0xFFFF:
+        return (0x1000, 0)
+    return (0, (duty + 1) >> 4)
+
+
+class FakePCA:
+    """Collects the I2C writes an LEDFrame makes."""
+
+    def __init__(self):
+        """Initialize with nothing written."""
+        self.i2c_device = self
+        self.writes = []
+
+    def __enter__(self):
+        """Lock the (pretend) bus."""
+        return self
+
+    def __exit__(self, *exc):
+        """Unlock the (pretend) bus."""
+
+    def write(self, buf):
+        """Record one I2C write."""
+        self.writes.append(bytes(buf))
+
+
+def decode(buf):
+    """Return {channel: (on, off)} from an auto-increment burst."""
+    first = (buf[0] - low_level.LED0_ON_L) // 4
+    return {
+        first + i // 4: struct.unpack_from("<HH", buf, 1 + i)
+        for i in range(0, len(buf) - 1, 4)
+    }
+
+
+@pytest.mark.parametrize("duty", DUTIES)
+def test_burst_matches_channel_writes(duty):
+    """Encode each duty cycle as a per-channel duty_cycle write would."""
+    pca = FakePCA()
+    frame = low_level.LEDFrame(pca)
+    frame.set(5, duty)
+    frame.flush()
+    expected = [{5: channel_regs(duty)}] if duty else []
+    assert [decode(w) for w in pca.writes] == expected
+
+
+def test_burst_spans_dirty_channels():
+    """Write lowest to highest dirty channel in one burst, clean ones as is."""
+    pca = FakePCA()
+    frame = low_level.LEDFrame(pca)
+    frame.set(2, 0x4000)
+    frame.flush()
+    frame.set(1, 0xFFFF)
+    frame.set(PWM_CHANNELS - 1, 0x7FFF)
+    frame.flush()
+    frame.flush()
+    assert len(pca.writes) == 2 and frame.writes == 2
+    regs = decode(pca.writes[1])
+    assert sorted(regs) == list(range(1, PWM_CHANNELS))
+    assert regs[1] == channel_regs(0xFFFF)
+    assert regs[2] == channel_regs(0x4000)
+    assert regs[PWM_CHANNELS - 1] == channel_regs(0x7FFF)
+    assert all(regs[c] == channel_regs(0) for c in range(3, PWM_CHANNELS - 1))
+
+
+def test_all_lights_off_covers_every_channel():
+    """Turn off all 16 channels, the last one included."""
+    low_level.init()
+    for channel in range(PWM_CHANNELS):
+        low_level.frame.set(channel, 0xFFFF)
+    low_level.flush()
+    low_level.all_lights_off()
+    assert low_level.frame.snapshot() == [0] * PWM_CHANNELS
+    assert [c.duty_cycle for c in low_level.pca.channels] == [0] * PWM_CHANNELS
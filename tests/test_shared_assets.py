@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+"""Shared PCM published without a bundle (see liftaway.shared_assets)."""
+
+import os
+
+import liftaway.constants as constants
+import pytest
+from liftaway.bundle import convert, prepare
+from liftaway.shared_assets import available, Registry
+from liftaway.util import data_resource_filename
+
+CLIP = "lift_ding.wav"
+
+
+@pytest.mark.skipif(not available(), reason="needs multiprocessing.shared_memory")
+def test_published_pcm_is_normalized_as_in_a_bundle():
+    """Publish the same (normalized) PCM as an asset bundle holds."""
+    rate, bits, channels, _ = constants.mixer_format
+    width = abs(bits) // 8
+    path = data_resource_filename(CLIP)
+    registry = Registry.publish(f"liftaway-test-{os.getpid()}", [CLIP])
+    try:
+        pcm = bytes(registry.view(CLIP))
+        assert pcm == prepare(path, rate, width, channels)
+        assert pcm != convert(path, rate, width, channels)
+    finally:
+        registry.close()
+        registry.unlink()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+"""WAV header parsing (see liftaway.wavfile)."""
+
+import struct
+
+import pytest
+from liftaway.util import data_resource_filename
+from liftaway.wavfile import read_header, WavInfo
+
+# fmt chunks (16-bit PCM and 32-bit float, stereo) and an empty data chunk
+FMT = b"fmt " + struct.pack("<IHHIIHH", 16, 1, 2, 44100, 176400, 4, 16)
+FLOAT_FMT = b"fmt " + struct.pack("<IHHIIHH", 16, 3, 2, 44100, 352800, 8, 32)
+DATA = b"data\0\0\0\0"
+
+BROKEN = [
+    (b"", "truncated"),
+    (b"RIFF", "truncated"),
+    (b"RIFF\0\0\0\0WAVX", "not a RIFF/WAVE file"),
+    (b"RIFF\0\0\0\0WAVE", "no data chunk"),
+    (b"RIFF\0\0\0\0WAVE" + FMT[:12], "truncated"),
+    (b"RIFF\0\0\0\0WAVEfmt \4\0\0\0\1\0\2\0", "fmt chunk is too short"),
+    (b"RIFF\0\0\0\0WAVE" + DATA, "data chunk precedes fmt chunk"),
+    (b"RIFF\0\0\0\0WAVE" + FLOAT_FMT + DATA, "not PCM"),
+]
+
+
+@pytest.mark.parametrize("data,error", BROKEN)
+def test_broken_header(tmp_path, data, error):
+    """Raise ValueError (only) for a file that isn't a usable PCM WAV."""
+    path = tmp_path / "broken.wav"
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match=error):
+        read_header(str(path))
+
+
+def test_header():
+    """Locate the PCM of a real clip."""
+    info = read_header(data_resource_filename("lift_ding.wav"))
+    assert info == WavInfo(2, 2, 44100, 44, 455800)